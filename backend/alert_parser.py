@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Streaming Suricata alert parser - single pass over eve.json (fast.log fallback)
+
+import os
+import re
+import json
+from typing import Dict, List, Optional
+
+
+FAST_LOG_SID_PATTERN = re.compile(r'\[(\d+):(\d+):(\d+)\]')
+
+
+class AlertCollector:
+    """
+    Incrementally aggregates alerts from one or more Suricata log directories.
+
+    Memory use is bounded: only the first ``top_n`` alert lines, the first
+    ``sid_top_n`` lines per SID and the first ``max_flows`` flows are kept,
+    and reading stops as soon as ``max_alerts`` alerts have been counted.
+    """
+
+    def __init__(self, max_alerts: Optional[int] = None, top_n: int = 10, max_flows: int = 100,
+                 sid_top_n: int = 3):
+        self.max_alerts = max_alerts
+        self.top_n = top_n
+        self.max_flows = max_flows
+        self.sid_top_n = sid_top_n
+        self.alert_count = 0
+        self.details = []
+        self.sid_stats = {}
+        self.sid_details = {}
+        self.flows = {}
+        self.truncated = False
+
+    @property
+    def full(self) -> bool:
+        return self.max_alerts is not None and self.alert_count >= self.max_alerts
+
+    def add_log_dir(self, log_dir: str) -> int:
+        """Read alerts from a log dir, preferring eve.json; returns alerts added"""
+        eve_log = os.path.join(log_dir, "eve.json")
+        if os.path.exists(eve_log) and os.path.getsize(eve_log) > 0:
+            return self.add_eve_log(eve_log)
+        return self.add_fast_log(os.path.join(log_dir, "fast.log"))
+
+    def add_eve_log(self, eve_log: str) -> int:
+        """Stream eve.json line by line and count its alert events"""
+        before = self.alert_count
+        try:
+            with open(eve_log, 'r', encoding='utf-8', errors='ignore') as f:
+                for line in f:
+                    # Cheap pre-filter: skip flow/stats/http records without decoding them
+                    if '"alert"' not in line:
+                        continue
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    if event.get("event_type") != "alert":
+                        continue
+                    if self.full:
+                        self.truncated = True
+                        break
+                    self._add_eve_alert(event)
+        except OSError as e:
+            print(f"Error parsing eve.json: {e}")
+        return self.alert_count - before
+
+    def add_fast_log(self, fast_log: str) -> int:
+        """Single-pass fast.log scan used when eve.json output is disabled"""
+        before = self.alert_count
+        if not os.path.exists(fast_log):
+            return 0
+        try:
+            with open(fast_log, 'r', encoding='utf-8', errors='ignore') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    if self.full:
+                        self.truncated = True
+                        break
+                    self.alert_count += 1
+                    if len(self.details) < self.top_n:
+                        self.details.append(line)
+                    match = FAST_LOG_SID_PATTERN.search(line)
+                    if match:
+                        self._count_sid(f"[{match.group(1)}:{match.group(2)}:{match.group(3)}]", line)
+        except OSError as e:
+            print(f"Error parsing fast.log: {e}")
+        return self.alert_count - before
+
+    def _add_eve_alert(self, event: Dict):
+        alert = event.get("alert", {})
+        sid = f"[{alert.get('gid', 1)}:{alert.get('signature_id', 0)}:{alert.get('rev', 0)}]"
+        detail = self._format_detail(event, sid)
+        self.alert_count += 1
+        self._count_sid(sid, detail)
+        if len(self.details) < self.top_n:
+            self.details.append(detail)
+
+        flow_key = event.get("flow_id") or "{}:{}-{}:{}/{}".format(
+            event.get("src_ip"), event.get("src_port"),
+            event.get("dest_ip"), event.get("dest_port"), event.get("proto"))
+        flow = self.flows.get(flow_key)
+        if flow is None:
+            if len(self.flows) >= self.max_flows:
+                return
+            flow = {
+                "flow_id": event.get("flow_id"),
+                "proto": event.get("proto"),
+                "app_proto": event.get("app_proto"),
+                "src_ip": event.get("src_ip"),
+                "src_port": event.get("src_port"),
+                "dest_ip": event.get("dest_ip"),
+                "dest_port": event.get("dest_port"),
+                "alert_count": 0,
+                "sids": []
+            }
+            http = event.get("http")
+            if http:
+                flow["http"] = {
+                    "hostname": http.get("hostname"),
+                    "url": http.get("url"),
+                    "http_method": http.get("http_method")
+                }
+            self.flows[flow_key] = flow
+        flow["alert_count"] += 1
+        if sid not in flow["sids"]:
+            flow["sids"].append(sid)
+
+    def _count_sid(self, sid: str, detail: str):
+        self.sid_stats[sid] = self.sid_stats.get(sid, 0) + 1
+        sid_details = self.sid_details.setdefault(sid, [])
+        if len(sid_details) < self.sid_top_n:
+            sid_details.append(detail)
+
+    @staticmethod
+    def _format_detail(event: Dict, sid: str) -> str:
+        """Render an eve alert in fast.log style so existing consumers keep working"""
+        alert = event.get("alert", {})
+        return "{}  [**] {} {} [**] [Classification: {}] [Priority: {}] {{{}}} {}:{} -> {}:{}".format(
+            event.get("timestamp", ""), sid, alert.get("signature", ""),
+            alert.get("category", ""), alert.get("severity", ""), event.get("proto", ""),
+            event.get("src_ip", ""), event.get("src_port", ""),
+            event.get("dest_ip", ""), event.get("dest_port", ""))
+
+    def summary(self) -> Dict:
+        return {
+            "alert_count": self.alert_count,
+            "details": list(self.details),
+            "sid_stats": dict(sorted(self.sid_stats.items(), key=lambda x: x[1], reverse=True)),
+            "sid_details": {sid: list(lines) for sid, lines in self.sid_details.items()},
+            "flows": list(self.flows.values()),
+            "truncated": self.truncated
+        }
+
+
+def collect_alerts(log_dirs: List[str], max_alerts: Optional[int] = None, top_n: int = 10) -> Dict:
+    """Aggregate the alerts of several log directories in one streaming pass"""
+    collector = AlertCollector(max_alerts=max_alerts, top_n=top_n)
+    for log_dir in log_dirs:
+        collector.add_log_dir(log_dir)
+        if collector.truncated:
+            break
+    return collector.summary()
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Agent API Key Store - keys indexed by SHA-256 digest, verified-key cache and batched last_used writes
+
+import json
+import time
+import hashlib
+import secrets
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from memory_cache import TTLCache
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def hash_key(key: str) -> str:
+    """Lookup digest of an API key (keys are random, so an unsalted hash is enough)"""
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+class APIKeyStore:
+    """
+    Agent API keys in the ``agent_api_keys`` table.  Only the key digest is
+    stored, and a request is authenticated with one indexed lookup.
+
+    Verified digests are cached in memory (LRU, ``cache_ttl`` seconds).
+    Deleting a key bumps a counter in ``api_keys_version`` in the same
+    transaction and drops this process's cache at once; other processes check
+    the counter at most every ``version_check_interval`` seconds and stop
+    trusting entries cached under an older version.  ``last_used`` is
+    collected in memory and written by a background thread every
+    ``flush_interval`` seconds, one batch for all keys used in between.
+    """
+
+    def __init__(self, db, cache_ttl: float = 60, flush_interval: float = 30, max_cached: int = 1024,
+                 version_check_interval: float = 1.0):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.version_check_interval = version_check_interval
+        # digest -> (key_id, api_keys_version when verified)
+        self._verified = TTLCache(max_entries=max_cached, ttl_seconds=cache_ttl)
+        self._known_version = None
+        self._version_checked_at = 0.0
+        # key_id -> last_used
+        self._pending: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher = None
+        self.init_table()
+        self.migrate_legacy_list()
+
+    @property
+    def cache_ttl(self) -> float:
+        return self._verified.ttl_seconds
+
+    @cache_ttl.setter
+    def cache_ttl(self, value: float):
+        self._verified.ttl_seconds = value
+
+    def init_table(self):
+        """Create the key table"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS agent_api_keys (
+                id TEXT PRIMARY KEY,
+                label TEXT NOT NULL,
+                key_hash TEXT NOT NULL UNIQUE,
+                key_preview TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                last_used TEXT
+            )
+        ''')
+        # Change counter, bumped when a key is revoked
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS api_keys_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO api_keys_version (id, version) VALUES (1, 0)')
+        conn.commit()
+        conn.close()
+
+    def migrate_legacy_list(self) -> int:
+        """
+        Move the old ``agent_api_keys`` JSON list (plain-text keys) from the
+        configurations table into the key table, then drop it.  Returns the
+        number of keys imported.
+        """
+        legacy = self.db.get_config("agent_api_keys")
+        if legacy is None:
+            return 0
+        try:
+            keys = json.loads(legacy)
+        except ValueError:
+            keys = []
+
+        conn = self.db.get_connection()
+        imported = 0
+        for key in keys if isinstance(keys, list) else []:
+            if not isinstance(key, dict) or not key.get("key"):
+                continue
+            conn.execute('''
+                INSERT OR IGNORE INTO agent_api_keys (id, label, key_hash, key_preview, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (key.get("id") or secrets.token_hex(8), key.get("label") or "", hash_key(key["key"]),
+                  key["key"][:8] + "****", key.get("created_at") or datetime.now().strftime(TIME_FORMAT),
+                  key.get("last_used")))
+            imported += 1
+        conn.commit()
+        conn.close()
+        self.db.delete_config("agent_api_keys")
+        if imported:
+            print(f"✓ 已将 {imported} 个 Agent API Key 迁移到 agent_api_keys 表")
+        return imported
+
+    def create_key(self, label: str) -> Dict:
+        """Generate a key; the plain key is only ever returned here"""
+        key = secrets.token_urlsafe(32)
+        record = {
+            "id": secrets.token_hex(8),
+            "label": label,
+            "key_preview": key[:8] + "****",
+            "created_at": datetime.now().strftime(TIME_FORMAT),
+            "last_used": None
+        }
+        conn = self.db.get_connection()
+        conn.execute('''
+            INSERT INTO agent_api_keys (id, label, key_hash, key_preview, created_at, last_used)
+            VALUES (?, ?, ?, ?, ?, NULL)
+        ''', (record["id"], label, hash_key(key), record["key_preview"], record["created_at"]))
+        conn.commit()
+        conn.close()
+        return dict(record, key=key)
+
+    def list_keys(self) -> List[Dict]:
+        """All keys without their secret, including not yet flushed last_used times"""
+        self.flush()
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, label, key_preview, created_at, last_used FROM agent_api_keys ORDER BY created_at, rowid
+        ''')
+        rows = cursor.fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    def delete_key(self, key_id: str) -> bool:
+        """Delete a key; it stops authenticating in this process immediately, in others within version_check_interval"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM agent_api_keys WHERE id = ?', (key_id,))
+        deleted = cursor.rowcount > 0
+        if deleted:
+            cursor.execute('UPDATE api_keys_version SET version = version + 1 WHERE id = 1')
+        conn.commit()
+        conn.close()
+        self._verified.clear()
+        with self._lock:
+            # Re-read the version, so an entry cached by a concurrent verify is not trusted
+            self._known_version = None
+            self._pending.pop(key_id, None)
+        return deleted
+
+    def _version(self) -> int:
+        """Shared revocation counter, read from the database at most every version_check_interval seconds"""
+        now = time.time()
+        with self._lock:
+            if self._known_version is not None and now - self._version_checked_at < self.version_check_interval:
+                return self._known_version
+        conn = self.db.get_connection()
+        row = conn.execute('SELECT version FROM api_keys_version WHERE id = 1').fetchone()
+        conn.close()
+        with self._lock:
+            self._known_version = row['version'] if row else 0
+            self._version_checked_at = now
+            return self._known_version
+
+    def verify(self, key: str) -> Optional[str]:
+        """id of the key if it is valid, else None; records its use"""
+        if not key:
+            return None
+        digest = hash_key(key)
+        version = self._version()
+        entry = self._verified.get(digest)
+        if entry is None or entry[1] != version:
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT id FROM agent_api_keys WHERE key_hash = ?', (digest,))
+            row = cursor.fetchone()
+            conn.close()
+            if row is None:
+                self._verified.pop(digest)
+                return None
+            # Stored under the version read before the lookup, so a concurrent revocation is never masked
+            entry = (row['id'], version)
+            self._verified.put(digest, entry)
+        self._record_use(entry[0])
+        return entry[0]
+
+    def _record_use(self, key_id: str):
+        with self._lock:
+            self._pending[key_id] = datetime.now().strftime(TIME_FORMAT)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name='api-key-flush', daemon=True)
+                self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Warning: 写入 API Key 使用时间失败: {e}")
+
+    def flush(self) -> int:
+        """Write pending last_used times in one batch; returns the number of keys updated"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        conn = self.db.get_connection()
+        conn.executemany('UPDATE agent_api_keys SET last_used = ? WHERE id = ?',
+                         [(last_used, key_id) for key_id, last_used in pending.items()])
+        conn.commit()
+        conn.close()
+        return len(pending)
+
+    def shutdown(self):
+        """Stop the background writer and flush what is left"""
+        self._stop.set()
+        self.flush()
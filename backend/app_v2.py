@@ -7,14 +7,17 @@ import os
 
 # Attempt to import dependencies with error handling
 try:
-    from flask import Flask, request, jsonify
+    from flask import Flask, request, jsonify, Response, stream_with_context
     from flask_cors import CORS
 except ImportError as e:
     print(f"Error importing Flask dependencies: {e}")
     print("Try installing packages with sudo: sudo pip install -r requirements.txt")
     sys.exit(1)
 
+import re
 import json
+import atexit
+import threading
 import hmac
 import hashlib
 import base64
@@ -22,6 +25,11 @@ import secrets
 from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
 
+try:
+    import fcntl
+except ImportError:  # Windows: no worker processes to coordinate
+    fcntl = None
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -36,11 +44,21 @@ AI_MODEL = os.getenv('LLM_MODEL') or os.getenv('AI_MODEL', '360gpt-pro')
 DB_PATH = os.getenv('DB_PATH', os.path.join(os.path.dirname(__file__), 'suricata_rules.db'))
 
 try:
-    from database import Database
-    from llm_client import create_llm_client_from_env
-    from suricata_validator import SuricataValidator
+    from database import Database, encode_cursor
+    from db_pool import get_pool
+    from llm_client import create_llm_client_from_env, extract_complete_rule, LLMStreamError
+    from validator_registry import ValidatorRegistry
+    from suricata_validator import cleanup_stale_scratch
     from config_manager import ConfigManager
     from user_model import UserModel
+    from validation_cache import ValidationCache
+    from llm_cache import LLMResponseCache
+    from job_queue import JobQueue
+    from api_key_store import APIKeyStore
+    from memory_cache import TTLCache
+    from pcap_manager_db import PCAPManagerDB
+    from rule_parser import check_rules, rule_fingerprint
+    from rule_simulator import simulate_rule
 except ImportError as e:
     print(f"Error importing internal modules: {e}")
     sys.exit(1)
@@ -62,8 +80,17 @@ def _create_token(user_id: int) -> str:
     return base64.urlsafe_b64encode(raw.encode()).decode()
 
 
+# Tokens that passed the signature check -> (user_id, expire); expiry is still checked on every hit
+_verified_tokens = TTLCache(max_entries=int(os.getenv('AUTH_TOKEN_CACHE_SIZE', '4096')),
+                            ttl_seconds=JWT_EXPIRE_HOURS * 3600)
+
+
 def _verify_token(token: str):
     """Verify token and return user_id, or None if invalid"""
+    cached = _verified_tokens.get(token)
+    if cached is not None:
+        user_id, expire = cached
+        return user_id if expire >= int(datetime.now(timezone.utc).timestamp()) else None
     try:
         raw = base64.urlsafe_b64decode(token.encode()).decode()
         parts = raw.rsplit(':', 1)
@@ -76,32 +103,138 @@ def _verify_token(token: str):
         user_id_str, expire_str = payload.split(':', 1)
         if int(expire_str) < int(datetime.now(timezone.utc).timestamp()):
             return None
+        _verified_tokens.put(token, (int(user_id_str), int(expire_str)))
         return int(user_id_str)
     except Exception:
         return None
 
-# Initialize components
-db = Database(DB_PATH)
-db.init_db()  # Initialize database tables
-llm_client = create_llm_client_from_env()
+# Shared components, created by create_app(); importing this module only defines the routes
+db = None
+llm_cache = None
+llm_client = None
+config_manager = None
+pcap_manager_db = None
+validation_cache = None
+validator_registry = None
+user_model = None
+api_key_store = None
+job_queue = None
+
+_init_lock = threading.Lock()
+_initialized = False
+_worker_pid = None
+
+
+def _init_components():
+    """Create the shared components and make sure the database schema and defaults exist"""
+    global db, llm_cache, llm_client, config_manager, pcap_manager_db, validation_cache, validator_registry, \
+        user_model, api_key_store, job_queue
+    db_dir = os.path.dirname(DB_PATH)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+    # Workers started without preload initialize one at a time (schema, default config, admin user)
+    with open(DB_PATH + '.init.lock', 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        db = Database(DB_PATH)
+        db.init_db()  # Initialize database tables
+        # LLM 响应缓存：相同 provider/模型/提示词/采样参数时不再重复调用付费接口
+        llm_cache = LLMResponseCache(
+            db,
+            max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '2000')),
+            ttl_seconds=int(os.getenv('LLM_CACHE_TTL', str(30 * 24 * 3600)))
+        ) if os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true' else None
+        llm_client = create_llm_client_from_env(response_cache=llm_cache)
+
+        # Initialize pcap manager DB
+        pcap_manager_db = PCAPManagerDB(db)
+        # 普通上传在解析 multipart 前就拒绝超过限制的请求（预留 1MB 给表单开销）
+        if pcap_manager_db.max_upload_size:
+            app.config['MAX_CONTENT_LENGTH'] = pcap_manager_db.max_upload_size + 1024 * 1024
+
+        # 验证结果缓存：相同规则+相同PCAP+相同引擎版本/配置时直接返回已有结果
+        validation_cache = ValidationCache(
+            db,
+            max_entries=int(os.getenv('VALIDATION_CACHE_MAX_ENTRIES', '5000')),
+            ttl_seconds=int(os.getenv('VALIDATION_CACHE_TTL', str(7 * 24 * 3600)))
+        )
+        user_model = UserModel(DB_PATH, cache_ttl=float(os.getenv('AUTH_USER_CACHE_TTL', '60')),
+                               version_check_interval=float(os.getenv('AUTH_USER_VERSION_CHECK_INTERVAL', '1')))
+        # Agent API Key（只保存哈希；验证结果缓存在进程内，last_used 由后台线程批量写入）
+        api_key_store = APIKeyStore(
+            db,
+            cache_ttl=float(os.getenv('AGENT_KEY_CACHE_TTL', '60')),
+            flush_interval=float(os.getenv('AGENT_KEY_LAST_USED_FLUSH_INTERVAL', '30')),
+            version_check_interval=float(os.getenv('AGENT_KEY_VERSION_CHECK_INTERVAL', '1'))
+        )
+        atexit.register(api_key_store.shutdown)
+
+        # Initialize config manager (after the legacy migrations above, which remove configuration rows)
+        # 配置缓存在进程内，最多每 CONFIG_CACHE_REFRESH_INTERVAL 秒检查一次其他进程的修改
+        config_manager = ConfigManager(db, refresh_interval=float(os.getenv('CONFIG_CACHE_REFRESH_INTERVAL', '1')))
+        # Update the config_manager module's global variable
+        config_manager_module = __import__('config_manager')
+        config_manager_module.config_manager = config_manager
+
+        # 现在完全依赖环境变量进行配置，不再从JSON文件迁移配置
+        # 所有配置应通过 .env 文件进行设置
+
+        # Suricata 安装信息（命令、版本、build-info、配置文件）只探测一次，验证器在请求之间复用；
+        # suricata.yaml 被修改或 Suricata 路径配置变化时重新探测
+        validator_registry = ValidatorRegistry(result_cache=validation_cache, pcap_index=pcap_manager_db)
+        config_manager.add_listener(
+            lambda changed: validator_registry.invalidate() if any(key.startswith('suricata_') for key in changed) else None)
+        # Agent 后台任务队列（任务持久化在 agent_jobs 表中）
+        job_queue = JobQueue(db, workers=int(os.getenv('AGENT_JOB_WORKERS', '4')))
+        job_queue.register_handler('agent_run', lambda params, progress: _run_agent_pipeline(params, progress)[0])
+
+    # 清理被强制结束的 worker 遗留的验证临时目录
+    removed = cleanup_stale_scratch(float(os.getenv('SURICATA_SCRATCH_MAX_AGE', str(6 * 3600))))
+    if removed:
+        print(f"已清理 {removed} 个遗留的验证临时目录")
+    # Probe Suricata here so preloaded workers inherit the result instead of each probing again
+    validator_registry.installation()
+    # Forked workers must not inherit open SQLite handles; each opens its own on first use
+    get_pool(DB_PATH).close_all()
+
+
+def create_app():
+    """
+    Application factory.  The first call creates the shared components and the
+    database schema; later calls (and other threads) just return the app.
+
+    Production: ``gunicorn -c gunicorn.conf.py 'app_v2:create_app()'`` runs it
+    once in the master (preload) before forking the workers.
+    """
+    global _initialized
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                _init_components()
+                _initialized = True
+    return app
 
-# Initialize config manager
-config_manager = ConfigManager(db)
-# Update the config_manager module's global variable
-config_manager_module = __import__('config_manager')
-config_manager_module.config_manager = config_manager
 
-# 现在完全依赖环境变量进行配置，不再从JSON文件迁移配置
-# 所有配置应通过 .env 文件进行设置
+def init_worker():
+    """
+    Per-process startup, idempotent: re-dispatch agent jobs that were still
+    queued when the previous process exited.  Runs in each worker (after the
+    fork) so the job threads belong to the process serving the requests.
+    """
+    global _worker_pid
+    create_app()
+    with _init_lock:
+        if _worker_pid == os.getpid():
+            return
+        _worker_pid = os.getpid()
+    job_queue.recover()
 
-# Initialize pcap manager DB
-from pcap_manager_db import PCAPManagerDB
-pcap_manager_db = PCAPManagerDB(db)
 
-# 注意：为了避免在启动时使用错误的默认值，我们将不在这里创建全局实例
-# 而是在每个请求中动态创建，以确保使用最新的配置
-suricata_validator = None  # 不再使用全局实例
-user_model = UserModel(DB_PATH)
+@app.before_request
+def _ensure_initialized():
+    """Lazy initialization when the app is served without create_app() (e.g. ``flask run``)"""
+    if _worker_pid != os.getpid():
+        init_worker()
 
 
 @app.route('/api/health', methods=['GET'])
@@ -130,7 +263,8 @@ def generate_rule():
         ai_response = llm_client.generate_text(
             prompt,
             temperature=0.1,
-            max_tokens=4096
+            max_tokens=4096,
+            use_cache=data.get('use_llm_cache', True)
         )
         
         # Extract generated rule from AI response
@@ -138,7 +272,13 @@ def generate_rule():
             return jsonify({"error": f"AI调用失败: {ai_response['error']}"}), 502
 
         if 'choices' in ai_response and len(ai_response['choices']) > 0:
-            generated_rule = ai_response['choices'][0]['message']['content'].strip()
+            generated_rule = _extract_llm_rule(ai_response['choices'][0]['message']['content'])
+            
+            # Reject malformed or off-template output before it is stored
+            lint = check_rules(generated_rule)
+            if not lint["valid"]:
+                return jsonify({"error": "生成的规则未通过本地检查", "generated_rule": generated_rule,
+                                "lint": lint, "ai_response": ai_response}), 422
             
             # Save to database
             rule_id = db.insert_rule(
@@ -153,6 +293,7 @@ def generate_rule():
                 "success": True,
                 "rule_id": rule_id,
                 "generated_rule": generated_rule,
+                "lint": lint,
                 "ai_response": ai_response
             })
         else:
@@ -182,7 +323,8 @@ def optimize_rule():
         ai_response = llm_client.generate_text(
             prompt,
             temperature=0.3,
-            max_tokens=4096
+            max_tokens=4096,
+            use_cache=data.get('use_llm_cache', True)
         )
         
         # Extract optimized rule
@@ -190,7 +332,12 @@ def optimize_rule():
             return jsonify({"error": f"AI调用失败: {ai_response['error']}"}), 502
 
         if 'choices' in ai_response and len(ai_response['choices']) > 0:
-            optimized_rule = ai_response['choices'][0]['message']['content'].strip()
+            optimized_rule = _extract_llm_rule(ai_response['choices'][0]['message']['content'])
+            
+            lint = check_rules(optimized_rule)
+            if not lint["valid"]:
+                return jsonify({"error": "优化后的规则未通过本地检查", "optimized_rule": optimized_rule,
+                                "lint": lint, "ai_response": ai_response}), 422
             
             # Update database if rule_id provided
             if rule_id:
@@ -206,6 +353,7 @@ def optimize_rule():
             return jsonify({
                 "success": True,
                 "optimized_rule": optimized_rule,
+                "lint": lint,
                 "ai_response": ai_response
             })
         else:
@@ -215,6 +363,142 @@ def optimize_rule():
         return jsonify({"error": str(e)}), 500
 
 
+def _extract_llm_rule(text):
+    """Rule text from an LLM reply, without a surrounding markdown code fence"""
+    text = text.strip()
+    fence = re.search(r'```(?:\w+)?\s*\n([\s\S]+?)\n```', text)
+    return fence.group(1).strip() if fence else text
+
+
+def _sse_event(payload):
+    return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def _stream_llm_rule(prompt, temperature, stop_at_rule, use_cache, on_complete):
+    """
+    Stream an LLM completion as server-sent events.  Emits ``delta`` events as
+    text arrives and a final ``done`` event carrying ``on_complete(text)``; with
+    ``stop_at_rule`` the provider connection is closed as soon as a complete
+    rule has been received.
+    """
+    stop = (lambda text: extract_complete_rule(text) is not None) if stop_at_rule else None
+
+    def generate():
+        text = ""
+        try:
+            for delta in llm_client.stream_text(prompt, stop=stop, use_cache=use_cache,
+                                                temperature=temperature, max_tokens=4096):
+                text += delta
+                yield _sse_event({"type": "delta", "content": delta})
+            rule = extract_complete_rule(text) if stop_at_rule else None
+            rule_extracted = rule is not None
+            final_text = rule if rule_extracted else _extract_llm_rule(text)
+            if not final_text:
+                yield _sse_event({"type": "error", "error": "AI生成失败"})
+                return
+            done = {"type": "done", "success": True, "rule_extracted": rule_extracted}
+            done.update(on_complete(final_text))
+            yield _sse_event(done)
+        except LLMStreamError as e:
+            yield _sse_event({"type": "error", "error": f"AI调用失败: {e}"})
+        except Exception as e:
+            yield _sse_event({"type": "error", "error": str(e)})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route('/api/rules/generate/stream', methods=['POST'])
+def generate_rule_stream():
+    """Generate a rule and stream it to the client as it is produced (SSE)"""
+    data = request.json or {}
+    vuln_name = data.get('vuln_name', '')
+    vuln_description = data.get('vuln_description', '')
+    vuln_type = data.get('vuln_type', '')
+    poc = data.get('poc', '')
+
+    if not vuln_name or not vuln_description:
+        return jsonify({"error": "缺少必要参数: vuln_name 和 vuln_description"}), 400
+
+    prompt = build_rule_generation_prompt(vuln_name, vuln_description, vuln_type, poc)
+
+    def save(generated_rule):
+        lint = check_rules(generated_rule)
+        if not lint["valid"]:
+            return {"success": False, "error": "生成的规则未通过本地检查",
+                    "generated_rule": generated_rule, "lint": lint}
+        rule_id = db.insert_rule(
+            vuln_name=vuln_name,
+            original_rule=generated_rule,
+            current_rule=generated_rule,
+            vuln_type=vuln_type,
+            description=vuln_description
+        )
+        return {"rule_id": rule_id, "generated_rule": generated_rule, "lint": lint}
+
+    return _stream_llm_rule(prompt, 0.1, data.get('stop_at_rule', True), data.get('use_llm_cache', True), save)
+
+
+@app.route('/api/rules/optimize/stream', methods=['POST'])
+def optimize_rule_stream():
+    """Optimize a rule and stream the result to the client as it is produced (SSE)"""
+    data = request.json or {}
+    rule_id = data.get('rule_id')
+    current_rule = data.get('current_rule', '')
+    feedback = data.get('feedback', '')
+    validation_result = data.get('validation_result', '')
+
+    if not current_rule:
+        return jsonify({"error": "缺少规则内容"}), 400
+
+    prompt = build_rule_optimization_prompt(current_rule, feedback, validation_result)
+
+    def save(optimized_rule):
+        lint = check_rules(optimized_rule)
+        if not lint["valid"]:
+            return {"success": False, "error": "优化后的规则未通过本地检查",
+                    "optimized_rule": optimized_rule, "lint": lint}
+        if rule_id:
+            db.update_rule(rule_id, optimized_rule)
+            db.insert_optimization_history(
+                rule_id=rule_id,
+                original_rule=current_rule,
+                optimized_rule=optimized_rule,
+                feedback=feedback,
+                ai_suggestion=optimized_rule
+            )
+        return {"optimized_rule": optimized_rule, "lint": lint}
+
+    return _stream_llm_rule(prompt, 0.3, data.get('stop_at_rule', True), data.get('use_llm_cache', True), save)
+
+
+@app.route('/api/rules/lint', methods=['POST'])
+def lint_rule():
+    """Parse and lint rule text locally (no Suricata run)"""
+    data = request.json or {}
+    rule_content = data.get('rule_content', '')
+    if not rule_content:
+        return jsonify({"error": "缺少规则内容"}), 400
+    return jsonify({"success": True, "lint": check_rules(rule_content)})
+
+
+@app.route('/api/rules/simulate', methods=['POST'])
+def simulate_rule_matches():
+    """Approximate a rule's content/pcre matches against the HTTP requests of an uploaded PCAP (no Suricata run)"""
+    data = request.json or {}
+    rule_content = data.get('rule_content', '')
+    pcap_filename = data.get('pcap_filename', '')
+    if not rule_content:
+        return jsonify({"error": "缺少规则内容"}), 400
+    if not pcap_filename:
+        return jsonify({"error": "请选择PCAP文件"}), 400
+    samples = pcap_manager_db.get_http_samples(pcap_filename)
+    if samples is None:
+        return jsonify({"error": f"PCAP文件不存在或无法解析: {pcap_filename}"}), 404
+    simulation = simulate_rule(rule_content, samples["requests"], samples["truncated"])
+    return jsonify({"success": True, "simulation": simulation, "truncated": samples["truncated"]})
+
+
 @app.route('/api/rules/validate', methods=['POST'])
 def validate_rule():
     """Validate Suricata rule against PCAP files"""
@@ -225,25 +509,21 @@ def validate_rule():
         # 从环境变量获取默认PCAP路径，优先使用PCAP_DIR（兼容旧配置），然后是PCAP_UPLOAD_DIR
         default_pcap_path = os.getenv('PCAP_DIR') or os.getenv('PCAP_UPLOAD_DIR', os.path.join(os.path.dirname(__file__), 'uploads'))
         pcap_path = data.get('pcap_path', default_pcap_path)
+        workers = data.get('workers')
+        max_alerts = data.get('max_alerts')
+        use_cache = data.get('use_cache', True)
         
         if not rule_content:
             return jsonify({"error": "缺少规则内容"}), 400
         
-        # 使用环境变量配置创建临时SuricataValidator实例
-        from suricata_validator import SuricataValidator
-        # 优先从环境变量获取配置，这是主要的配置源
-        rules_dir = os.getenv('SURICATA_RULES_DIR', '/var/lib/suricata/rules')
-        suricata_config = os.getenv('SURICATA_CONFIG', '/etc/suricata/suricata.yaml')
-        log_dir = os.getenv('SURICATA_LOG_DIR', '/var/log/suricata')
-        
-        current_suricata_validator = SuricataValidator.create_validator(
-            rules_dir=rules_dir,
-            suricata_config=suricata_config,
-            log_dir=log_dir
-        )
+        current_suricata_validator = validator_registry.get_validator()
         
         # Validate the rule
-        validation_result = current_suricata_validator.validate_rule(rule_content, pcap_path)
+        validation_result = current_suricata_validator.validate_rule(
+            rule_content, pcap_path,
+            workers=int(workers) if workers else None,
+            max_alerts=int(max_alerts) if max_alerts else None,
+            use_cache=bool(use_cache))
         
         # Save validation result to database
         if rule_id:
@@ -265,6 +545,62 @@ def validate_rule():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/rules/validate/batch', methods=['POST'])
+def validate_rules_batch():
+    """Validate many rules against one PCAP set with a single engine run per PCAP"""
+    try:
+        data = request.json or {}
+        rules = data.get('rules') or []
+        # rule_ids without content are loaded from the rules table
+        for rule_id in data.get('rule_ids') or []:
+            rules.append({"rule_id": rule_id})
+
+        if not rules:
+            return jsonify({"error": "缺少规则列表: rules 或 rule_ids"}), 400
+
+        for item in rules:
+            if not item.get('rule_content') and item.get('rule_id'):
+                stored = db.get_rule_by_id(item['rule_id'])
+                if stored:
+                    item['rule_content'] = stored['current_rule']
+
+        pcap_filename = data.get('pcap_filename')
+        if pcap_filename:
+            pcap_path = pcap_manager_db.get_pcap_path(pcap_filename)
+            if not pcap_path:
+                return jsonify({"error": "PCAP文件不存在"}), 404
+        else:
+            default_pcap_path = os.getenv('PCAP_DIR') or os.getenv('PCAP_UPLOAD_DIR', os.path.join(os.path.dirname(__file__), 'uploads'))
+            pcap_path = data.get('pcap_path', default_pcap_path)
+        workers = data.get('workers')
+
+        current_suricata_validator = validator_registry.get_validator()
+
+        batch_result = current_suricata_validator.validate_rules_batch(
+            rules, pcap_path, workers=int(workers) if workers else None)
+
+        # Save per-rule validation results to database
+        if batch_result['success']:
+            for entry in batch_result['results']:
+                if entry['rule_id'] and not entry['error']:
+                    db.insert_validation_result(
+                        rule_id=entry['rule_id'],
+                        pcap_path=pcap_path,
+                        matched=entry['matched'],
+                        alert_count=entry['alert_count'],
+                        details=json.dumps(entry['details']),
+                        sid_stats=json.dumps({str(entry['sid']): entry['alert_count']})
+                    )
+
+        return jsonify({
+            "success": True,
+            "batch_result": batch_result
+        })
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/api/rules/<int:rule_id>', methods=['GET'])
 def get_rule(rule_id):
     """Get rule details by ID"""
@@ -282,19 +618,38 @@ def get_rule(rule_id):
 def list_rules():
     """List all rules with pagination"""
     try:
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 20))
+        cursor_token = request.args.get('cursor')
+        total_mode = request.args.get('total', 'exact' if cursor_token is None else 'approx')
+        if total_mode not in ('exact', 'approx', 'none'):
+            return jsonify({"error": "total 参数必须是 exact、approx 或 none"}), 400
+        
+        if cursor_token is not None:
+            # 游标分页: ?cursor=（首页留空）&limit=N，深页耗时不随页码增长
+            limit = min(max(int(request.args.get('limit', request.args.get('per_page', 20))), 1), 500)
+            page_data = db.get_rules_after(cursor_token or None, limit)
+            rules = page_data["rules"]
+            next_cursor = page_data["next_cursor"]
+            pagination = {"limit": limit}
+        else:
+            page = int(request.args.get('page', 1))
+            per_page = int(request.args.get('per_page', 20))
+            rules = db.get_all_rules(page=page, per_page=per_page)
+            next_cursor = encode_cursor(rules[-1]['created_at'], rules[-1]['id']) if len(rules) == per_page else None
+            pagination = {"page": page, "per_page": per_page}
         
-        rules = db.get_all_rules(page=page, per_page=per_page)
-        total = db.get_rules_count()
+        total = None if total_mode == 'none' else db.get_rules_count(approximate=total_mode == 'approx')
         
         return jsonify({
             "success": True,
             "rules": rules,
             "total": total,
-            "page": page,
-            "per_page": per_page
+            # 'approx' 读取触发器维护的计数行，结果同样精确
+            "total_approximate": False,
+            "next_cursor": next_cursor,
+            **pagination
         })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -342,7 +697,8 @@ def get_pcap_config():
         
         return jsonify({
             "success": True,
-            "config": merged_config
+            "config": merged_config,
+            "version": config_manager.version
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -390,14 +746,91 @@ def upload_pcap():
             return jsonify({"error": "只支持PCAP格式文件"}), 400
         
         result = pcap_manager_db.upload_pcap(file, file.filename)
+        return jsonify(result), _pcap_upload_status(result)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# 上传结果 code 到 HTTP 状态码的映射
+PCAP_UPLOAD_ERROR_STATUS = {
+    "too_large": 413,
+    "not_found": 404,
+    "offset_mismatch": 409,
+    "incomplete": 409,
+    "hash_mismatch": 422
+}
+
+
+def _pcap_upload_status(result):
+    if result.get('success'):
+        return 200
+    return PCAP_UPLOAD_ERROR_STATUS.get(result.get('code'), 500)
+
+
+@app.route('/api/pcap/uploads', methods=['POST'])
+def create_pcap_upload():
+    """Start a resumable chunked PCAP upload"""
+    try:
+        data = request.json or {}
+        filename = data.get('filename', '')
+        if not filename:
+            return jsonify({"error": "文件名为空"}), 400
+        if not filename.lower().endswith('.pcap'):
+            return jsonify({"error": "只支持PCAP格式文件"}), 400
+        total_size = data.get('size')
+        result = pcap_manager_db.create_upload_session(
+            filename,
+            total_size=int(total_size) if total_size is not None else None,
+            sha256=data.get('sha256')
+        )
         if result['success']:
-            return jsonify(result), 200
-        else:
-            return jsonify(result), 500
+            result["chunk_size"] = int(os.getenv('PCAP_UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+            return jsonify(result), 201
+        return jsonify(result), _pcap_upload_status(result)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/pcap/uploads/<upload_id>', methods=['GET'])
+def get_pcap_upload(upload_id):
+    """Query a chunked upload; ``received`` is the offset to resume from"""
+    session = pcap_manager_db.get_upload_session(upload_id)
+    if session is None:
+        return jsonify({"error": "上传会话不存在"}), 404
+    return jsonify({"success": True, "upload": session})
+
+
+@app.route('/api/pcap/uploads/<upload_id>', methods=['PUT'])
+def append_pcap_upload(upload_id):
+    """Append the raw request body at ?offset=N (bytes already received)"""
+    try:
+        offset = int(request.args.get('offset', request.headers.get('Upload-Offset', 0)))
+        result = pcap_manager_db.append_upload_chunk(upload_id, offset, request.stream)
+        return jsonify(result), _pcap_upload_status(result)
+    except ValueError:
+        return jsonify({"error": "offset 参数无效"}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/pcap/uploads/<upload_id>/complete', methods=['POST'])
+def complete_pcap_upload(upload_id):
+    """Verify and register a chunked upload"""
+    try:
+        result = pcap_manager_db.complete_upload(upload_id)
+        return jsonify(result), _pcap_upload_status(result)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/pcap/uploads/<upload_id>', methods=['DELETE'])
+def abort_pcap_upload(upload_id):
+    """Abort a chunked upload and discard received data"""
+    if not pcap_manager_db.abort_upload(upload_id):
+        return jsonify({"error": "上传会话不存在"}), 404
+    return jsonify({"success": True, "message": "上传已取消"})
+
+
 @app.route('/api/pcap/list', methods=['GET'])
 def list_pcaps():
     """List all uploaded PCAP files"""
@@ -411,6 +844,20 @@ def list_pcaps():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/pcap/info/<filename>', methods=['GET'])
+def get_pcap_info(filename):
+    """PCAP catalog entry with its content summary (indexed on first request if missing)"""
+    try:
+        pcap = pcap_manager_db.get_pcap_info(filename)
+        if pcap is None:
+            return jsonify({"error": "PCAP文件不存在"}), 404
+        if pcap["packet_count"] is None or request.args.get('reindex') == 'true':
+            pcap = pcap_manager_db.index_pcap(filename) or pcap
+        return jsonify({"success": True, "pcap": pcap})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/api/pcap/delete/<filename>', methods=['DELETE'])
 def delete_pcap(filename):
     """Delete uploaded PCAP file"""
@@ -444,28 +891,14 @@ def validate_with_uploaded_pcap():
         if not pcap_path:
             return jsonify({"error": "PCAP文件不存在"}), 404
         
-        # Get the directory of the PCAP file
-        pcap_dir = os.path.dirname(pcap_path)
-        
-        # Ensure directory exists
-        if not os.path.exists(pcap_dir):
-            return jsonify({"error": "PCAP目录不存在"}), 404
-        
-        # 使用环境变量配置创建临时SuricataValidator实例
-        from suricata_validator import SuricataValidator
-        # 优先从环境变量获取配置，这是主要的配置源
-        rules_dir = os.getenv('SURICATA_RULES_DIR', '/var/lib/suricata/rules')
-        suricata_config = os.getenv('SURICATA_CONFIG', '/etc/suricata/suricata.yaml')
-        log_dir = os.getenv('SURICATA_LOG_DIR', '/var/log/suricata')
+        # Validate against the selected capture only, not every file in its directory
+        if not os.path.isfile(pcap_path):
+            return jsonify({"error": "PCAP文件不存在"}), 404
         
-        current_suricata_validator = SuricataValidator.create_validator(
-            rules_dir=rules_dir,
-            suricata_config=suricata_config,
-            log_dir=log_dir
-        )
+        current_suricata_validator = validator_registry.get_validator(prefilter=data.get('prefilter'))
         
         # Validate the rule
-        validation_result = current_suricata_validator.validate_rule(rule_content, pcap_dir)
+        validation_result = current_suricata_validator.validate_rule(rule_content, pcap_path)
         
         # Save validation result to database
         if rule_id:
@@ -542,41 +975,30 @@ def register():
 
 @app.route('/api/suricata/check', methods=['GET'])
 def check_suricata():
-    """Check if Suricata engine is available"""
+    """Check if Suricata engine is available (discovered once; ?refresh=true probes again)"""
     try:
-        import platform
-        import subprocess
-        import shutil
-        
+        installation = validator_registry.installation(refresh=request.args.get('refresh') == 'true')
         result = {
-            "os": platform.system(),
-            "suricata_available": False,
-            "version": None,
+            "os": installation["platform"],
+            "suricata_available": installation["available"],
+            "binary": installation["binary"],
+            "version": installation["version"],
+            "build_info": installation["build_info"],
             "config_found": False,
             "config_path": None,
-            "rules_dir_exists": False,
-            "log_dir_exists": False,
+            "rules_dir_exists": installation["rules_dir_exists"],
+            "log_dir_exists": installation["log_dir_exists"],
+            "discovered_at": installation["discovered_at"],
             "message": "",
             "recommendation": ""
         }
         
-        # Check if suricata is available
-        suricata_cmd = shutil.which('suricata')
-        
-        if suricata_cmd:
-            result["suricata_available"] = True
-            result["message"] += f"找到Suricata命令: {suricata_cmd}"
-            
-            # Try to get version
-            try:
-                version_result = subprocess.run([suricata_cmd, '--version'], 
-                                              capture_output=True, text=True, timeout=10)
-                if version_result.returncode == 0:
-                    version_line = version_result.stdout.strip().split('\n')[0]
-                    result["version"] = version_line
-                    result["message"] += f", 版本: {version_line}"
-            except Exception as e:
-                result["message"] += f", 但无法获取版本信息: {str(e)}"
+        if installation["available"]:
+            result["message"] += f"找到Suricata命令: {installation['binary']}"
+            if installation["version"]:
+                result["message"] += f", 版本: {installation['version']}"
+            else:
+                result["message"] += ", 但无法获取版本信息"
         else:
             result["message"] = "未找到Suricata命令"
             result["recommendation"] = "请安装Suricata (Ubuntu/Debian: sudo apt-get install suricata)"
@@ -589,53 +1011,26 @@ def check_suricata():
             else:
                 result["recommendation"] += "\n建议配置SSH连接到Linux/Kali系统以进行远程验证。请在系统配置页面设置SSH参数。"
         
-        # Check config file
-        possible_configs = [
-            "/etc/suricata/suricata.yaml",
-            "/usr/local/etc/suricata/suricata.yaml",
-            "/etc/default/suricata",
-            # Also check configured path from environment variable
-            os.getenv('SURICATA_CONFIG', '/etc/suricata/suricata.yaml')
-        ]
-        
-        # Remove duplicates and check each config file
-        unique_configs = list(dict.fromkeys(possible_configs))  # Remove duplicates while preserving order
-        found_configs = []
-        missing_configs = []
-        
-        for config_path in unique_configs:
-            if os.path.exists(config_path):
-                found_configs.append(config_path)
-            else:
-                missing_configs.append(config_path)
-        
+        found_configs = installation["found_configs"]
         if found_configs:
             result["config_found"] = True
             result["config_path"] = found_configs[0]  # Use the first found config
             result["found_configs"] = found_configs
             result["message"] += f", 找到配置文件: {found_configs[0]}"
         else:
-            result["config_found"] = False
-            result["missing_configs"] = missing_configs
-            result["message"] += f", 未找到配置文件。已检查路径: {', '.join(missing_configs)}"
-            
-        # Check if configured directories exist
-        rules_dir = os.getenv('SURICATA_RULES_DIR', '/var/lib/suricata/rules')
-        log_dir = os.getenv('SURICATA_LOG_DIR', '/var/log/suricata')
-        
-        result["rules_dir_exists"] = os.path.exists(rules_dir)
-        result["log_dir_exists"] = os.path.exists(log_dir)
+            result["missing_configs"] = installation["missing_configs"]
+            result["message"] += f", 未找到配置文件。已检查路径: {', '.join(installation['missing_configs'])}"
         
         # Update the message to include actual configured paths
         if result["rules_dir_exists"]:
-            result["message"] += f", 规则目录存在: {rules_dir}"
+            result["message"] += f", 规则目录存在: {installation['rules_dir']}"
         else:
-            result["message"] += f", 规则目录不存在: {rules_dir}"
+            result["message"] += f", 规则目录不存在: {installation['rules_dir']}"
         
         if result["log_dir_exists"]:
-            result["message"] += f", 日志目录存在: {log_dir}"
+            result["message"] += f", 日志目录存在: {installation['log_dir']}"
         else:
-            result["message"] += f", 日志目录不存在: {log_dir}"
+            result["message"] += f", 日志目录不存在: {installation['log_dir']}"
         
         # Final status
         if result["suricata_available"] and result["config_found"]:
@@ -666,9 +1061,8 @@ def get_current_user():
         if user_id is None:
             return jsonify({"error": "无效或已过期的令牌"}), 401
 
-        user = user_model.get_by_id(user_id)
-        if user:
-            safe_user = user_model.to_safe_dict(user)
+        safe_user = user_model.get_snapshot(user_id)
+        if safe_user:
             return jsonify({
                 "success": True,
                 "user": safe_user
@@ -694,159 +1088,192 @@ def list_users():
         if user_id is None:
             return jsonify({"error": "无效或已过期的令牌"}), 401
         
+        cursor_token = request.args.get('cursor')
+        if cursor_token is not None:
+            # 游标分页: ?cursor=（首页留空）&limit=N&total=exact|none
+            limit = min(max(int(request.args.get('limit', request.args.get('per_page', 20))), 1), 500)
+            with_total = request.args.get('total', 'none') == 'exact'
+            users_info = user_model.get_users_after(cursor_token or None, limit, with_total=with_total)
+            return jsonify({
+                "success": True,
+                "users": users_info['users'],
+                "total": users_info['total'],
+                "next_cursor": users_info['next_cursor'],
+                "limit": limit
+            })
+        
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 20))
         
         users_info = user_model.get_all_users(page=page, per_page=per_page)
+        users = users_info['users']
         return jsonify({
             "success": True,
-            "users": users_info['users'],
+            "users": users,
             "total": users_info['total'],
             "page": users_info['page'],
-            "per_page": users_info['per_page']
+            "per_page": users_info['per_page'],
+            "next_cursor": encode_cursor(users[-1]['created_at'], users[-1]['id']) if len(users) == per_page else None
         })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route('/api/agent/run', methods=['POST'])
-def agent_run():
-    """
-    Agent API - 一次调用完成规则生成+验证全流程
-    支持 API Key 认证（X-API-Key header 或 api_key query param）
-    也支持 Bearer token 认证
-
-    请求体:
-      vuln_name: str (必填)
-      vuln_description: str (必填)
-      vuln_type: str (可选)
-      poc: str (可选)
-      pcap_filename: str (可选，已上传的PCAP文件名，不填则跳过验证)
-      auto_optimize: bool (可选，默认false，验证失败时是否自动优化)
-      max_optimize_rounds: int (可选，默认2，最大优化轮次)
-
-    返回:
-      task_id, status, generated_rule, validation_result, optimize_history
-    """
-    try:
-        # 认证：支持 API Key 或 Bearer token
-        api_key_header = request.headers.get('X-API-Key') or request.args.get('api_key')
-        auth_header = request.headers.get('Authorization', '')
-
-        authenticated = False
-        if api_key_header:
-            # 先检查环境变量中的固定 key
-            expected_key = os.getenv('AGENT_API_KEY') or JWT_SECRET
-            if hmac.compare_digest(api_key_header, expected_key):
-                authenticated = True
-            else:
-                # 再检查数据库中动态生成的 key 列表
-                keys_json = db.get_config('agent_api_keys')
-                if keys_json:
-                    db_keys = json.loads(keys_json)
-                    for k in db_keys:
-                        if hmac.compare_digest(api_key_header, k.get('key', '')):
-                            authenticated = True
-                            # 更新最后使用时间
-                            k['last_used'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                            db.set_config('agent_api_keys', json.dumps(db_keys))
-                            break
-        elif auth_header.startswith('Bearer '):
-            token = auth_header.split(' ')[1]
-            if _verify_token(token) is not None:
-                authenticated = True
-
-        if not authenticated:
-            return jsonify({"error": "未授权，请提供有效的 X-API-Key 或 Bearer token"}), 401
-
-        data = request.json or {}
-        vuln_name = data.get('vuln_name', '').strip()
-        vuln_description = data.get('vuln_description', '').strip()
-        vuln_type = data.get('vuln_type', '')
-        poc = data.get('poc', '')
-        pcap_filename = data.get('pcap_filename', '')
-        auto_optimize = data.get('auto_optimize', True)
-        max_fix_rounds = min(int(data.get('max_optimize_rounds', 3)), 5)
+def _authenticate_agent_request() -> bool:
+    """Agent 认证：支持 API Key（X-API-Key header 或 api_key query param）或 Bearer token"""
+    api_key_header = request.headers.get('X-API-Key') or request.args.get('api_key')
+    auth_header = request.headers.get('Authorization', '')
 
-        if not vuln_name or not vuln_description:
-            return jsonify({"error": "缺少必要参数: vuln_name 和 vuln_description"}), 400
+    authenticated = False
+    if api_key_header:
+        # 先检查环境变量中的固定 key
+        expected_key = os.getenv('AGENT_API_KEY') or JWT_SECRET
+        if hmac.compare_digest(api_key_header, expected_key):
+            authenticated = True
+        elif api_key_store.verify(api_key_header) is not None:
+            # 再检查数据库中动态生成的 key（按哈希索引查找，使用时间批量写入）
+            authenticated = True
+    elif auth_header.startswith('Bearer '):
+        token = auth_header.split(' ')[1]
+        if _verify_token(token) is not None:
+            authenticated = True
+    return authenticated
 
-        result = {
-            "status": "started",
-            "vuln_name": vuln_name,
-            "vuln_type": vuln_type,
-            "rule_id": None,
-            "generated_rule": None,
-            "validation_result": None,
-            "optimize_history": [],
-            "final_rule": None,
-            "final_status": "draft",
-            "fix_rounds": 0,
-            "elapsed_seconds": 0,
-            "steps": []
-        }
-        _start_time = datetime.now(timezone.utc)
 
-        # Step 1: 生成规则
-        result["steps"].append({"step": "generate", "status": "running"})
-        prompt = build_rule_generation_prompt(vuln_name, vuln_description, vuln_type, poc)
-        ai_response = llm_client.generate_text(prompt, temperature=0.1, max_tokens=4096)
+def _pre_validation_gate(rule_text, tried_rules):
+    """
+    Local checks a fix-loop candidate must pass before it costs an engine run.
+    Returns None to validate the rule (and records it in tried_rules), otherwise
+    a dict describing why the round is skipped.
+    """
+    lint = check_rules(rule_text)
+    if not lint["valid"]:
+        return {"reason": "invalid", "message": "未通过本地检查: " + "; ".join(lint["errors"]), "lint": lint}
+    fingerprint = rule_fingerprint(rule_text)
+    if fingerprint in tried_rules:
+        return {"reason": "duplicate", "message": "与本任务中已验证过的规则等价"}
+    tried_rules.add(fingerprint)
+    return None
 
-        if 'error' in ai_response:
-            result["status"] = "failed"
-            result["steps"][-1]["status"] = "failed"
-            result["steps"][-1]["error"] = ai_response['error']
-            return jsonify(result), 502
-
-        if not ('choices' in ai_response and len(ai_response['choices']) > 0):
-            result["status"] = "failed"
-            result["steps"][-1]["status"] = "failed"
-            result["steps"][-1]["error"] = "AI未返回有效内容"
-            return jsonify(result), 500
 
-        generated_rule = ai_response['choices'][0]['message']['content'].strip()
-        # 清洗 markdown 代码块（```suricata ... ``` 或 ``` ... ```）
-        import re as _re
-        _fence = _re.search(r'```(?:\w+)?\s*\n([\s\S]+?)\n```', generated_rule)
-        if _fence:
-            generated_rule = _fence.group(1).strip()
-        rule_id = db.insert_rule(
-            vuln_name=vuln_name,
-            original_rule=generated_rule,
-            current_rule=generated_rule,
-            vuln_type=vuln_type,
-            description=vuln_description
-        )
+def _run_agent_pipeline(data, progress=None):
+    """
+    Agent 流水线：生成规则 → 验证 → 自动修复（最多N次）→ 结果入库
+    progress(result) 在每一步完成后被调用（后台任务用它保存中间结果）
+    返回 (result, http_status)
+    """
+    progress = progress or (lambda partial: None)
+    vuln_name = data.get('vuln_name', '').strip()
+    vuln_description = data.get('vuln_description', '').strip()
+    vuln_type = data.get('vuln_type', '')
+    poc = data.get('poc', '')
+    pcap_filename = data.get('pcap_filename', '')
+    auto_optimize = data.get('auto_optimize', True)
+    max_fix_rounds = min(int(data.get('max_optimize_rounds', 3)), 5)
+    use_llm_cache = data.get('use_llm_cache', True)
+
+    result = {
+        "status": "started",
+        "vuln_name": vuln_name,
+        "vuln_type": vuln_type,
+        "rule_id": None,
+        "generated_rule": None,
+        "validation_result": None,
+        "optimize_history": [],
+        "final_rule": None,
+        "final_status": "draft",
+        "fix_rounds": 0,
+        "elapsed_seconds": 0,
+        "steps": []
+    }
+    _start_time = datetime.now(timezone.utc)
+
+    # Step 1: 生成规则
+    result["steps"].append({"step": "generate", "status": "running"})
+    prompt = build_rule_generation_prompt(vuln_name, vuln_description, vuln_type, poc)
+    ai_response = llm_client.generate_text(prompt, temperature=0.1, max_tokens=4096, use_cache=use_llm_cache)
+
+    if 'error' in ai_response:
+        result["status"] = "failed"
+        result["steps"][-1]["status"] = "failed"
+        result["steps"][-1]["error"] = ai_response['error']
+        result["error"] = f"AI调用失败: {ai_response['error']}"
+        return result, 502
+
+    if not ('choices' in ai_response and len(ai_response['choices']) > 0):
+        result["status"] = "failed"
+        result["steps"][-1]["status"] = "failed"
+        result["steps"][-1]["error"] = "AI未返回有效内容"
+        result["error"] = "AI未返回有效内容"
+        return result, 500
+
+    # 清洗 markdown 代码块（```suricata ... ``` 或 ``` ... ```）
+    generated_rule = _extract_llm_rule(ai_response['choices'][0]['message']['content'])
+    lint = check_rules(generated_rule)
+    result["steps"][-1]["lint"] = lint
+    if not lint["valid"]:
+        result["status"] = "failed"
         result["generated_rule"] = generated_rule
-        result["final_rule"] = generated_rule
-        result["rule_id"] = rule_id
-        result["steps"][-1]["status"] = "done"
-        result["steps"][-1]["rule"] = generated_rule
-
-        # Step 2: 验证+修复循环（如果提供了 pcap_filename）
-        if pcap_filename:
-            pcap_path = pcap_manager_db.get_pcap_path(pcap_filename)
-            if not pcap_path:
-                result["steps"].append({"step": "validate", "status": "skipped", "reason": f"PCAP文件不存在: {pcap_filename}"})
-                result["final_status"] = "draft"
-            else:
-                pcap_dir = os.path.dirname(pcap_path)
-                rules_dir = os.getenv('SURICATA_RULES_DIR', '/var/lib/suricata/rules')
-                suricata_config = os.getenv('SURICATA_CONFIG', '/etc/suricata/suricata.yaml')
-                log_dir = os.getenv('SURICATA_LOG_DIR', '/var/log/suricata')
-
-                current_rule = generated_rule
-                validation_result = None
-                fix_round = 0
-                final_status = 'draft'
-
-                while True:
-                    # 执行验证
-                    step_name = 'validate' if fix_round == 0 else f'validate_after_fix_{fix_round}'
-                    result["steps"].append({"step": step_name, "status": "running"})
-
-                    validator = SuricataValidator.create_validator(rules_dir, suricata_config, log_dir)
-                    vr = validator.validate_rule(current_rule, pcap_dir)
+        result["steps"][-1]["status"] = "failed"
+        result["steps"][-1]["error"] = "生成的规则未通过本地检查"
+        result["error"] = "生成的规则未通过本地检查: " + "; ".join(lint["errors"])
+        return result, 422
+    rule_id = db.insert_rule(
+        vuln_name=vuln_name,
+        original_rule=generated_rule,
+        current_rule=generated_rule,
+        vuln_type=vuln_type,
+        description=vuln_description
+    )
+    result["generated_rule"] = generated_rule
+    result["final_rule"] = generated_rule
+    result["rule_id"] = rule_id
+    result["steps"][-1]["status"] = "done"
+    result["steps"][-1]["rule"] = generated_rule
+    progress(result)
+
+    # Step 2: 验证+修复循环（如果提供了 pcap_filename）
+    if pcap_filename:
+        pcap_path = pcap_manager_db.get_pcap_path(pcap_filename)
+        if not pcap_path:
+            result["steps"].append({"step": "validate", "status": "skipped", "reason": f"PCAP文件不存在: {pcap_filename}"})
+            result["final_status"] = "draft"
+        else:
+            current_rule = generated_rule
+            validation_result = None
+            fix_round = 0
+            final_status = 'draft'
+            tried_rules = {rule_fingerprint(generated_rule)}
+            # PCAP中的HTTP请求样本（入库后首次使用时提取并缓存），用于本地模拟匹配
+            http_samples = None
+            if os.getenv('AGENT_HTTP_SIMULATION', 'true').lower() == 'true':
+                http_samples = pcap_manager_db.get_http_samples(pcap_filename)
+
+            while True:
+                # 执行验证
+                step_name = 'validate' if fix_round == 0 else f'validate_after_fix_{fix_round}'
+                result["steps"].append({"step": step_name, "status": "running"})
+
+                simulation = None
+                if http_samples and http_samples["requests"]:
+                    simulation = simulate_rule(current_rule, http_samples["requests"], http_samples["truncated"])
+                    result["steps"][-1]["simulation"] = simulation
+
+                if simulation and simulation["verdict"] == "no_match":
+                    # 模拟确定没有任何请求能命中，不必运行引擎，直接进入修复
+                    vr = {
+                        "matched": False,
+                        "alert_count": 0,
+                        "engine_status": "simulated_no_match",
+                        "simulation": simulation,
+                        "details": [],
+                        "sid_stats": {}
+                    }
+                    result["steps"][-1].update({"status": "simulated", "matched": False, "alert_count": 0})
+                else:
+                    vr = validator_registry.get_validator().validate_rule(current_rule, pcap_path)
 
                     db.insert_validation_result(
                         rule_id=rule_id,
@@ -856,89 +1283,219 @@ def agent_run():
                         details=json.dumps(vr['details']),
                         sid_stats=json.dumps(vr['sid_stats'])
                     )
-                    validation_result = vr
                     result["steps"][-1].update({
                         "status": "done",
                         "matched": vr['matched'],
                         "alert_count": vr['alert_count']
                     })
-
-                    if vr['matched']:
-                        # 验证通过，写入数据库并标记合格
-                        final_status = 'validated'
-                        db.update_rule(rule_id, current_rule, status='validated')
-                        break
-
-                    if not auto_optimize or fix_round >= max_fix_rounds:
-                        # 不启用自动修复，或超过最大修复次数，标记不合格
-                        final_status = 'failed_validation'
-                        db.update_rule(rule_id, current_rule, status='failed_validation')
-                        break
-
-                    # 尝试修复
+                validation_result = vr
+                progress(result)
+
+                if vr['matched']:
+                    # 验证通过，写入数据库并标记合格
+                    final_status = 'validated'
+                    db.update_rule(rule_id, current_rule, status='validated')
+                    break
+
+                if not auto_optimize or fix_round >= max_fix_rounds:
+                    # 不启用自动修复，或超过最大修复次数，标记不合格
+                    final_status = 'failed_validation'
+                    db.update_rule(rule_id, current_rule, status='failed_validation')
+                    break
+
+                # 尝试修复：每个候选规则先过本地闸门（语法/模板检查、与已试规则去重），
+                # 只有新的、格式正确的规则才会运行引擎
+                candidate = None
+                gate_feedback = ""
+                while candidate is None and fix_round < max_fix_rounds:
                     fix_round += 1
                     result["steps"].append({"step": f"fix_round_{fix_round}", "status": "running"})
 
                     opt_prompt = build_rule_optimization_prompt(
                         current_rule,
-                        feedback=f"第{fix_round}次修复：验证未匹配，请优化规则以提高检测率",
+                        feedback=f"第{fix_round}次修复：验证未匹配，请优化规则以提高检测率{gate_feedback}",
                         validation_result=json.dumps(vr, ensure_ascii=False)
                     )
-                    opt_response = llm_client.generate_text(opt_prompt, temperature=0.3, max_tokens=4096)
+                    opt_response = llm_client.generate_text(opt_prompt, temperature=0.3, max_tokens=4096,
+                                                            use_cache=use_llm_cache)
 
                     if 'error' in opt_response or 'choices' not in opt_response:
                         result["steps"][-1]["status"] = "failed"
                         result["steps"][-1]["error"] = opt_response.get('error', 'AI修复失败')
-                        final_status = 'failed_validation'
-                        db.update_rule(rule_id, current_rule, status='failed_validation')
                         break
 
-                    optimized_rule = opt_response['choices'][0]['message']['content'].strip()
-                    _fence2 = _re.search(r'```(?:\w+)?\s*\n([\s\S]+?)\n```', optimized_rule)
-                    if _fence2:
-                        optimized_rule = _fence2.group(1).strip()
-                    db.update_rule(rule_id, optimized_rule)
-                    db.insert_optimization_history(
-                        rule_id=rule_id,
-                        original_rule=current_rule,
-                        optimized_rule=optimized_rule,
-                        feedback=f"agent第{fix_round}次自动修复",
-                        ai_suggestion=optimized_rule
-                    )
-                    result["optimize_history"].append({
-                        "round": fix_round,
-                        "original_rule": current_rule,
-                        "optimized_rule": optimized_rule
-                    })
+                    optimized_rule = _extract_llm_rule(opt_response['choices'][0]['message']['content'])
                     result["steps"][-1].update({
                         "status": "done",
                         "optimized_rule": optimized_rule
                     })
-                    current_rule = optimized_rule
-                    result["final_rule"] = optimized_rule
+                    skip = _pre_validation_gate(optimized_rule, tried_rules)
+                    if skip:
+                        result["steps"].append(dict({"step": f"validate_after_fix_{fix_round}",
+                                                     "status": "skipped"}, **skip))
+                        result["optimize_history"].append({
+                            "round": fix_round,
+                            "original_rule": current_rule,
+                            "optimized_rule": optimized_rule,
+                            "skipped": skip["reason"]
+                        })
+                        gate_feedback = f"。上一次输出{skip['message']}"
+                        progress(result)
+                        continue
+                    candidate = optimized_rule
+
+                if candidate is None:
+                    # AI调用失败，或修复次数内没有得到可验证的新规则
+                    final_status = 'failed_validation'
+                    db.update_rule(rule_id, current_rule, status='failed_validation')
+                    break
+
+                db.update_rule(rule_id, candidate)
+                db.insert_optimization_history(
+                    rule_id=rule_id,
+                    original_rule=current_rule,
+                    optimized_rule=candidate,
+                    feedback=f"agent第{fix_round}次自动修复",
+                    ai_suggestion=candidate
+                )
+                result["optimize_history"].append({
+                    "round": fix_round,
+                    "original_rule": current_rule,
+                    "optimized_rule": candidate
+                })
+                current_rule = candidate
+                result["final_rule"] = candidate
+                progress(result)
 
-                result["validation_result"] = validation_result
-                result["final_status"] = final_status
-                result["fix_rounds"] = fix_round
-        else:
-            result["steps"].append({"step": "validate", "status": "skipped", "reason": "未提供pcap_filename"})
-            result["final_status"] = "draft"
+            result["validation_result"] = validation_result
+            result["final_status"] = final_status
+            result["fix_rounds"] = fix_round
+    else:
+        result["steps"].append({"step": "validate", "status": "skipped", "reason": "未提供pcap_filename"})
+        result["final_status"] = "draft"
 
-        result["status"] = "completed"
-        result["elapsed_seconds"] = round((datetime.now(timezone.utc) - _start_time).total_seconds(), 1)
-        return jsonify(result)
+    result["status"] = "completed"
+    result["elapsed_seconds"] = round((datetime.now(timezone.utc) - _start_time).total_seconds(), 1)
+    return result, 200
+
+
+
+@app.route('/api/agent/run', methods=['POST'])
+def agent_run():
+    """
+    Agent API - 一次调用完成规则生成+验证全流程
+    支持 API Key 认证（X-API-Key header 或 api_key query param）
+    也支持 Bearer token 认证
+
+    请求体:
+      vuln_name: str (必填)
+      vuln_description: str (必填)
+      vuln_type: str (可选)
+      poc: str (可选)
+      pcap_filename: str (可选，已上传的PCAP文件名，不填则跳过验证)
+      auto_optimize: bool (可选，默认false，验证失败时是否自动优化)
+      max_optimize_rounds: int (可选，默认2，最大优化轮次)
+      async: bool (可选，默认false，为true时立即返回task_id，通过 /api/agent/jobs/<task_id> 轮询)
+
+    返回:
+      task_id, status, generated_rule, validation_result, optimize_history
+    """
+    try:
+        if not _authenticate_agent_request():
+            return jsonify({"error": "未授权，请提供有效的 X-API-Key 或 Bearer token"}), 401
+
+        data = request.json or {}
+        if not data.get('vuln_name', '').strip() or not data.get('vuln_description', '').strip():
+            return jsonify({"error": "缺少必要参数: vuln_name 和 vuln_description"}), 400
+
+        if data.get('async'):
+            return _submit_agent_job(data)
+
+        result, status_code = _run_agent_pipeline(data)
+        return jsonify(result), status_code
 
     except Exception as e:
         return jsonify({"error": str(e), "status": "failed"}), 500
 
 
+def _submit_agent_job(data):
+    """把 Agent 流水线放入后台任务队列，立即返回 task_id"""
+    params = {k: v for k, v in data.items() if k != 'async'}
+    task_id = job_queue.submit('agent_run', params)
+    return jsonify({
+        "success": True,
+        "task_id": task_id,
+        "status": "queued",
+        "status_url": f"/api/agent/jobs/{task_id}",
+        "result_url": f"/api/agent/jobs/{task_id}/result"
+    }), 202
+
+
+@app.route('/api/agent/jobs', methods=['POST'])
+def agent_jobs_submit():
+    """提交 Agent 后台任务，立即返回 task_id"""
+    try:
+        if not _authenticate_agent_request():
+            return jsonify({"error": "未授权，请提供有效的 X-API-Key 或 Bearer token"}), 401
+
+        data = request.json or {}
+        if not data.get('vuln_name', '').strip() or not data.get('vuln_description', '').strip():
+            return jsonify({"error": "缺少必要参数: vuln_name 和 vuln_description"}), 400
+
+        return _submit_agent_job(data)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/agent/jobs', methods=['GET'])
+def agent_jobs_list():
+    """列出最近的 Agent 后台任务"""
+    if not _authenticate_agent_request():
+        return jsonify({"error": "未授权，请提供有效的 X-API-Key 或 Bearer token"}), 401
+
+    status = request.args.get('status')
+    limit = min(int(request.args.get('limit', 50)), 500)
+    return jsonify({"success": True, "jobs": job_queue.list_jobs(status=status, limit=limit)})
+
+
+@app.route('/api/agent/jobs/<task_id>', methods=['GET'])
+def agent_job_status(task_id):
+    """查询 Agent 后台任务状态（包含已完成步骤的中间结果）"""
+    if not _authenticate_agent_request():
+        return jsonify({"error": "未授权，请提供有效的 X-API-Key 或 Bearer token"}), 401
+
+    job = job_queue.get(task_id)
+    if not job:
+        return jsonify({"error": "任务不存在"}), 404
+    return jsonify({"success": True, "job": job})
+
+
+@app.route('/api/agent/jobs/<task_id>/result', methods=['GET'])
+def agent_job_result(task_id):
+    """获取 Agent 后台任务的最终结果；未完成时返回 202"""
+    if not _authenticate_agent_request():
+        return jsonify({"error": "未授权，请提供有效的 X-API-Key 或 Bearer token"}), 401
+
+    job = job_queue.get(task_id)
+    if not job:
+        return jsonify({"error": "任务不存在"}), 404
+    if job['status'] in ('queued', 'running'):
+        return jsonify({"task_id": task_id, "status": job['status']}), 202
+    return jsonify({
+        "task_id": task_id,
+        "status": job['status'],
+        "error": job['error'],
+        "result": job['result']
+    })
+
+
 @app.route('/api/agent/status', methods=['GET'])
 def agent_status():
     """返回 Agent API 的基本信息和配置状态"""
     agent_api_key_configured = bool(os.getenv('AGENT_API_KEY'))
-    suricata_config = os.getenv('SURICATA_CONFIG', '/etc/suricata/suricata.yaml')
-    import shutil
-    suricata_available = shutil.which('suricata') is not None
+    installation = validator_registry.installation()
+    suricata_config = installation["config_path"]
+    suricata_available = installation["available"]
 
     return jsonify({
         "name": "Suricata Rule Agent API",
@@ -950,6 +1507,10 @@ def agent_status():
             "suricata_config": suricata_config,
             "llm_provider": os.getenv('LLM_PROVIDER', 'unknown')
         },
+        "llm_connections": llm_client.connection_stats(),
+        "llm_cache": llm_cache.stats() if llm_cache else {"enabled": False},
+        "validation_cache": validation_cache.stats(),
+        "job_queue": job_queue.stats(),
         "auth_methods": [
             "X-API-Key header: 使用 AGENT_API_KEY 环境变量配置的密钥",
             "Authorization: Bearer <token>: 使用登录接口获取的token"
@@ -958,7 +1519,17 @@ def agent_status():
             "POST /api/agent/run": {
                 "description": "生成规则并可选验证，验证失败时自动修复",
                 "required": ["vuln_name", "vuln_description"],
-                "optional": ["vuln_type", "poc", "pcap_filename", "auto_optimize", "max_optimize_rounds"]
+                "optional": ["vuln_type", "poc", "pcap_filename", "auto_optimize", "max_optimize_rounds", "use_llm_cache", "async"]
+            },
+            "POST /api/agent/jobs": {
+                "description": "提交后台任务，立即返回 task_id",
+                "required": ["vuln_name", "vuln_description"]
+            },
+            "GET /api/agent/jobs/<task_id>": {
+                "description": "查询任务状态及已完成步骤"
+            },
+            "GET /api/agent/jobs/<task_id>/result": {
+                "description": "获取任务最终结果，未完成时返回 202"
             }
         },
         "final_status_values": {
@@ -989,8 +1560,8 @@ def _require_admin(request):
     user_id = _verify_token(token)
     if user_id is None:
         return None
-    user = user_model.get_by_id(user_id)
-    if not user or user.get('role') != 'admin':
+    user = user_model.get_snapshot(user_id)
+    if not user or user.get('role') != 'admin' or not user.get('is_active', 1):
         return None
     return user_id
 
@@ -1001,13 +1572,7 @@ def agent_keys_list():
     if _require_admin(request) is None:
         return jsonify({"error": "需要管理员权限"}), 403
 
-    keys_json = db.get_config('agent_api_keys')
-    keys = json.loads(keys_json) if keys_json else []
-    safe_keys = [
-        {**k, "key_preview": k["key"][:8] + "****"}
-        for k in keys
-    ]
-    return jsonify({"success": True, "keys": safe_keys})
+    return jsonify({"success": True, "keys": api_key_store.list_keys()})
 
 
 @app.route('/api/agent/keys', methods=['POST'])
@@ -1019,18 +1584,8 @@ def agent_keys_create():
     data = request.json or {}
     label = data.get('label', '').strip() or f"key_{datetime.now().strftime('%Y%m%d%H%M%S')}"
 
-    new_key = secrets.token_urlsafe(32)
-    keys_json = db.get_config('agent_api_keys')
-    keys = json.loads(keys_json) if keys_json else []
-    keys.append({
-        "id": secrets.token_hex(8),
-        "label": label,
-        "key": new_key,
-        "created_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-        "last_used": None
-    })
-    db.set_config('agent_api_keys', json.dumps(keys))
-    return jsonify({"success": True, "key": new_key, "label": label, "message": "请妥善保存，此后不再显示完整密钥"})
+    new_key = api_key_store.create_key(label)
+    return jsonify({"success": True, "key": new_key["key"], "label": label, "message": "请妥善保存，此后不再显示完整密钥"})
 
 
 @app.route('/api/agent/keys/<key_id>', methods=['DELETE'])
@@ -1039,13 +1594,8 @@ def agent_keys_delete(key_id):
     if _require_admin(request) is None:
         return jsonify({"error": "需要管理员权限"}), 403
 
-    keys_json = db.get_config('agent_api_keys')
-    keys = json.loads(keys_json) if keys_json else []
-    original_len = len(keys)
-    keys = [k for k in keys if k['id'] != key_id]
-    if len(keys) == original_len:
+    if not api_key_store.delete_key(key_id):
         return jsonify({"error": "Key不存在"}), 404
-    db.set_config('agent_api_keys', json.dumps(keys))
     return jsonify({"success": True})
 
 
@@ -1174,14 +1724,12 @@ def build_rule_optimization_prompt(current_rule, feedback, validation_result):
 
 
 if __name__ == '__main__':
-    # Initialize database and ensure directory exists
-    db_dir = os.path.dirname(db.db_path)
-    if db_dir:
-        os.makedirs(db_dir, exist_ok=True)
-    db.init_db()
+    # Development server; for production use gunicorn (see gunicorn.conf.py)
+    create_app()
+    init_worker()
     
     # Check if debug mode is enabled via environment variable
     debug_mode = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
     
-    # Run Flask app
-    app.run(host='0.0.0.0', port=5000, debug=debug_mode)
\ No newline at end of file
+    # Run Flask app; validations use per-run scratch log dirs, so threaded serving is safe
+    app.run(host='0.0.0.0', port=5000, debug=debug_mode, threaded=True)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Database benchmark - 对比连接池(WAL)与每次新建连接时 /api/rules 和 /api/auth/me 的吞吐量
+
+用法: python benchmark_db_pool.py [请求数] [并发线程数]
+"""
+
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import tempfile
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+WORKDIR = tempfile.mkdtemp(prefix='db_bench_')
+os.environ['DB_PATH'] = os.path.join(WORKDIR, 'bench.db')
+os.environ.setdefault('LLM_API_KEY', 'benchmark')
+
+import db_pool
+import app_v2
+
+app_v2.create_app()
+
+
+class UnpooledConnections:
+    """Previous behaviour: permission checks and a fresh sqlite3.connect per query"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def acquire(self):
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+        os.access(db_dir, os.W_OK)
+        os.path.exists(self.db_path) and os.access(self.db_path, os.W_OK)
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+
+def _seed(count=2000):
+    for i in range(count):
+        app_v2.db.insert_rule(
+            vuln_name=f"漏洞{i}",
+            original_rule=f'alert http any any -> any any (msg:"漏洞{i}"; sid:{9000000 + i}; rev:1;)',
+            current_rule=f'alert http any any -> any any (msg:"漏洞{i}"; sid:{9000000 + i}; rev:1;)'
+        )
+
+
+def _run(client_paths, headers, requests_total, threads):
+    per_thread = requests_total // threads
+    errors = []
+
+    def worker():
+        client = app_v2.app.test_client()
+        for i in range(per_thread):
+            response = client.get(client_paths[i % len(client_paths)], headers=headers)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    assert not errors, f"请求失败: {errors[:5]}"
+    return per_thread * threads / elapsed
+
+
+def main():
+    requests_total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    db_path = os.environ['DB_PATH']
+    try:
+        _seed()
+        client = app_v2.app.test_client()
+        token = client.post('/api/auth/login', json={"username": "admin", "password": "admin123"}).json['access_token']
+        headers = {"Authorization": f"Bearer {token}"}
+        pool = db_pool.get_pool(db_path)
+
+        print(f"{'endpoint':<28}{'unpooled req/s':>16}{'pooled req/s':>16}{'speedup':>10}")
+        for name, paths in (("/api/rules", ["/api/rules?page=1", "/api/rules?page=5"]),
+                            ("/api/auth/me", ["/api/auth/me"])):
+            db_pool._pools[os.path.abspath(db_path)] = UnpooledConnections(db_path)
+            baseline = _run(paths, headers, requests_total, threads)
+            db_pool._pools[os.path.abspath(db_path)] = pool
+            pooled = _run(paths, headers, requests_total, threads)
+            print(f"{name:<28}{baseline:>16.1f}{pooled:>16.1f}{pooled / baseline:>9.2f}x")
+        print(f"pool stats: {pool.stats}")
+    finally:
+        app_v2.job_queue.shutdown(wait=False)
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,15 +3,108 @@
 # Configuration Manager Module
 
 import os
+import copy
 import json
-from typing import Dict, Optional
+import time
+import threading
+from typing import Callable, Dict, Optional
+
+
+def _decode(value_str: str):
+    try:
+        return json.loads(value_str)
+    except (json.JSONDecodeError, TypeError):
+        return value_str
 
 
 class ConfigManager:
-    def __init__(self, db):
+    """
+    Read-through cache over the ``configurations`` table.
+
+    All values are loaded once and served from memory.  Every write through
+    this class bumps a counter in ``config_version`` in the same transaction;
+    a process re-reads the table only when that counter has moved, and checks
+    it at most every ``refresh_interval`` seconds, so workers sharing the
+    database converge within that interval.  Listeners registered with
+    ``add_listener`` receive the set of changed keys after local writes and
+    after reloads that changed something.
+    """
+
+    def __init__(self, db, refresh_interval: float = 1.0):
         self.db = db
+        self.refresh_interval = refresh_interval
+        self._values: Optional[Dict] = None
+        self._version = None
+        self._checked_at = 0.0
+        self._listeners = []
+        self._lock = threading.RLock()
+        self.init_version_table()
         self.load_or_create_defaults()
 
+    def init_version_table(self):
+        """Create the single-row change counter"""
+        conn = self.db.get_connection()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS config_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            )
+        ''')
+        conn.execute('INSERT OR IGNORE INTO config_version (id, version) VALUES (1, 0)')
+        conn.commit()
+        conn.close()
+
+    @property
+    def version(self) -> int:
+        """Version of the cached configuration"""
+        self._current()
+        return self._version
+
+    def add_listener(self, callback: Callable[[set], None]):
+        """Call callback(changed_keys) whenever configuration values change"""
+        self._listeners.append(callback)
+
+    def _notify(self, changed: set):
+        for callback in list(self._listeners):
+            try:
+                callback(changed)
+            except Exception as e:
+                print(f"Warning: 配置变更回调失败: {e}")
+
+    def _read_version(self, conn) -> int:
+        row = conn.execute('SELECT version FROM config_version WHERE id = 1').fetchone()
+        return row['version'] if row else 0
+
+    def _current(self) -> Dict:
+        """Cached values, reloaded when another writer has bumped the version"""
+        now = time.time()
+        changed = set()
+        with self._lock:
+            if self._values is not None and now - self._checked_at < self.refresh_interval:
+                return self._values
+            conn = self.db.get_connection()
+            try:
+                version = self._read_version(conn)
+                if self._values is None or version != self._version:
+                    rows = conn.execute('SELECT config_key, config_value FROM configurations').fetchall()
+                    values = {row['config_key']: _decode(row['config_value']) for row in rows}
+                    if self._values is not None:
+                        changed = {key for key in set(values) | set(self._values)
+                                   if values.get(key) != self._values.get(key)}
+                    self._values, self._version = values, version
+            finally:
+                conn.close()
+            self._checked_at = now
+            values = self._values
+        if changed:
+            self._notify(changed)
+        return values
+
+    def invalidate(self):
+        """Drop the cache; the next read reloads from the database"""
+        with self._lock:
+            self._values = None
+
     def load_or_create_defaults(self):
         """Load configuration or create defaults if they don't exist"""
         # Define default configuration values from environment variables or hardcoded defaults
@@ -27,51 +120,63 @@ class ConfigManager:
             "ssh_key": os.getenv('SSH_KEY', '')
         }
         
-        # Load or create each config value
-        for key, default_value in defaults.items():
-            value = self.db.get_config(key)
-            if value is None:
-                # Convert string value to appropriate type if needed
-                self.db.set_config(key, json.dumps(default_value))
+        # Create the values that do not exist yet
+        current = self._current()
+        missing = {key: value for key, value in defaults.items() if key not in current}
+        if missing:
+            self.update_configs(missing)
 
     def get_config(self, key: str, default=None):
         """Get configuration value by key"""
-        value_str = self.db.get_config(key)
-        if value_str is not None:
-            try:
-                return json.loads(value_str)
-            except (json.JSONDecodeError, TypeError):
-                return value_str
-        return default
+        values = self._current()
+        if key not in values:
+            return default
+        return copy.deepcopy(values[key])
 
     def set_config(self, key: str, value) -> bool:
         """Set configuration value by key"""
-        try:
-            # Serialize the value to JSON string
-            value_str = json.dumps(value)
-            return self.db.set_config(key, value_str)
-        except Exception as e:
-            print(f"Error serializing config value for {key}: {e}")
-            return False
+        return self.update_configs({key: value})
 
     def get_all_configs(self) -> Dict[str, any]:
         """Get all configuration values"""
-        all_configs = self.db.get_all_configs()
-        result = {}
-        for key, value_str in all_configs.items():
-            try:
-                result[key] = json.loads(value_str)
-            except (json.JSONDecodeError, TypeError):
-                result[key] = value_str
-        return result
+        return copy.deepcopy(self._current())
 
     def update_configs(self, configs: Dict[str, any]) -> bool:
-        """Update multiple configuration values"""
-        success = True
-        for key, value in configs.items():
-            if not self.set_config(key, value):
-                success = False
-        return success
+        """Update multiple configuration values in one transaction"""
+        try:
+            # Serialize the values to JSON strings
+            encoded = {key: json.dumps(value) for key, value in configs.items()}
+        except Exception as e:
+            print(f"Error serializing config values for {', '.join(configs)}: {e}")
+            return False
+        if not encoded:
+            return True
+
+        with self._lock:
+            conn = self.db.get_connection()
+            try:
+                conn.executemany('''
+                    INSERT OR REPLACE INTO configurations (config_key, config_value, updated_at)
+                    VALUES (?, ?, CURRENT_TIMESTAMP)
+                ''', list(encoded.items()))
+                conn.execute('UPDATE config_version SET version = version + 1 WHERE id = 1')
+                version = self._read_version(conn)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Error setting configs {', '.join(configs)}: {e}")
+                return False
+            finally:
+                conn.close()
+            if self._values is not None and version == self._version + 1:
+                # Nobody else wrote in between: apply the change to the cache directly
+                for key, value_str in encoded.items():
+                    self._values[key] = _decode(value_str)
+                self._version = version
+            else:
+                self._values = None
+        self._notify(set(encoded))
+        return True
 
     def get_default_pcap_path(self) -> str:
         """Get the default PCAP path"""
@@ -4,37 +4,45 @@
 
 import sqlite3
 import json
+import base64
 from datetime import datetime
 from typing import List, Dict, Optional
 
+from db_pool import get_pool
+
+
+def encode_cursor(created_at, row_id: int) -> str:
+    """Opaque keyset pagination cursor for the (created_at, id) of the last row on a page"""
+    raw = json.dumps([created_at, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return created_at, int(row_id)
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+
+def keyset_page(rows: List, limit: int):
+    """Split ``limit + 1`` fetched rows into (page rows, next_cursor)"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, encode_cursor(last['created_at'], last['id'])
+    return rows, None
+
 
 class Database:
     def __init__(self, db_path='suricata_rules.db'):
         self.db_path = db_path
     
     def get_connection(self):
-        """Get database connection"""
-        import os
-        import sys
-        
-        # Ensure the directory for the database exists
-        db_dir = os.path.dirname(self.db_path)
-        if db_dir and not os.path.exists(db_dir):
-            os.makedirs(db_dir, exist_ok=True)
-        
-        # Check if we have write permissions to the directory
-        if db_dir and not os.access(db_dir, os.W_OK):
-            print(f"错误: 没有写入权限到目录 {db_dir}", file=sys.stderr)
-            raise PermissionError(f"没有写入权限到目录 {db_dir}")
-        
-        # Check if the file is writable (if it exists)
-        if os.path.exists(self.db_path) and not os.access(self.db_path, os.W_OK):
-            print(f"错误: 没有写入权限到数据库文件 {self.db_path}", file=sys.stderr)
-            raise PermissionError(f"没有写入权限到数据库文件 {self.db_path}")
-        
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        """Get a pooled database connection; ``close()`` returns it to the pool"""
+        return get_pool(self.db_path).acquire()
     
     def init_db(self):
         """Initialize database schema"""
@@ -85,6 +93,28 @@ class Database:
             )
         ''')
         
+        # Validation result cache (see validation_cache.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS validation_cache (
+                cache_key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hits INTEGER DEFAULT 0
+            )
+        ''')
+        
+        # LLM response cache (see llm_cache.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hits INTEGER DEFAULT 0
+            )
+        ''')
+        
         # Configuration table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS configurations (
@@ -96,11 +126,41 @@ class Database:
             )
         ''')
         
+        # Change counter for the configurations table (see config_manager.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS config_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO config_version (id, version) VALUES (1, 0)')
+        
+        # Row count of the rules table kept by triggers, so totals need no table scan.
+        # Triggers are created before the row is seeded, so no concurrent insert is missed
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rules_count (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                count INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_rules_count_insert AFTER INSERT ON rules
+            BEGIN UPDATE rules_count SET count = count + 1 WHERE id = 1; END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_rules_count_delete AFTER DELETE ON rules
+            BEGIN UPDATE rules_count SET count = count - 1 WHERE id = 1; END
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO rules_count (id, count) SELECT 1, COUNT(*) FROM rules')
+        
         # Create indexes
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_rules_vuln_name ON rules(vuln_name)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_rules_status ON rules(status)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_optimization_rule_id ON optimization_history(rule_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_validation_rule_id ON validation_results(rule_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_validation_cache_last_access ON validation_cache(last_access)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_rules_created_id ON rules(created_at, id)')
         
         conn.commit()
         conn.close()
@@ -164,7 +224,7 @@ class Database:
         offset = (page - 1) * per_page
         cursor.execute('''
             SELECT * FROM rules 
-            ORDER BY created_at DESC 
+            ORDER BY created_at DESC, id DESC 
             LIMIT ? OFFSET ?
         ''', (per_page, offset))
         
@@ -173,12 +233,46 @@ class Database:
         
         return [dict(row) for row in rows]
     
-    def get_rules_count(self) -> int:
-        """Get total count of rules"""
+    def get_rules_after(self, cursor_token: str = None, limit: int = 20) -> Dict:
+        """
+        Keyset pagination on (created_at, id): the cost of a page does not
+        depend on how deep it is.  Returns {"rules": [...], "next_cursor": str|None}.
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT COUNT(*) as count FROM rules')
+        if cursor_token:
+            created_at, rule_id = decode_cursor(cursor_token)
+            cursor.execute('''
+                SELECT * FROM rules
+                WHERE (created_at, id) < (?, ?)
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            ''', (created_at, rule_id, limit + 1))
+        else:
+            cursor.execute('''
+                SELECT * FROM rules
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            ''', (limit + 1,))
+        
+        rows, next_cursor = keyset_page(cursor.fetchall(), limit)
+        conn.close()
+        
+        return {"rules": [dict(row) for row in rows], "next_cursor": next_cursor}
+    
+    def get_rules_count(self, approximate: bool = False) -> int:
+        """
+        Get total count of rules.  ``approximate`` reads the trigger-maintained
+        rules_count row instead of scanning the table; the value is still exact.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        if approximate:
+            cursor.execute('SELECT count FROM rules_count WHERE id = 1')
+        else:
+            cursor.execute('SELECT COUNT(*) as count FROM rules')
         result = cursor.fetchone()
         conn.close()
         
@@ -275,6 +369,8 @@ class Database:
                 INSERT OR REPLACE INTO configurations (config_key, config_value, updated_at) 
                 VALUES (?, ?, CURRENT_TIMESTAMP)
             ''', (config_key, config_value))
+            # Cached ConfigManager instances reload when the version moves
+            cursor.execute('UPDATE config_version SET version = version + 1 WHERE id = 1')
             
             conn.commit()
             conn.close()
@@ -284,6 +380,18 @@ class Database:
             conn.close()
             return False
     
+    def delete_config(self, config_key: str) -> bool:
+        """Delete a configuration value; returns True if it existed"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM configurations WHERE config_key = ?', (config_key,))
+        deleted = cursor.rowcount > 0
+        if deleted:
+            cursor.execute('UPDATE config_version SET version = version + 1 WHERE id = 1')
+        conn.commit()
+        conn.close()
+        return deleted
+    
     def get_all_configs(self) -> Dict[str, str]:
         """Get all configuration values"""
         conn = self.get_connection()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# SQLite Connection Pool - bounded pool of WAL-mode connections shared per database file
+
+import os
+import sys
+import queue
+import sqlite3
+import threading
+from typing import Dict
+
+
+class PooledConnection:
+    """
+    Proxy handed out by ConnectionPool.  It behaves like a sqlite3.Connection,
+    but ``close()`` rolls back any unfinished transaction and returns the
+    connection to the pool instead of closing it, so existing
+    ``conn = get_connection() ... conn.close()`` code keeps working unchanged.
+    """
+
+    def __init__(self, pool, conn):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_conn', conn)
+
+    def __getattr__(self, name):
+        conn = self._conn
+        if conn is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+    def close(self):
+        conn = self._conn
+        if conn is None:
+            return
+        object.__setattr__(self, '_conn', None)
+        self._pool.release(conn)
+
+    def __del__(self):
+        # Connections leaked on an exception path go back to the pool
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Bounded pool of sqlite3 connections to one database file.
+
+    Every connection is opened in WAL mode with ``synchronous=NORMAL``, a larger
+    page cache, memory-mapped reads and a busy timeout, so readers no longer
+    block behind writers and requests skip the connection setup cost.  The pool
+    is discarded after ``fork()`` so child processes never share handles.
+    """
+
+    def __init__(self, db_path: str, max_size: int = 10, acquire_timeout: float = 30,
+                 busy_timeout_ms: int = 5000, cache_size_kb: int = 20000,
+                 mmap_size: int = 256 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self.stats = {"connections_opened": 0, "acquired": 0, "waits": 0}
+
+    def _check_path(self):
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+
+        # Check if we have write permissions to the directory
+        if db_dir and not os.access(db_dir, os.W_OK):
+            print(f"错误: 没有写入权限到目录 {db_dir}", file=sys.stderr)
+            raise PermissionError(f"没有写入权限到目录 {db_dir}")
+
+        # Check if the file is writable (if it exists)
+        if os.path.exists(self.db_path) and not os.access(self.db_path, os.W_OK):
+            print(f"错误: 没有写入权限到数据库文件 {self.db_path}", file=sys.stderr)
+            raise PermissionError(f"没有写入权限到数据库文件 {self.db_path}")
+
+    def _open(self) -> sqlite3.Connection:
+        if self._created == 0:
+            self._check_path()
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{int(self.cache_size_kb)}')
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        self.stats["connections_opened"] += 1
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset()
+            self.stats["acquired"] += 1
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = None
+                if self._created < self.max_size:
+                    conn = self._open()
+                    self._created += 1
+            if conn is None:
+                self.stats["waits"] += 1
+        if conn is None:
+            try:
+                conn = self._idle.get(timeout=self.acquire_timeout)
+            except queue.Empty:
+                raise TimeoutError(f"等待数据库连接超时 ({self.db_path})")
+        return PooledConnection(self, conn)
+
+    def release(self, conn: sqlite3.Connection):
+        if self._pid != os.getpid():
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error:
+            # Broken connection: drop it and let the pool open a new one
+            with self._lock:
+                self._created -= 1
+            return
+        self._idle.put(conn)
+
+    def close_all(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._reset()
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str) -> ConnectionPool:
+    """Shared pool per database file, sized by env SQLITE_POOL_SIZE"""
+    key = os.path.abspath(db_path)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(
+                db_path,
+                max_size=int(os.getenv('SQLITE_POOL_SIZE', '10')),
+                busy_timeout_ms=int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+            )
+            _pools[key] = pool
+        return pool
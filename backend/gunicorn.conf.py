@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Gunicorn configuration - production serving mode for the backend API
+#
+#   cd backend && gunicorn -c gunicorn.conf.py 'app_v2:create_app()'
+#
+# The app is created once in the master (preload_app) and the workers are
+# forked from it, so schema setup, default config and the Suricata probe run
+# once.  Each worker opens its own SQLite connections (WAL mode) and
+# re-dispatches queued agent jobs in post_fork.  gthread workers keep SSE
+# streams and long validations from blocking a whole process.
+
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+# Validations run suricata for up to 300 seconds per PCAP
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '600'))
+graceful_timeout = 30
+preload_app = True
+accesslog = '-'
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    import app_v2
+    app_v2.init_worker()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# HTTP Samples - reassemble client-to-server TCP streams and extract the HTTP requests in a capture
+
+from typing import Dict, List, Tuple
+
+from pcap_indexer import (HTTP_REQUEST_LINE, LINKTYPE_ETHERNET, LINKTYPE_LINUX_SLL, LINKTYPE_LINUX_SLL2,
+                          TUNNEL_UDP_PORTS, _network_layer)
+from pcap_prefilter import INSPECTED_PROTOCOLS, _flow_of
+from pcap_reader import PcapReader
+
+MAX_STREAM_BYTES = 1024 * 1024
+MAX_TOTAL_BYTES = 64 * 1024 * 1024
+MAX_BODY_BYTES = 16 * 1024
+# Link-layer types that never carry IP: ARP, RARP, 802.1X, LLDP
+NON_IP_ETHERTYPES = {0x0806, 0x8035, 0x888E, 0x88CC}
+# Bumped whenever the extracted fields change, so cached extractions are redone
+SAMPLE_FORMAT = 3
+
+
+class _Stream:
+    """Payload segments of one TCP direction keyed by sequence number"""
+
+    def __init__(self, seq: int):
+        self.isn = seq
+        self.segments: Dict[int, bytes] = {}
+        self.size = 0
+
+    def add(self, seq: int, payload: bytes) -> int:
+        offset = (seq - self.isn) & 0xFFFFFFFF
+        if offset in self.segments or self.size >= MAX_STREAM_BYTES:
+            return 0
+        self.segments[offset] = payload
+        self.size += len(payload)
+        return len(payload)
+
+    def assemble(self) -> Tuple[bytes, bool]:
+        """In-order bytes up to the first gap and whether there was no gap; retransmitted overlaps are trimmed"""
+        data = bytearray()
+        for offset in sorted(self.segments):
+            payload = self.segments[offset]
+            if offset > len(data):
+                return bytes(data), False
+            data.extend(payload[len(data) - offset:])
+        return bytes(data), True
+
+
+def _dechunk(data: bytes, start: int) -> Tuple[bytes, int, bool]:
+    """Decode a chunked body starting at start; returns (body, end position, complete)"""
+    body = bytearray()
+    pos = start
+    while True:
+        line_end = data.find(b'\r\n', pos)
+        if line_end == -1:
+            return bytes(body), len(data), False
+        try:
+            size = int(data[pos:line_end].split(b';', 1)[0].strip() or b'0', 16)
+        except ValueError:
+            return bytes(body), len(data), False
+        pos = line_end + 2
+        if size == 0:
+            trailer_end = data.find(b'\r\n\r\n', line_end)
+            if trailer_end == -1:
+                return bytes(body), len(data), False
+            return bytes(body), trailer_end + 4, True
+        if pos + size + 2 > len(data):
+            body.extend(data[pos:pos + size])
+            return bytes(body), len(data), False
+        body.extend(data[pos:pos + size])
+        pos += size + 2
+
+
+def parse_requests(data: bytes, limit: int) -> Tuple[List[Dict], bool]:
+    """
+    HTTP/1.x requests in one reassembled client stream (pipelined requests
+    included).  Returns ``(requests, complete)``; complete is False when bytes
+    were left unparsed or a request was cut short.  Each request keeps the
+    captured bytes (``raw``, ``raw_headers``) besides the parsed fields and is
+    flagged ``truncated`` when its body was cut or incomplete.
+    """
+    requests = []
+    pos = 0
+    complete = True
+    while pos < len(data) and len(requests) < limit:
+        if not HTTP_REQUEST_LINE.match(data, pos):
+            complete = False
+            break
+        head_end = data.find(b'\r\n\r\n', pos)
+        if head_end == -1:
+            complete = False
+            break
+        line_end = data.find(b'\r\n', pos)
+        lines = data[pos:head_end].split(b'\r\n')
+        parts = lines[0].split(b' ')
+        headers = []
+        for line in lines[1:]:
+            name, sep, value = line.partition(b':')
+            if sep:
+                headers.append([name.strip().decode('latin-1'), value.strip().decode('latin-1')])
+        fields = {name.lower(): value for name, value in headers}
+        body_start = head_end + 4
+        if 'chunked' in fields.get('transfer-encoding', '').lower():
+            body, end, body_complete = _dechunk(data, body_start)
+        else:
+            try:
+                length = max(int(fields.get('content-length', '0')), 0)
+            except ValueError:
+                length = 0
+            body = data[body_start:body_start + length]
+            end = body_start + length
+            body_complete = end <= len(data)
+        # Encoded bodies are inspected decoded by the engine, which is not reproduced here
+        encoded = fields.get('content-encoding', 'identity').strip().lower() not in ('', 'identity')
+        raw_end = min(end, body_start + MAX_BODY_BYTES)
+        requests.append({
+            "method": parts[0].decode('latin-1'),
+            "uri": parts[1].decode('latin-1') if len(parts) > 1 else "",
+            "protocol": parts[2].decode('latin-1') if len(parts) > 2 else "",
+            "headers": headers,
+            "body": body[:MAX_BODY_BYTES].decode('latin-1'),
+            "raw": data[pos:raw_end].decode('latin-1'),
+            "raw_headers": data[line_end + 2:body_start].decode('latin-1'),
+            "truncated": not body_complete or len(body) > MAX_BODY_BYTES or end > raw_end or encoded
+        })
+        if not body_complete:
+            complete = False
+            break
+        pos = end
+    return requests, complete
+
+
+def _ethertype(link_type: int, data: bytes):
+    if link_type == LINKTYPE_ETHERNET and len(data) >= 14:
+        offset, ethertype = 14, int.from_bytes(data[12:14], 'big')
+        while ethertype in (0x8100, 0x88A8) and len(data) >= offset + 4:
+            ethertype, offset = int.from_bytes(data[offset + 2:offset + 4], 'big'), offset + 4
+        return ethertype
+    if link_type == LINKTYPE_LINUX_SLL and len(data) >= 16:
+        return int.from_bytes(data[14:16], 'big')
+    if link_type == LINKTYPE_LINUX_SLL2 and len(data) >= 20:
+        return int.from_bytes(data[:2], 'big')
+    return None
+
+
+def _may_hide_requests(link_type: int, data: bytes, flow) -> bool:
+    """Packets whose TCP payload, if any, is not visible here: fragments, tunnels, undecoded encapsulations"""
+    if flow is None:
+        if _network_layer(link_type, data)[0]:
+            return True  # IP fragment
+        ethertype = _ethertype(link_type, data)
+        return ethertype is None or (ethertype >= 0x0600 and ethertype not in NON_IP_ETHERTYPES)
+    key, _, proto, _ = flow
+    return proto not in INSPECTED_PROTOCOLS or (proto == 17 and bool(TUNNEL_UDP_PORTS.intersection(
+        (key[1][1], key[2][1]))))
+
+
+def _not_a_request_stream(payload: bytes) -> bool:
+    """Server responses and TLS records can never carry a cleartext request"""
+    return payload.startswith(b'HTTP/') or (len(payload) >= 3 and payload[0] == 0x16 and payload[1] == 0x03)
+
+
+def extract_http_requests(path: str, limit: int = 1000) -> Dict:
+    """
+    Reassemble the TCP streams of a capture and parse the HTTP requests in
+    them.  Returns ``{"requests": [...], "truncated": bool}``; strings are
+    latin-1 decoded so the original bytes round-trip exactly.
+
+    ``truncated`` is set whenever a request may be missing or incomplete: a
+    size limit was hit, a stream has a gap, a body was cut, a stream that is
+    neither a response nor TLS could not be parsed as requests (capture
+    started mid-connection, HTTP/2, other protocols), or the capture has
+    fragmented, tunnelled or undecoded packets.
+    """
+    streams: Dict[tuple, _Stream] = {}
+    skipped = set()
+    total = 0
+    truncated = False
+    with PcapReader(path) as reader:
+        for _, link_type, _, _, data in reader:
+            flow = _flow_of(link_type, data)
+            if _may_hide_requests(link_type, data, flow):
+                truncated = True
+                continue
+            if flow is None or flow[2] != 6:
+                continue
+            key, direction, _, l4 = flow
+            if len(l4) < 20:
+                continue
+            payload = l4[(l4[12] >> 4) * 4:]
+            if not payload:
+                continue
+            stream_key = (key, direction)
+            if stream_key in skipped:
+                continue
+            stream = streams.get(stream_key)
+            if stream is None:
+                if _not_a_request_stream(bytes(payload[:8])):
+                    skipped.add(stream_key)
+                    continue
+                stream = streams[stream_key] = _Stream(int.from_bytes(l4[4:8], 'big'))
+            if total >= MAX_TOTAL_BYTES:
+                truncated = True
+                continue
+            total += stream.add(int.from_bytes(l4[4:8], 'big'), bytes(payload))
+
+    requests = []
+    for stream in streams.values():
+        remaining = limit - len(requests)
+        if remaining <= 0:
+            truncated = True
+            break
+        data, contiguous = stream.assemble()
+        parsed, complete = parse_requests(data, remaining + 1)
+        if len(parsed) > remaining:
+            truncated = True
+            parsed = parsed[:remaining]
+        elif not complete or not contiguous or stream.size >= MAX_STREAM_BYTES:
+            truncated = True
+        if any(request["truncated"] for request in parsed):
+            truncated = True
+        requests.extend(parsed)
+    return {"requests": requests, "truncated": truncated}
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Background Job Queue - persistent job table plus an in-process worker pool
+
+import json
+import time
+import uuid
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+
+class JobQueue:
+    """
+    Runs long jobs (e.g. the agent generate/validate/fix pipeline) outside the
+    HTTP request.  Every job is persisted in the ``agent_jobs`` table so its
+    status and result survive the request and can be polled by task_id.
+
+    A worker claims a job with an atomic ``queued -> running`` update, so the
+    same job is never executed twice even when several processes share the
+    database.
+    """
+
+    def __init__(self, db, workers: int = 4, stale_seconds: int = 3600):
+        self.db = db
+        self.workers = workers
+        self.stale_seconds = stale_seconds
+        self._handlers = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='agent-job')
+        self.init_table()
+
+    def init_table(self):
+        """Create the job table"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS agent_jobs (
+                task_id TEXT PRIMARY KEY,
+                job_type TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                params TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_agent_jobs_status ON agent_jobs(status, created_at)')
+        conn.commit()
+        conn.close()
+
+    def register_handler(self, job_type: str, handler: Callable[[Dict, Callable[[Dict], None]], Dict]):
+        """
+        Register the function that executes a job type.  It receives the job
+        params and a ``progress(result)`` callback for partial results, and
+        returns the final result dict.
+        """
+        self._handlers[job_type] = handler
+
+    def submit(self, job_type: str, params: Dict) -> str:
+        """Persist a job and hand it to the worker pool; returns its task_id"""
+        if job_type not in self._handlers:
+            raise ValueError(f"未知的任务类型: {job_type}")
+        task_id = uuid.uuid4().hex
+        conn = self.db.get_connection()
+        conn.execute('''
+            INSERT INTO agent_jobs (task_id, job_type, status, params, created_at)
+            VALUES (?, ?, 'queued', ?, ?)
+        ''', (task_id, job_type, json.dumps(params, ensure_ascii=False), time.time()))
+        conn.commit()
+        conn.close()
+        self._executor.submit(self._run, task_id)
+        return task_id
+
+    def _claim(self, task_id: str) -> Optional[Dict]:
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE agent_jobs SET status = 'running', started_at = ?
+            WHERE task_id = ? AND status = 'queued'
+        ''', (time.time(), task_id))
+        conn.commit()
+        claimed = cursor.rowcount == 1
+        row = None
+        if claimed:
+            cursor.execute('SELECT job_type, params FROM agent_jobs WHERE task_id = ?', (task_id,))
+            row = cursor.fetchone()
+        conn.close()
+        if row is None:
+            return None
+        return {"job_type": row['job_type'], "params": json.loads(row['params'])}
+
+    def _run(self, task_id: str):
+        job = self._claim(task_id)
+        if job is None:
+            return
+        handler = self._handlers.get(job["job_type"])
+
+        def progress(partial: Dict):
+            self._update(task_id, result=partial)
+
+        try:
+            result = handler(job["params"], progress)
+            status = 'failed' if result.get('status') == 'failed' else 'completed'
+            self._update(task_id, status=status, result=result, error=result.get('error'), finished=True)
+        except Exception as e:
+            traceback.print_exc()
+            self._update(task_id, status='failed', error=str(e), finished=True)
+
+    def _update(self, task_id: str, status: str = None, result: Dict = None,
+                error: str = None, finished: bool = False):
+        fields = []
+        values = []
+        if status is not None:
+            fields.append("status = ?")
+            values.append(status)
+        if result is not None:
+            fields.append("result = ?")
+            values.append(json.dumps(result, ensure_ascii=False))
+        if error is not None:
+            fields.append("error = ?")
+            values.append(error)
+        if finished:
+            fields.append("finished_at = ?")
+            values.append(time.time())
+        if not fields:
+            return
+        values.append(task_id)
+        conn = self.db.get_connection()
+        conn.execute(f"UPDATE agent_jobs SET {', '.join(fields)} WHERE task_id = ?", values)
+        conn.commit()
+        conn.close()
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM agent_jobs WHERE task_id = ?', (task_id,))
+        row = cursor.fetchone()
+        conn.close()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def list_jobs(self, status: str = None, limit: int = 50) -> List[Dict]:
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        if status:
+            cursor.execute('''
+                SELECT task_id, job_type, status, error, created_at, started_at, finished_at
+                FROM agent_jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?
+            ''', (status, limit))
+        else:
+            cursor.execute('''
+                SELECT task_id, job_type, status, error, created_at, started_at, finished_at
+                FROM agent_jobs ORDER BY created_at DESC LIMIT ?
+            ''', (limit,))
+        rows = cursor.fetchall()
+        conn.close()
+        return [dict(row) for row in rows]
+
+    def stats(self) -> Dict:
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT status, COUNT(*) as count FROM agent_jobs GROUP BY status')
+        counts = {row['status']: row['count'] for row in cursor.fetchall()}
+        conn.close()
+        return {"workers": self.workers, "jobs": counts}
+
+    def recover(self) -> int:
+        """
+        Re-dispatch jobs still queued from a previous process and fail jobs
+        that have been 'running' longer than ``stale_seconds``.
+        """
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE agent_jobs SET status = 'failed', error = '任务因服务重启中断', finished_at = ?
+            WHERE status = 'running' AND started_at < ?
+        ''', (time.time(), time.time() - self.stale_seconds))
+        cursor.execute("SELECT task_id FROM agent_jobs WHERE status = 'queued' ORDER BY created_at")
+        task_ids = [row['task_id'] for row in cursor.fetchall()]
+        conn.commit()
+        conn.close()
+        for task_id in task_ids:
+            self._executor.submit(self._run, task_id)
+        return len(task_ids)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# LLM Response Cache - keyed by (provider, model, prompt digest, sampling parameters)
+
+import json
+import hashlib
+from typing import Dict
+
+from validation_cache import ResultCache
+
+# Sampling parameters that change the completion, with LLMClient._build_payload defaults
+SAMPLING_DEFAULTS = {"temperature": 0.7, "max_tokens": 2048, "top_p": 1.0}
+
+
+class LLMResponseCache(ResultCache):
+    """
+    Caches successful LLM completions in the ``llm_cache`` table so that
+    resubmitting the same vulnerability (UI, agent API or bulk import) does not
+    call the provider again.  Only the prompt digest is part of the key; the
+    prompt text itself is not stored.
+    """
+
+    table = 'llm_cache'
+
+    def __init__(self, db, max_entries: int = 2000, ttl_seconds: int = 30 * 24 * 3600):
+        super().__init__(db, max_entries, ttl_seconds)
+
+    @staticmethod
+    def make_key(provider: str, model: str, prompt: str, params: Dict) -> str:
+        sampling = {name: params.get(name, default) for name, default in SAMPLING_DEFAULTS.items()}
+        key_source = {
+            "provider": provider,
+            "model": model,
+            "prompt": hashlib.sha256(prompt.encode('utf-8')).hexdigest(),
+            "sampling": sampling
+        }
+        return hashlib.sha256(json.dumps(key_source, sort_keys=True).encode('utf-8')).hexdigest()
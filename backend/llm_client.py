@@ -3,13 +3,39 @@
 # Universal LLM Client supporting multiple providers
 
 import os
-import requests
+import re
 import json
-from typing import Optional, Dict, Any
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Optional, Dict, Any, Tuple, Callable, Iterator
+
+# Provider responses worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Providers without an OpenAI-compatible SSE endpoint; streaming falls back to one chunk
+NON_STREAMING_PROVIDERS = ("gemini", "baidu", "claude")
+
+# A complete single-line Suricata rule: action, header, then options closed by ";)"
+COMPLETE_RULE_PATTERN = re.compile(r'^[ \t`]*((?:alert|drop|reject|pass)\s+\S+\s+[^\n]*?\(.*?;\s*\))[ \t]*$',
+                                   re.MULTILINE)
+
+
+def extract_complete_rule(text: str) -> Optional[str]:
+    """Return the first complete rule in (possibly partial) LLM output, or None"""
+    match = COMPLETE_RULE_PATTERN.search(text)
+    return match.group(1) if match else None
+
+
+class LLMStreamError(Exception):
+    """Raised when a streaming completion fails"""
 
 
 class LLMClient:
-    def __init__(self, provider: str = "openai", api_key: str = "", model: str = "", base_url: str = ""):
+    def __init__(self, provider: str = "openai", api_key: str = "", model: str = "", base_url: str = "",
+                 pool_size: int = 10, connect_timeout: float = 10, read_timeout: float = 150,
+                 max_retries: int = 3, retry_backoff: float = 1.0, response_cache=None):
         """
         Initialize LLM client with specified provider
         
@@ -18,15 +44,87 @@ class LLMClient:
             api_key: API key for the provider
             model: Model name to use
             base_url: Custom API endpoint (optional)
+            pool_size: Keep-alive connections kept per provider host
+            connect_timeout: Seconds allowed to establish a connection
+            read_timeout: Seconds allowed between bytes of the response
+            max_retries: Retries on connection errors, 429 and 5xx responses
+            retry_backoff: Exponential backoff factor between retries (seconds)
+            response_cache: Optional LLMResponseCache for identical prompts
         """
         self.provider = provider.lower()
         self.api_key = api_key
         self.model = model or self._get_default_model()
         self.base_url = base_url or self._get_default_base_url()
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.response_cache = response_cache
         
         # Setup headers based on provider
         self.headers = self._setup_headers()
 
+        # One keep-alive session per client so generation and fix rounds reuse connections
+        self.session = self._create_session(pool_size, max_retries, retry_backoff)
+        self._stats_lock = threading.Lock()
+        self._request_count = 0
+        self._retry_count = 0
+        self._error_count = 0
+
+    @staticmethod
+    def _create_session(pool_size: int, max_retries: int, retry_backoff: float) -> requests.Session:
+        """Create a pooled session that retries transient provider failures with backoff"""
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=retry_backoff,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=frozenset(["POST"]),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _default_timeout(self) -> Tuple[float, float]:
+        return (self.connect_timeout, self.read_timeout)
+
+    def _record_request(self, response: Optional[requests.Response] = None, failed: bool = False):
+        retries = 0
+        if response is not None and getattr(response.raw, "retries", None) is not None:
+            retries = len(response.raw.retries.history)
+        with self._stats_lock:
+            self._request_count += 1
+            self._retry_count += retries
+            if failed:
+                self._error_count += 1
+
+    def connection_stats(self) -> Dict[str, Any]:
+        """Requests sent, TCP/TLS connections opened and how many requests reused a connection"""
+        connections = 0
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is not None:
+                    connections += pool.num_connections
+        with self._stats_lock:
+            requests_sent = self._request_count
+            retries = self._retry_count
+            errors = self._error_count
+        attempts = requests_sent + retries
+        return {
+            "requests": requests_sent,
+            "connections_opened": connections,
+            "connections_reused": max(attempts - connections, 0),
+            "retries": retries,
+            "errors": errors,
+            "reuse_rate": round(max(attempts - connections, 0) / attempts, 4) if attempts else 0.0
+        }
+
+    def close(self):
+        self.session.close()
+
     def _get_default_model(self) -> str:
         """Get default model based on provider"""
         defaults = {
@@ -150,10 +248,10 @@ class LLMClient:
         # Default: return as-is
         return response
 
-    def generate_text(self, prompt: str, **kwargs) -> Dict[str, Any]:
-        """Generate text using the configured LLM"""
+    def _build_request(self, prompt: str, stream: bool = False, **kwargs) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
+        """Return (url, headers, payload) for a completion request"""
         messages = self._prepare_messages(prompt)
-        payload = self._build_payload(messages, **kwargs)
+        payload = self._build_payload(messages, stream=stream, **kwargs)
         
         # Handle provider-specific URL construction
         if self.provider == "gemini":
@@ -169,18 +267,135 @@ class LLMClient:
         else:
             url = f"{self.base_url}/chat/completions"
             headers = self.headers.copy()
+        return url, headers, payload
+
+    def _cache_key(self, prompt: str, use_cache: bool, params: Dict[str, Any]) -> Optional[str]:
+        if self.response_cache is None or not use_cache:
+            return None
+        return self.response_cache.make_key(self.provider, self.model, prompt, params)
+
+    def generate_text(self, prompt: str, use_cache: bool = True, **kwargs) -> Dict[str, Any]:
+        """
+        Generate text using the configured LLM.  Identical requests are served
+        from ``response_cache`` when one is configured, unless use_cache=False.
+        """
+        cache_key = self._cache_key(prompt, use_cache, kwargs)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                cached["cached"] = True
+                return cached
+
+        url, headers, payload = self._build_request(prompt, **kwargs)
         
+        response = None
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=kwargs.get("timeout", 150))
+            response = self.session.post(url, headers=headers, json=payload,
+                                         timeout=kwargs.get("timeout", self._default_timeout()))
             response.raise_for_status()
             result = response.json()
-            return self._process_response(result)
+            self._record_request(response)
+            result = self._process_response(result)
+            if cache_key is not None and result.get("choices"):
+                self.response_cache.put(cache_key, result)
+            return result
         except requests.exceptions.RequestException as e:
+            self._record_request(response, failed=True)
             return {
                 "error": str(e),
                 "status": "failed"
             }
 
+    @property
+    def supports_streaming(self) -> bool:
+        return self.provider not in NON_STREAMING_PROVIDERS
+
+    def stream_text(self, prompt: str, stop: Optional[Callable[[str], bool]] = None,
+                    use_cache: bool = True, **kwargs) -> Iterator[str]:
+        """
+        Yield the completion as text deltas.
+
+        ``stop`` is called with the accumulated text after every delta; when it
+        returns True the connection is closed so the provider stops generating.
+        Providers without OpenAI-compatible SSE fall back to a single delta
+        holding the whole completion, as do response cache hits.  Only streams
+        that ran to completion are cached.  Failures raise LLMStreamError.
+        """
+        if not self.supports_streaming:
+            result = self.generate_text(prompt, use_cache=use_cache, **kwargs)
+            if 'error' in result:
+                raise LLMStreamError(result['error'])
+            try:
+                yield result['choices'][0]['message']['content']
+            except (KeyError, IndexError, TypeError):
+                raise LLMStreamError("AI响应格式无法解析")
+            return
+
+        cache_key = self._cache_key(prompt, use_cache, kwargs)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                yield cached['choices'][0]['message']['content']
+                return
+
+        url, headers, payload = self._build_request(prompt, stream=True, **kwargs)
+        headers['Accept'] = 'text/event-stream'
+        response = None
+        try:
+            response = self.session.post(url, headers=headers, json=payload, stream=True,
+                                         timeout=kwargs.get("timeout", self._default_timeout()))
+            response.raise_for_status()
+            text = ""
+            stopped = False
+            for delta in self._iter_sse_deltas(response):
+                text += delta
+                yield delta
+                if stop is not None and stop(text):
+                    stopped = True
+                    break
+            self._record_request(response)
+            if cache_key is not None and text and not stopped:
+                self.response_cache.put(cache_key, {"choices": [{"message": {"content": text}}]})
+        except LLMStreamError:
+            self._record_request(response, failed=True)
+            raise
+        except requests.exceptions.RequestException as e:
+            self._record_request(response, failed=True)
+            raise LLMStreamError(str(e))
+        finally:
+            if response is not None:
+                response.close()
+
+    @staticmethod
+    def _iter_sse_deltas(response: requests.Response) -> Iterator[str]:
+        """
+        Parse ``data:`` lines of an OpenAI-style event stream.  Plain JSON lines
+        (Ollama native) and chunks carrying a full ``message`` are accepted too.
+        """
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or line.startswith(':') or line.startswith('event:'):
+                continue
+            if line.startswith('data:'):
+                line = line[5:].strip()
+            if line == '[DONE]':
+                return
+            try:
+                chunk = json.loads(line)
+            except ValueError:
+                continue
+            if chunk.get('error'):
+                error = chunk['error']
+                raise LLMStreamError(error.get('message', str(error)) if isinstance(error, dict) else str(error))
+            choices = chunk.get('choices') or [{}]
+            choice = choices[0]
+            content = ((choice.get('delta') or {}).get('content')
+                       or (choice.get('message') or {}).get('content')
+                       or (chunk.get('message') or {}).get('content'))
+            if content:
+                yield content
+            if choice.get('finish_reason') or chunk.get('done'):
+                return
+
     def generate_rule(self, vuln_name: str, vuln_description: str, vuln_type: str = "", poc: str = "") -> Dict[str, Any]:
         """Generate Suricata rule based on vulnerability information"""
         prompt = f"""你是一个专业的网络安全专家和Suricata规则编写专家。请根据以下漏洞信息生成高质量的Suricata检测规则。
@@ -225,7 +440,7 @@ POC示例: {poc}
         )
 
 
-def create_llm_client_from_env():
+def create_llm_client_from_env(response_cache=None):
     """Create LLM client using environment variables"""
     provider = os.getenv('LLM_PROVIDER', '360ai')
     api_key = os.getenv('LLM_API_KEY', os.getenv('AI_API_KEY', ''))
@@ -240,7 +455,13 @@ def create_llm_client_from_env():
         provider=provider,
         api_key=api_key,
         model=model,
-        base_url=base_url
+        base_url=base_url,
+        pool_size=int(os.getenv('LLM_POOL_SIZE', '10')),
+        connect_timeout=float(os.getenv('LLM_CONNECT_TIMEOUT', '10')),
+        read_timeout=float(os.getenv('LLM_READ_TIMEOUT') or timeout),
+        max_retries=int(os.getenv('LLM_MAX_RETRIES', '3')),
+        retry_backoff=float(os.getenv('LLM_RETRY_BACKOFF', '1.0')),
+        response_cache=response_cache
     )
 
 
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Memory Cache - small thread-safe per-process LRU cache with a time-to-live
+
+import time
+import threading
+from typing import Any, Dict, Optional
+
+
+class TTLCache:
+    """
+    Bounded in-process cache.  Entries expire ``ttl_seconds`` after they were
+    stored and the least recently used entry is evicted beyond
+    ``max_entries``.  Each process has its own copy, so callers that share
+    data between processes keep the TTL short or invalidate explicitly.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (value, stored_at); dict order is least recently used first
+        self._entries: Dict[Any, tuple] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or time.time() - entry[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.time())
+            while len(self._entries) > self.max_entries:
+                self._entries.pop(next(iter(self._entries)))
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
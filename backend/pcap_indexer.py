@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# PCAP Pre-Indexer - one pass over pcap/pcapng headers to summarize a capture
+
+import re
+import struct
+import socket
+from collections import Counter
+from typing import Dict, Iterator, Optional, Tuple
+
+from pcap_reader import PcapReader
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = (12, 14, 101)
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+HTTP_METHODS = (b'GET ', b'POST ', b'PUT ', b'HEAD ', b'DELETE ', b'OPTIONS ', b'PATCH ', b'CONNECT ', b'TRACE ')
+# Any token as the method (WebDAV and custom methods included), then a target and an HTTP/1.x version
+HTTP_REQUEST_LINE = re.compile(rb"[!#$%&'*+.^_`|~0-9A-Za-z-]+ [^ \r\n]+ HTTP/1\.[0-9]\r\n")
+HOST_HEADER = re.compile(rb'\r\nhost:[ \t]*([^\r\n]*)', re.IGNORECASE)
+
+TOP_N = 10
+# Bumped when the summary changes meaning; older summaries never cause a skip
+INDEX_VERSION = 2
+# UDP ports of encapsulations Suricata decodes by default (VXLAN, Geneve, Teredo)
+TUNNEL_UDP_PORTS = {4789, 6081, 3544}
+# IP protocols carrying other packets: IP-in-IP, IPv6-in-IP, GRE
+TUNNEL_IP_PROTOCOLS = {4, 41, 47}
+# TCP connections classified by their first payload; beyond this every new one counts as unclassified
+MAX_TRACKED_FLOWS = 200000
+MAX_HTTP_SAMPLES = 20
+# Payload bytes copied out of the capture for application-layer inspection
+INSPECT_BYTES = 4096
+
+# Rule protocol -> (summary section, key) that must be non-zero for the rule to be able to fire
+RULE_PROTOCOL_REQUIREMENTS = {
+    "http": ("app", "http"),
+    "http1": ("app", "http"),
+    "tls": ("app", "tls"),
+    "dns": ("app", "dns"),
+    "tcp": ("l4", "tcp"),
+    "udp": ("l4", "udp"),
+    "icmp": ("l4", "icmp"),
+}
+RULE_HEADER = re.compile(r'^\s*(?:alert|drop|reject|pass)\s+(\S+)', re.IGNORECASE)
+
+
+def iter_packets(path: str) -> Iterator[Tuple[int, float, int, memoryview]]:
+    """Yield (link_type, timestamp, original_length, captured_data) for every packet"""
+    with PcapReader(path) as reader:
+        for _, link_type, timestamp, orig_len, data in reader:
+            yield link_type, timestamp, orig_len, data
+
+
+def _network_layer(link_type: int, data: bytes) -> Tuple[Optional[int], bytes]:
+    """Return (ip_version, ip_packet) for the supported link types"""
+    if link_type == LINKTYPE_ETHERNET:
+        offset, ethertype = 14, struct.unpack('!H', data[12:14])[0] if len(data) >= 14 else 0
+        while ethertype in (0x8100, 0x88A8) and len(data) >= offset + 4:
+            ethertype = struct.unpack('!H', data[offset + 2:offset + 4])[0]
+            offset += 4
+    elif link_type in (LINKTYPE_NULL, LINKTYPE_LOOP):
+        if len(data) < 4:
+            return None, b''
+        family = struct.unpack('<I' if link_type == LINKTYPE_NULL else '!I', data[:4])[0]
+        if family not in (2, 24, 28, 30):
+            family = struct.unpack('!I' if link_type == LINKTYPE_NULL else '<I', data[:4])[0]
+        ethertype, offset = {2: 0x0800, 24: 0x86DD, 28: 0x86DD, 30: 0x86DD}.get(family, 0), 4
+    elif link_type == LINKTYPE_LINUX_SLL:
+        ethertype, offset = (struct.unpack('!H', data[14:16])[0] if len(data) >= 16 else 0), 16
+    elif link_type == LINKTYPE_LINUX_SLL2:
+        ethertype, offset = (struct.unpack('!H', data[:2])[0] if len(data) >= 20 else 0), 20
+    elif link_type in LINKTYPE_RAW or link_type in (LINKTYPE_IPV4, LINKTYPE_IPV6):
+        version = data[0] >> 4 if data else None
+        return (version if version in (4, 6) else None), data
+    else:
+        return None, b''
+    version = {0x0800: 4, 0x86DD: 6}.get(ethertype)
+    return version, data[offset:] if version else b''
+
+
+def _transport_layer(version: int, packet: bytes):
+    """Return (src_ip, dst_ip, ip_proto, l4_bytes) or None"""
+    if version == 4 and len(packet) >= 20:
+        ihl = (packet[0] & 0x0F) * 4
+        proto = packet[9]
+        src, dst = socket.inet_ntop(socket.AF_INET, packet[12:16]), socket.inet_ntop(socket.AF_INET, packet[16:20])
+        fragment_offset = struct.unpack('!H', packet[6:8])[0] & 0x1FFF
+        return src, dst, proto, (b'' if fragment_offset else packet[ihl:])
+    if version == 6 and len(packet) >= 40:
+        proto = packet[6]
+        src, dst = socket.inet_ntop(socket.AF_INET6, packet[8:24]), socket.inet_ntop(socket.AF_INET6, packet[24:40])
+        offset = 40
+        while proto in (0, 43, 60, 44) and len(packet) >= offset + 8:
+            next_proto = packet[offset]
+            if proto == 44:
+                if struct.unpack('!H', packet[offset + 2:offset + 4])[0] & 0xFFF8:
+                    return src, dst, next_proto, b''
+                offset += 8
+            else:
+                offset += (packet[offset + 1] + 1) * 8
+            proto = next_proto
+        return src, dst, proto, packet[offset:]
+    return None
+
+
+def _is_request_start(payload: bytes) -> bool:
+    """A common method (request line possibly split over segments) or any complete request line"""
+    return payload.startswith(HTTP_METHODS) or HTTP_REQUEST_LINE.match(payload) is not None
+
+
+class PcapSummary:
+    """Accumulates the per-capture statistics stored in the PCAP catalog"""
+
+    def __init__(self):
+        self.packet_count = 0
+        self.byte_count = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.link_types = set()
+        self.l4 = Counter()
+        self.app = Counter()
+        self.talkers = Counter()
+        self.ports = Counter()
+        self.http_samples = []
+        self._http_seen = set()
+        # TCP connection -> application protocol of its first payload ("http", "tls" or None)
+        self._flows = {}
+        self.unclassified_tcp_flows = 0
+
+    def add_packet(self, link_type: int, timestamp: Optional[float], orig_len: int, data: bytes):
+        self.packet_count += 1
+        self.byte_count += orig_len
+        self.link_types.add(link_type)
+        if timestamp is not None:
+            if self.first_timestamp is None or timestamp < self.first_timestamp:
+                self.first_timestamp = timestamp
+            if self.last_timestamp is None or timestamp > self.last_timestamp:
+                self.last_timestamp = timestamp
+
+        version, packet = _network_layer(link_type, data)
+        layer = _transport_layer(version, packet) if version else None
+        if layer is None:
+            # Non-IP or undecoded encapsulation (PPPoE, MPLS, ...): Suricata may still see TCP inside
+            self.l4["other"] += 1
+            return
+        src, dst, proto, l4 = layer
+        self.talkers[src] += orig_len
+        self.talkers[dst] += orig_len
+
+        if proto == 6 and len(l4) >= 20:
+            self.l4["tcp"] += 1
+            src_port, dst_port = struct.unpack('!HH', l4[:4])
+            self._add_ports("tcp", src_port, dst_port)
+            offset = (l4[12] >> 4) * 4
+            payload = bytes(l4[offset:offset + INSPECT_BYTES])
+            self._inspect_payload("tcp", src_port, dst_port, payload)
+            if payload:
+                self._classify_flow(tuple(sorted(((src, src_port), (dst, dst_port)))), payload)
+        elif proto == 17 and len(l4) >= 8:
+            self.l4["udp"] += 1
+            src_port, dst_port = struct.unpack('!HH', l4[:4])
+            self._add_ports("udp", src_port, dst_port)
+            if TUNNEL_UDP_PORTS.intersection((src_port, dst_port)):
+                self.l4["tunnel"] += 1
+            self._inspect_payload("udp", src_port, dst_port, bytes(l4[8:8 + INSPECT_BYTES]))
+        elif proto in (1, 58):
+            self.l4["icmp"] += 1
+        elif proto in TUNNEL_IP_PROTOCOLS:
+            self.l4["tunnel"] += 1
+        else:
+            self.l4["other"] += 1
+
+    def _add_ports(self, transport: str, src_port: int, dst_port: int):
+        # The lower port is usually the service side of the conversation
+        self.ports[(transport, min(src_port, dst_port))] += 1
+
+    def _inspect_payload(self, transport: str, src_port: int, dst_port: int, payload: bytes):
+        if 53 in (src_port, dst_port):
+            self.app["dns"] += 1
+        if transport != "tcp" or not payload:
+            return
+        if _is_request_start(payload):
+            self.app["http"] += 1
+            self._add_http_sample(payload)
+        elif payload.startswith(b'HTTP/1.'):
+            self.app["http"] += 1
+        elif len(payload) >= 3 and payload[0] == 0x16 and payload[1] == 0x03 and payload[2] <= 0x04:
+            self.app["tls"] += 1
+
+    def _classify_flow(self, key: tuple, payload: bytes):
+        """
+        Remember what the first payload of a TCP connection looked like.  A
+        connection that starts with something else (other protocols, HTTP
+        captured mid-connection, long request lines) may still be HTTP or TLS
+        to the engine, so it is counted as unclassified.
+        """
+        if key in self._flows:
+            return
+        if _is_request_start(payload) or payload.startswith(b'HTTP/1.'):
+            app = "http"
+        elif len(payload) >= 3 and payload[0] == 0x16 and payload[1] == 0x03 and payload[2] <= 0x04:
+            app = "tls"
+        else:
+            app = None
+            self.unclassified_tcp_flows += 1
+        if len(self._flows) < MAX_TRACKED_FLOWS:
+            self._flows[key] = app
+        elif app is not None:
+            self.unclassified_tcp_flows += 1
+
+    def _add_http_sample(self, payload: bytes):
+        if len(self.http_samples) >= MAX_HTTP_SAMPLES:
+            return
+        head = payload[:INSPECT_BYTES]
+        request_line = head.split(b'\r\n', 1)[0].split(b' ')
+        if len(request_line) < 2:
+            return
+        host = HOST_HEADER.search(head)
+        sample = (
+            request_line[0].decode('latin-1'),
+            host.group(1).strip().decode('latin-1') if host else "",
+            request_line[1][:512].decode('latin-1')
+        )
+        if sample not in self._http_seen:
+            self._http_seen.add(sample)
+            self.http_samples.append({"method": sample[0], "host": sample[1], "uri": sample[2]})
+
+    def to_dict(self) -> Dict:
+        duration = None
+        if self.first_timestamp is not None and self.last_timestamp is not None:
+            duration = round(self.last_timestamp - self.first_timestamp, 6)
+        return {
+            "packet_count": self.packet_count,
+            "byte_count": self.byte_count,
+            "first_timestamp": self.first_timestamp,
+            "last_timestamp": self.last_timestamp,
+            "duration": duration,
+            "protocols": {
+                "l4": dict(self.l4),
+                "app": dict(self.app),
+                "unclassified_tcp_flows": self.unclassified_tcp_flows,
+                "index_version": INDEX_VERSION
+            },
+            "summary": {
+                "link_types": sorted(self.link_types),
+                "top_talkers": [{"ip": ip, "bytes": count} for ip, count in self.talkers.most_common(TOP_N)],
+                "top_ports": [{"transport": transport, "port": port, "packets": count}
+                              for (transport, port), count in self.ports.most_common(TOP_N)],
+                "http_samples": self.http_samples
+            }
+        }
+
+
+def index_pcap(path: str) -> Dict:
+    """Summarize a capture in a single pass over the memory-mapped file"""
+    summary = PcapSummary()
+    for link_type, timestamp, orig_len, data in iter_packets(path):
+        summary.add_packet(link_type, timestamp, orig_len, data)
+    return summary.to_dict()
+
+
+def rule_may_match(rule_content: str, protocols: Optional[Dict]) -> bool:
+    """
+    False only when the protocol summary proves that none of the rules can
+    fire on the capture (e.g. ``alert http`` against a capture without HTTP).
+    Unknown or outdated summaries and protocols never cause a skip, and
+    neither does a capture with tunnelled or undecoded traffic, whose inner
+    packets the engine decodes.  HTTP and TLS rules are also kept when some
+    TCP connection could not be classified.
+    """
+    if not protocols or protocols.get("index_version") != INDEX_VERSION:
+        return True
+    l4 = protocols.get("l4", {})
+    if l4.get("other", 0) > 0 or l4.get("tunnel", 0) > 0:
+        return True
+    saw_rule = False
+    for line in rule_content.splitlines():
+        match = RULE_HEADER.match(line)
+        if not match:
+            continue
+        saw_rule = True
+        requirement = RULE_PROTOCOL_REQUIREMENTS.get(match.group(1).lower())
+        if requirement is None:
+            return True
+        section, key = requirement
+        if protocols.get(section, {}).get(key, 0) > 0:
+            return True
+        if key in ("http", "tls") and protocols.get("unclassified_tcp_flows", 0) > 0:
+            return True
+    return not saw_rule
@@ -3,21 +3,254 @@
 # PCAP File Manager Module - Database Version
 
 import os
+import time
+import uuid
 import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
 from typing import List, Dict, Optional
 import json
 
+try:
+    import fcntl
+except ImportError:  # Windows: no worker processes to coordinate
+    fcntl = None
+
+from http_samples import SAMPLE_FORMAT, extract_http_requests
+from pcap_indexer import INDEX_VERSION, index_pcap
+
+# Catalog columns returned by list_uploaded_pcaps/get_pcap_info
+PCAP_COLUMNS = ("filename", "filepath", "size", "sha256", "packet_count", "byte_count",
+                "first_timestamp", "last_timestamp", "protocols", "summary", "upload_time")
+# Columns added after the catalog was introduced, created on older databases
+PCAP_LATE_COLUMNS = {"byte_count": "INTEGER", "summary": "TEXT"}
+
+# Extracted HTTP request samples kept in memory per process (most recent captures)
+HTTP_SAMPLE_MEMORY_ENTRIES = 8
+
+# Uploads are copied in fixed-size blocks so memory use does not grow with the capture
+COPY_BLOCK_SIZE = 1024 * 1024
+
 
 class PCAPManagerDB:
-    def __init__(self, db, upload_folder: str = "uploads"):
+    def __init__(self, db, upload_folder: str = "uploads", max_upload_size: int = None):
         self.db = db
         self.upload_folder = upload_folder
+        self.partial_folder = os.path.join(upload_folder, '.partial')
+        # 0/None disables the limit
+        self.max_upload_size = max_upload_size if max_upload_size is not None else \
+            int(os.getenv('PCAP_MAX_UPLOAD_SIZE', str(4 * 1024 ** 3)))
+        self._session_locks = {}
+        self._session_hashers = {}
+        self._http_samples = {}
+        self.http_sample_limit = int(os.getenv('PCAP_HTTP_SAMPLE_LIMIT', '1000'))
+        self._lock = threading.Lock()
         self.ensure_upload_directory()
+        self.init_table()
+        self.migrate_legacy_list()
+
+    def init_table(self):
+        """Create the PCAP catalog table (one row per uploaded capture)"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pcaps (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                filename TEXT NOT NULL,
+                filepath TEXT NOT NULL,
+                size INTEGER NOT NULL DEFAULT 0,
+                sha256 TEXT,
+                packet_count INTEGER,
+                byte_count INTEGER,
+                first_timestamp REAL,
+                last_timestamp REAL,
+                protocols TEXT,
+                summary TEXT,
+                upload_time REAL NOT NULL
+            )
+        ''')
+        cursor.execute('PRAGMA table_info(pcaps)')
+        existing_columns = {row['name'] for row in cursor.fetchall()}
+        for column, column_type in PCAP_LATE_COLUMNS.items():
+            if column not in existing_columns:
+                cursor.execute(f'ALTER TABLE pcaps ADD COLUMN {column} {column_type}')
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_pcaps_filename ON pcaps(filename)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pcaps_sha256 ON pcaps(sha256)')
+        # Resumable chunked uploads in progress; received bytes are the size of the part file
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pcap_uploads (
+                upload_id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                total_size INTEGER,
+                expected_sha256 TEXT,
+                part_path TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        # HTTP requests extracted from a capture, shared by every file with the same content
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pcap_http_samples (
+                sha256 TEXT PRIMARY KEY,
+                requests TEXT NOT NULL,
+                truncated INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            )
+        ''')
+        cursor.execute('PRAGMA table_info(pcap_http_samples)')
+        if 'format' not in {row['name'] for row in cursor.fetchall()}:
+            cursor.execute('ALTER TABLE pcap_http_samples ADD COLUMN format INTEGER NOT NULL DEFAULT 1')
+        conn.commit()
+        conn.close()
+
+    def migrate_legacy_list(self) -> int:
+        """
+        Import the old ``uploaded_pcaps`` JSON list from the configurations table
+        into the catalog, then drop the key.  Returns the number of rows imported.
+        """
+        legacy = self.db.get_config("uploaded_pcaps")
+        if legacy is None:
+            return 0
+        try:
+            pcaps = json.loads(legacy)
+        except ValueError:
+            pcaps = []
+
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        imported = 0
+        for pcap in pcaps if isinstance(pcaps, list) else []:
+            if not isinstance(pcap, dict) or not pcap.get("filename"):
+                continue
+            filepath = pcap.get("filepath") or os.path.join(self.upload_folder, pcap["filename"])
+            sha256 = self._file_sha256(filepath) if os.path.exists(filepath) else None
+            # Later entries win, matching the old "last upload of a name" behaviour
+            cursor.execute('''
+                INSERT OR REPLACE INTO pcaps (filename, filepath, size, sha256, upload_time)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (pcap["filename"], filepath, pcap.get("size", 0), sha256,
+                  pcap.get("upload_time") or time.time()))
+            imported += 1
+        conn.commit()
+        conn.close()
+        self.db.delete_config("uploaded_pcaps")
+        for pcap in self.list_uploaded_pcaps():
+            if pcap["packet_count"] is None and os.path.exists(pcap["filepath"]):
+                self.index_pcap(pcap["filename"])
+        if imported:
+            print(f"✓ 已将 {imported} 条PCAP记录迁移到 pcaps 表")
+        return imported
+
+    @staticmethod
+    def _file_sha256(path: str) -> str:
+        sha256 = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    @staticmethod
+    def _row_to_info(row) -> Dict:
+        info = {column: row[column] for column in PCAP_COLUMNS}
+        info["protocols"] = json.loads(info["protocols"]) if info["protocols"] else None
+        info["summary"] = json.loads(info["summary"]) if info["summary"] else None
+        return info
+
+    @staticmethod
+    def _index_file(filepath: str) -> Dict:
+        """Catalog fields from the pre-indexer; empty when the capture cannot be parsed"""
+        try:
+            index = index_pcap(filepath)
+        except Exception as e:
+            print(f"Warning: PCAP索引失败 {filepath}: {e}")
+            return {}
+        index.pop("duration", None)
+        return index
+
+    def index_pcap(self, filename: str) -> Optional[Dict]:
+        """(Re)compute the content summary of a cataloged capture"""
+        pcap = self.get_pcap_info(filename)
+        if pcap is None or not os.path.exists(pcap["filepath"]):
+            return None
+        index = self._index_file(pcap["filepath"])
+        if not index:
+            return pcap
+        conn = self.db.get_connection()
+        conn.execute('''
+            UPDATE pcaps SET packet_count = ?, byte_count = ?, first_timestamp = ?,
+                             last_timestamp = ?, protocols = ?, summary = ?
+            WHERE filename = ?
+        ''', (index["packet_count"], index["byte_count"], index["first_timestamp"],
+              index["last_timestamp"], json.dumps(index["protocols"]),
+              json.dumps(index["summary"], ensure_ascii=False), filename))
+        conn.commit()
+        conn.close()
+        return self.get_pcap_info(filename)
+
+    def protocols_for_path(self, path: str) -> Optional[Dict]:
+        """Protocol summary of a cataloged capture by file path, None if unknown"""
+        pcap = self.get_pcap_info(os.path.basename(path))
+        if pcap is None or os.path.abspath(pcap["filepath"]) != os.path.abspath(path):
+            return None
+        protocols = pcap["protocols"]
+        if protocols and protocols.get("index_version") != INDEX_VERSION:
+            # Summarized by an older indexer: recompute once
+            pcap = self.index_pcap(pcap["filename"]) or pcap
+            protocols = pcap["protocols"]
+        return protocols
+
+    def get_http_samples(self, filename: str) -> Optional[Dict]:
+        """
+        HTTP requests of a cataloged capture, ``{"requests": [...], "truncated": bool}``.
+        Extracted on first use and cached by content hash, so every later rule
+        check against the capture is a lookup.  None if the capture is unknown.
+        """
+        pcap = self.get_pcap_info(filename)
+        if pcap is None or not os.path.exists(pcap["filepath"]):
+            return None
+        sha256 = pcap["sha256"] or self._file_sha256(pcap["filepath"])
+        with self._lock:
+            # Re-inserting keeps the dict in least-recently-used order
+            samples = self._http_samples.pop(sha256, None)
+            if samples is not None:
+                self._http_samples[sha256] = samples
+                return samples
+
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        # Rows written by an older extractor lack fields the simulator relies on
+        cursor.execute('SELECT requests, truncated FROM pcap_http_samples WHERE sha256 = ? AND format = ?',
+                       (sha256, SAMPLE_FORMAT))
+        row = cursor.fetchone()
+        conn.close()
+        if row:
+            samples = {"requests": json.loads(row['requests']), "truncated": bool(row['truncated'])}
+        else:
+            try:
+                samples = extract_http_requests(pcap["filepath"], self.http_sample_limit)
+            except Exception as e:
+                print(f"Warning: 提取HTTP请求样本失败 {pcap['filepath']}: {e}")
+                return None
+            conn = self.db.get_connection()
+            conn.execute('''
+                INSERT OR REPLACE INTO pcap_http_samples (sha256, requests, truncated, created_at, format)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (sha256, json.dumps(samples["requests"]), int(samples["truncated"]), time.time(), SAMPLE_FORMAT))
+            conn.commit()
+            conn.close()
+
+        with self._lock:
+            self._http_samples[sha256] = samples
+            while len(self._http_samples) > HTTP_SAMPLE_MEMORY_ENTRIES:
+                self._http_samples.pop(next(iter(self._http_samples)))
+        return samples
 
     def ensure_upload_directory(self):
         """Ensure upload directory exists"""
         if not os.path.exists(self.upload_folder):
             os.makedirs(self.upload_folder, exist_ok=True)
+        os.makedirs(self.partial_folder, exist_ok=True)
 
     def get_default_pcap_path(self) -> str:
         """Get the default PCAP path from config manager"""
@@ -29,85 +262,341 @@ class PCAPManagerDB:
         from config_manager import config_manager
         return config_manager.set_config("default_pcap_path", path)
 
+    def _too_large(self, size: int) -> bool:
+        return bool(self.max_upload_size) and size > self.max_upload_size
+
+    def _copy_stream(self, source, target, hasher, already_written: int = 0) -> int:
+        """
+        Copy ``source`` into the open ``target`` file block by block, hashing on
+        the fly.  Raises ValueError once the size limit is exceeded.
+        """
+        written = 0
+        while True:
+            block = source.read(COPY_BLOCK_SIZE)
+            if not block:
+                break
+            written += len(block)
+            if self._too_large(already_written + written):
+                raise ValueError(f"文件超过大小限制 ({self.max_upload_size} 字节)")
+            hasher.update(block)
+            target.write(block)
+        return written
+
+    def find_by_sha256(self, sha256: str) -> Optional[Dict]:
+        """Catalog entry with the given content hash whose file still exists"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {', '.join(PCAP_COLUMNS)} FROM pcaps WHERE sha256 = ? ORDER BY id", (sha256,))
+        rows = cursor.fetchall()
+        conn.close()
+        for row in rows:
+            if os.path.exists(row["filepath"]):
+                return self._row_to_info(row)
+        return None
+
+    def _path_users(self, filepath: str, exclude: str = None) -> int:
+        """Number of catalog names, other than ``exclude``, whose entry points at ``filepath``"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM pcaps WHERE filepath = ? AND filename != ?', (filepath, exclude or ''))
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count
+
+    def _release_file(self, filepath: Optional[str]):
+        """Delete a stored capture once no catalog name points at it any more"""
+        if filepath and os.path.exists(filepath) and self._path_users(filepath) == 0:
+            os.remove(filepath)
+
+    def _register_file(self, temp_path: str, filename: str, sha256: str) -> Dict:
+        """
+        Move a fully received upload into place.  If the content is already
+        stored, the upload is dropped and ``filename`` becomes an alias row that
+        points at the stored file, so later lookups by the new name succeed.
+        """
+        previous = self.get_pcap_info(filename)
+        existing = self.find_by_sha256(sha256)
+        if existing is not None:
+            os.remove(temp_path)
+            pcap_info = existing
+            if existing["filename"] != filename:
+                pcap_info = dict(existing, filename=filename, upload_time=time.time())
+                self.add_uploaded_pcap(pcap_info)
+                if previous is not None and previous["filepath"] != existing["filepath"]:
+                    self._release_file(previous["filepath"])
+            return {
+                "success": True,
+                "duplicate": True,
+                "message": f"已存在内容相同的PCAP文件: {existing['filename']}",
+                "pcap_info": pcap_info
+            }
+
+        filepath = os.path.join(self.upload_folder, filename)
+        if self._path_users(filepath, exclude=filename):
+            # The old content at this path is still used by an alias; keep it
+            filepath = os.path.join(self.upload_folder, f"{sha256[:16]}_{filename}")
+        os.replace(temp_path, filepath)
+        pcap_info = {
+            "filename": filename,
+            "filepath": filepath,
+            "size": os.path.getsize(filepath),
+            "sha256": sha256,
+            "upload_time": time.time()
+        }
+        pcap_info.update(self._index_file(filepath))
+        self.add_uploaded_pcap(pcap_info)
+        if previous is not None and previous["filepath"] != filepath:
+            self._release_file(previous["filepath"])
+        return {
+            "success": True,
+            "duplicate": False,
+            "message": "PCAP文件上传成功",
+            "pcap_info": pcap_info
+        }
+
     def upload_pcap(self, file_data, filename: str) -> Dict:
-        """Upload a PCAP file"""
+        """Upload a PCAP file, streaming it to disk while computing its SHA-256"""
+        temp_path = None
         try:
             # Sanitize filename to prevent path traversal
             safe_filename = os.path.basename(filename)
-            filepath = os.path.join(self.upload_folder, safe_filename)
-
-            # Save file
-            with open(filepath, 'wb') as f:
-                f.write(file_data.read())
-
-            # Add to uploaded PCAPs list in database
-            pcap_info = {
-                "filename": safe_filename,
-                "filepath": filepath,
-                "size": os.path.getsize(filepath),
-                "upload_time": os.path.getctime(filepath)
-            }
+            temp_path = os.path.join(self.partial_folder, f"{uuid.uuid4().hex}.part")
 
-            # Store the pcap info in database
-            self.add_uploaded_pcap(pcap_info)
+            sha256 = hashlib.sha256()
+            with open(temp_path, 'wb') as f:
+                self._copy_stream(file_data, f, sha256)
 
+            result = self._register_file(temp_path, safe_filename, sha256.hexdigest())
+            temp_path = None
+            return result
+        except ValueError as e:
             return {
-                "success": True,
-                "message": "PCAP文件上传成功",
-                "pcap_info": pcap_info
+                "success": False,
+                "code": "too_large",
+                "message": f"上传失败: {str(e)}"
             }
         except Exception as e:
             return {
                 "success": False,
                 "message": f"上传失败: {str(e)}"
             }
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def create_upload_session(self, filename: str, total_size: int = None, sha256: str = None) -> Dict:
+        """Start a resumable chunked upload; chunks are appended with append_upload_chunk"""
+        if total_size is not None and self._too_large(total_size):
+            return {"success": False, "code": "too_large",
+                    "message": f"文件超过大小限制 ({self.max_upload_size} 字节)"}
+        upload_id = uuid.uuid4().hex
+        part_path = os.path.join(self.partial_folder, f"{upload_id}.part")
+        open(part_path, 'wb').close()
+        now = time.time()
+        conn = self.db.get_connection()
+        conn.execute('''
+            INSERT INTO pcap_uploads (upload_id, filename, total_size, expected_sha256, part_path, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (upload_id, os.path.basename(filename), total_size, sha256.lower() if sha256 else None,
+              part_path, now, now))
+        conn.commit()
+        conn.close()
+        return {"success": True, "upload": self.get_upload_session(upload_id)}
+
+    def get_upload_session(self, upload_id: str) -> Optional[Dict]:
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM pcap_uploads WHERE upload_id = ?', (upload_id,))
+        row = cursor.fetchone()
+        conn.close()
+        if row is None:
+            return None
+        session = dict(row)
+        session["received"] = os.path.getsize(session["part_path"]) if os.path.exists(session["part_path"]) else 0
+        session.pop("part_path")
+        return session
+
+    @contextmanager
+    def _session_lock(self, upload_id: str):
+        """
+        Serialize work on one upload session across threads and, by locking the
+        part file, across worker processes.  Callers re-read the session after
+        acquiring it, since another process may have completed or aborted it.
+        """
+        with self._lock:
+            thread_lock = self._session_locks.setdefault(upload_id, threading.Lock())
+        with thread_lock:
+            try:
+                fd = os.open(os.path.join(self.partial_folder, f"{upload_id}.part"), os.O_RDONLY)
+            except FileNotFoundError:
+                # Unknown or finished session; the caller finds no row
+                yield
+                return
+            try:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    def _session_hasher(self, upload_id: str, part_path: str, received: int):
+        """Running SHA-256 of the part file; rebuilt from disk after a restart"""
+        hasher, hashed = self._session_hashers.get(upload_id, (None, -1))
+        if hasher is None or hashed != received:
+            hasher = hashlib.sha256()
+            with open(part_path, 'rb') as f:
+                for block in iter(lambda: f.read(COPY_BLOCK_SIZE), b''):
+                    hasher.update(block)
+        return hasher
+
+    def append_upload_chunk(self, upload_id: str, offset: int, stream) -> Dict:
+        """
+        Append one chunk at ``offset``.  The offset must equal the bytes already
+        received, so a client that lost a response can query the session and resume.
+        """
+        with self._session_lock(upload_id):
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT part_path, total_size FROM pcap_uploads WHERE upload_id = ?', (upload_id,))
+            row = cursor.fetchone()
+            conn.close()
+            if row is None:
+                return {"success": False, "code": "not_found", "message": "上传会话不存在"}
+
+            part_path = row["part_path"]
+            received = os.path.getsize(part_path)
+            if offset != received:
+                return {"success": False, "code": "offset_mismatch", "received": received,
+                        "message": f"偏移量不匹配，已接收 {received} 字节"}
+
+            hasher = self._session_hasher(upload_id, part_path, received)
+            try:
+                with open(part_path, 'ab') as f:
+                    written = self._copy_stream(stream, f, hasher, already_written=received)
+            except ValueError as e:
+                with open(part_path, 'ab') as f:
+                    f.truncate(received)
+                self._session_hashers.pop(upload_id, None)
+                return {"success": False, "code": "too_large", "received": received, "message": str(e)}
+            except Exception:
+                # A broken connection leaves a partial chunk; drop the cached hash so it is rebuilt
+                self._session_hashers.pop(upload_id, None)
+                raise
+            received += written
+            if row["total_size"] is not None and received > row["total_size"]:
+                with open(part_path, 'ab') as f:
+                    f.truncate(received - written)
+                self._session_hashers.pop(upload_id, None)
+                return {"success": False, "code": "too_large", "received": received - written,
+                        "message": "数据超过声明的文件大小"}
+            self._session_hashers[upload_id] = (hasher, received)
+
+            conn = self.db.get_connection()
+            conn.execute('UPDATE pcap_uploads SET updated_at = ? WHERE upload_id = ?', (time.time(), upload_id))
+            conn.commit()
+            conn.close()
+            return {"success": True, "received": received}
+
+    def complete_upload(self, upload_id: str) -> Dict:
+        """Verify size/hash of a chunked upload and register it in the catalog"""
+        with self._session_lock(upload_id):
+            conn = self.db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM pcap_uploads WHERE upload_id = ?', (upload_id,))
+            row = cursor.fetchone()
+            conn.close()
+            if row is None:
+                return {"success": False, "code": "not_found", "message": "上传会话不存在"}
+
+            part_path = row["part_path"]
+            received = os.path.getsize(part_path)
+            if row["total_size"] is not None and received != row["total_size"]:
+                return {"success": False, "code": "incomplete", "received": received,
+                        "message": f"文件未传输完整: {received}/{row['total_size']} 字节"}
+            sha256 = self._session_hasher(upload_id, part_path, received).hexdigest()
+            if row["expected_sha256"] and sha256 != row["expected_sha256"]:
+                self._discard_session(upload_id, part_path)
+                return {"success": False, "code": "hash_mismatch", "message": "SHA-256 校验失败，请重新上传"}
+
+            result = self._register_file(part_path, row["filename"], sha256)
+            self._discard_session(upload_id, None)
+            return result
+
+    def abort_upload(self, upload_id: str) -> bool:
+        session = self.get_upload_session(upload_id)
+        if session is None:
+            return False
+        with self._session_lock(upload_id):
+            self._discard_session(upload_id, os.path.join(self.partial_folder, f"{upload_id}.part"))
+        return True
+
+    def _discard_session(self, upload_id: str, part_path: Optional[str]):
+        if part_path and os.path.exists(part_path):
+            os.remove(part_path)
+        conn = self.db.get_connection()
+        conn.execute('DELETE FROM pcap_uploads WHERE upload_id = ?', (upload_id,))
+        conn.commit()
+        conn.close()
+        self._session_hashers.pop(upload_id, None)
+        with self._lock:
+            self._session_locks.pop(upload_id, None)
 
     def add_uploaded_pcap(self, pcap_info: Dict):
-        """Add uploaded pcap info to database"""
-        # We'll store the list of uploaded pcaps as a JSON string in the config table
-        # with key 'uploaded_pcaps'
-        current_pcaps = self.list_uploaded_pcaps()
-        current_pcaps.append(pcap_info)
-        
-        from config_manager import config_manager
-        config_manager.set_config("uploaded_pcaps", current_pcaps)
+        """Insert or replace the catalog row for one uploaded pcap"""
+        protocols = pcap_info.get("protocols")
+        summary = pcap_info.get("summary")
+        conn = self.db.get_connection()
+        conn.execute('''
+            INSERT INTO pcaps (filename, filepath, size, sha256, packet_count, byte_count,
+                               first_timestamp, last_timestamp, protocols, summary, upload_time)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(filename) DO UPDATE SET
+                filepath = excluded.filepath, size = excluded.size, sha256 = excluded.sha256,
+                packet_count = excluded.packet_count, byte_count = excluded.byte_count,
+                first_timestamp = excluded.first_timestamp, last_timestamp = excluded.last_timestamp,
+                protocols = excluded.protocols, summary = excluded.summary,
+                upload_time = excluded.upload_time
+        ''', (pcap_info["filename"], pcap_info["filepath"], pcap_info.get("size", 0),
+              pcap_info.get("sha256"), pcap_info.get("packet_count"), pcap_info.get("byte_count"),
+              pcap_info.get("first_timestamp"), pcap_info.get("last_timestamp"),
+              json.dumps(protocols) if protocols is not None else None,
+              json.dumps(summary, ensure_ascii=False) if summary is not None else None,
+              pcap_info.get("upload_time") or time.time()))
+        conn.commit()
+        conn.close()
 
     def list_uploaded_pcaps(self) -> List[Dict]:
         """List all uploaded PCAP files"""
-        from config_manager import config_manager
-        pcaps = config_manager.get_config("uploaded_pcaps", [])
-        return pcaps
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {', '.join(PCAP_COLUMNS)} FROM pcaps ORDER BY upload_time, id")
+        rows = cursor.fetchall()
+        conn.close()
+        return [self._row_to_info(row) for row in rows]
 
     def delete_pcap(self, filename: str) -> Dict:
         """Delete an uploaded PCAP file"""
         try:
-            # Find the PCAP file in the list
-            pcaps = self.list_uploaded_pcaps()
-            pcap_to_delete = None
-            index_to_remove = -1
-
-            for i, pcap in enumerate(pcaps):
-                if pcap["filename"] == filename:
-                    pcap_to_delete = pcap
-                    index_to_remove = i
-                    break
-
+            pcap_to_delete = self.get_pcap_info(filename)
             if pcap_to_delete is None:
                 return {
                     "success": False,
                     "message": "PCAP文件不存在"
                 }
 
-            # Delete the physical file
-            if os.path.exists(pcap_to_delete["filepath"]):
-                os.remove(pcap_to_delete["filepath"])
-
-            # Remove from the list
-            del pcaps[index_to_remove]
-            
-            # Update the database
-            from config_manager import config_manager
-            config_manager.set_config("uploaded_pcaps", pcaps)
+            conn = self.db.get_connection()
+            conn.execute('DELETE FROM pcaps WHERE filename = ?', (filename,))
+            # Samples stay while another cataloged file has the same content
+            conn.execute('''
+                DELETE FROM pcap_http_samples WHERE sha256 = ?
+                AND NOT EXISTS (SELECT 1 FROM pcaps WHERE sha256 = ?)
+            ''', (pcap_to_delete["sha256"], pcap_to_delete["sha256"]))
+            conn.commit()
+            conn.close()
+            # The physical file stays while an alias still points at it
+            self._release_file(pcap_to_delete["filepath"])
+            with self._lock:
+                self._http_samples.pop(pcap_to_delete["sha256"], None)
 
             return {
                 "success": True,
@@ -121,19 +610,17 @@ class PCAPManagerDB:
 
     def get_pcap_path(self, filename: str) -> Optional[str]:
         """Get the full path of an uploaded PCAP file"""
-        pcaps = self.list_uploaded_pcaps()
-        for pcap in pcaps:
-            if pcap["filename"] == filename:
-                return pcap["filepath"]
-        return None
+        pcap = self.get_pcap_info(filename)
+        return pcap["filepath"] if pcap else None
 
     def get_pcap_info(self, filename: str) -> Optional[Dict]:
         """Get information about a specific PCAP file"""
-        pcaps = self.list_uploaded_pcaps()
-        for pcap in pcaps:
-            if pcap["filename"] == filename:
-                return pcap
-        return None
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {', '.join(PCAP_COLUMNS)} FROM pcaps WHERE filename = ?", (filename,))
+        row = cursor.fetchone()
+        conn.close()
+        return self._row_to_info(row) if row else None
 
 
 # Global instance
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# PCAP Pre-Filter - carve the flows a rule could match out of a capture before the engine runs
+
+import struct
+from array import array
+from typing import Dict, List, Optional
+
+from pcap_indexer import TUNNEL_UDP_PORTS, _network_layer, _transport_layer
+from pcap_reader import PcapReader
+from rule_parser import RuleParseError, parse_rules
+
+# Rule protocol -> IP protocol numbers its traffic can ride on (unknown protocols match everything)
+RULE_TRANSPORTS = {
+    "tcp": {6}, "udp": {17}, "icmp": {1, 58},
+    "http": {6}, "http1": {6}, "http2": {6}, "tls": {6}, "ssh": {6}, "ftp": {6},
+    "smtp": {6}, "imap": {6}, "smb": {6}, "rdp": {6}, "mqtt": {6}, "pgsql": {6},
+    "modbus": {6}, "dnp3": {6}, "telnet": {6},
+    "dns": {6, 17}, "ntp": {17}, "dhcp": {17}, "tftp": {17}, "snmp": {17}, "quic": {17}, "ike": {17},
+}
+
+# Buffers whose content appears byte-for-byte (ignoring case) in the raw flow payload.
+# Normalized or decoded buffers (http.uri, http.header, file.data, dns.query, ...) are
+# not used for filtering because the raw bytes may legitimately differ.
+RAW_BUFFERS = {
+    None, "http.method", "http.uri.raw", "http.header.raw", "http.host", "http.host.raw",
+    "http.user_agent", "http.cookie", "http.cookie.raw", "http.request_line", "http.protocol", "http.stat_code", "tls.sni",
+}
+MAX_PORT = 65535
+# IP protocols whose payload the filter inspects; anything else (GRE, IP-in-IP, ESP, ...)
+# may carry packets the engine decodes, so it is always kept
+INSPECTED_PROTOCOLS = {1, 6, 17, 58}
+
+
+class RuleSelector:
+    """Transport, port and raw content constraints of one rule, used to select candidate flows"""
+
+    def __init__(self, transports, src_ports, dst_ports, contents: List[bytes]):
+        self.transports = transports
+        self.src_ports = src_ports
+        self.dst_ports = dst_ports
+        self.contents = contents
+
+    def accepts_flow(self, proto: int, port_a: Optional[int], port_b: Optional[int]) -> bool:
+        if self.transports is not None and proto not in self.transports:
+            return False
+        if port_a is None or port_b is None:
+            return True
+        # Either endpoint may be the rule's source side
+        return ((_port_in(port_a, self.src_ports) and _port_in(port_b, self.dst_ports)) or
+                (_port_in(port_b, self.src_ports) and _port_in(port_a, self.dst_ports)))
+
+
+def _port_in(port: int, ranges) -> bool:
+    return ranges is None or any(low <= port <= high for low, high in ranges)
+
+
+def _parse_ports(token: str):
+    """List of (low, high) ranges, or None for any / variables / negations"""
+    token = token.strip()
+    if token == 'any' or '$' in token or '!' in token:
+        return None
+    ranges = []
+    for part in token.strip('[]').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if ':' in part:
+            low, high = part.split(':', 1)
+            ranges.append((int(low) if low else 0, int(high) if high else MAX_PORT))
+        else:
+            ranges.append((int(part), int(part)))
+    return ranges or None
+
+
+def parse_rule_selectors(rule_content: str) -> Optional[List[RuleSelector]]:
+    """Selectors for every rule in rule_content, or None if any rule cannot be parsed"""
+    try:
+        rules = parse_rules(rule_content)
+    except RuleParseError:
+        return None
+    selectors = []
+    for rule in rules:
+        header = rule.header
+        try:
+            src_ports, dst_ports = _parse_ports(header.src_port), _parse_ports(header.dst_port)
+        except ValueError:
+            return None
+        contents = [content.pattern.lower() for content in rule.contents
+                    if not content.negated and content.buffer in RAW_BUFFERS]
+        selectors.append(RuleSelector(RULE_TRANSPORTS.get(header.protocol.lower()), src_ports, dst_ports, contents))
+    return selectors
+
+
+def _is_fragment(version: int, packet: bytes) -> bool:
+    if version == 4:
+        return len(packet) >= 8 and struct.unpack('!H', packet[6:8])[0] & 0x3FFF != 0
+    proto, offset = (packet[6], 40) if len(packet) >= 40 else (None, 0)
+    while proto in (0, 43, 60, 44) and len(packet) >= offset + 8:
+        if proto == 44:
+            return True
+        proto, offset = packet[offset], offset + (packet[offset + 1] + 1) * 8
+    return False
+
+
+def _flow_of(link_type: int, data: bytes):
+    """(flow_key, direction, proto, l4_bytes) or None for traffic that cannot be attributed to a flow"""
+    version, packet = _network_layer(link_type, data)
+    if not version or _is_fragment(version, packet):
+        return None
+    layer = _transport_layer(version, packet)
+    if layer is None:
+        return None
+    src, dst, proto, l4 = layer
+    if proto in (6, 17) and len(l4) >= 4:
+        src_port, dst_port = struct.unpack('!HH', l4[:4])
+    else:
+        src_port = dst_port = None
+    a, b = (src, src_port or 0), (dst, dst_port or 0)
+    key = (proto,) + ((a, b) if a <= b else (b, a))
+    return key, int(a > b), proto, l4
+
+
+class _FlowState:
+    def __init__(self, selectors: List[RuleSelector]):
+        self.selectors = selectors
+        self.literals = sorted({c for s in selectors for c in s.contents}, key=len)
+        self.found = set()
+        self.keep = any(not s.contents for s in selectors)
+        overlap = max((len(c) for c in self.literals), default=1) - 1
+        self.overlap = overlap
+        self.tails = [b'', b'']
+        self.next_seq = [None, None]
+
+    def add_payload(self, direction: int, proto: int, l4: bytes):
+        if self.keep:
+            return
+        if proto == 6 and len(l4) >= 20:
+            payload = l4[(l4[12] >> 4) * 4:]
+            seq, flags = struct.unpack('!I', l4[4:8])[0], l4[13]
+            expected = self.next_seq[direction]
+            if expected is not None and payload and seq != expected:
+                # Retransmission or reordering: a literal could straddle segments
+                # in an order we do not see, so keep the flow
+                self.keep = True
+                return
+            self.next_seq[direction] = (seq + len(payload) + (flags & 0x02 and 1) + (flags & 0x01 and 1)) & 0xFFFFFFFF
+        elif proto == 17 and len(l4) >= 8:
+            payload = l4[8:]
+        else:
+            payload = l4
+        if not payload:
+            return
+        window = self.tails[direction] + bytes(payload).lower()
+        for literal in self.literals:
+            if literal not in self.found and literal in window:
+                self.found.add(literal)
+        self.tails[direction] = window[-self.overlap:] if self.overlap else b''
+        if any(self.found.issuperset(s.contents) for s in self.selectors):
+            self.keep = True
+
+
+def prefilter_pcap(rule_content: str, source_path: str, target_path: str) -> Optional[Dict]:
+    """
+    Write only the flows the rules could match into target_path (classic pcap).
+
+    A flow is kept when its transport and ports fit a rule and every raw content
+    literal of that rule occurs in one of its directions.  Traffic that cannot be
+    attributed to a flow (non-IP, fragments) and tunnels (GRE, IP-in-IP, VXLAN, ...)
+    are always kept.  Returns None, without
+    writing anything, when the capture cannot be narrowed safely or nothing would
+    be dropped.
+    """
+    selectors = parse_rule_selectors(rule_content)
+    if selectors is None:
+        return None
+
+    with PcapReader(source_path) as reader:
+        return _filter_flows(reader, selectors, target_path)
+
+
+def _filter_flows(reader: PcapReader, selectors: List[RuleSelector], target_path: str) -> Optional[Dict]:
+    flows = {}
+    flow_ids = {}
+    # Flow id of every packet (-1: not attributable), so the write pass needs no re-parsing
+    packet_flows = array('i')
+    link_types = set()
+    for _, link_type, _, _, data in reader:
+        link_types.add(link_type)
+        flow = _flow_of(link_type, data)
+        if flow is None:
+            packet_flows.append(-1)
+            continue
+        key, direction, proto, l4 = flow
+        if proto not in INSPECTED_PROTOCOLS or (proto == 17 and TUNNEL_UDP_PORTS.intersection(
+                (key[1][1], key[2][1]))):
+            # Encapsulated traffic: the inner flows are not visible here
+            packet_flows.append(-1)
+            continue
+        if key not in flow_ids:
+            port_a, port_b = (key[1][1], key[2][1]) if proto in (6, 17) else (None, None)
+            candidates = [s for s in selectors if s.accepts_flow(proto, port_a, port_b)]
+            flow_ids[key] = len(flow_ids)
+            flows[flow_ids[key]] = _FlowState(candidates) if candidates else None
+        flow_id = flow_ids[key]
+        packet_flows.append(flow_id)
+        state = flows[flow_id]
+        if state is not None:
+            state.add_payload(direction, proto, l4)
+
+    if len(link_types) > 1:
+        return None
+    kept = {flow_id for flow_id, state in flows.items() if state is not None and state.keep}
+    if len(kept) == len(flows):
+        return None
+
+    packets_out = 0
+    with open(target_path, 'wb') as out:
+        out.write(struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 262144, next(iter(link_types), 1)))
+        for (_, _, timestamp, orig_len, data), flow_id in zip(reader, packet_flows):
+            if flow_id != -1 and flow_id not in kept:
+                continue
+            timestamp = timestamp or 0.0
+            seconds = int(timestamp)
+            micros = min(int(round((timestamp - seconds) * 1e6)), 999999)
+            out.write(struct.pack('<IIII', seconds, micros, len(data), max(orig_len, len(data))))
+            out.write(data)
+            packets_out += 1
+    return {
+        "packets_in": len(packet_flows),
+        "packets_out": packets_out,
+        "flows_in": len(flows),
+        "flows_kept": len(kept)
+    }
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# PCAP Reader - zero-copy pcap/pcapng access over mmap with random access by packet index
+
+import os
+import mmap
+import struct
+from array import array
+from typing import Iterator, List, Optional, Tuple
+
+PCAP_MAGICS = {
+    b'\xd4\xc3\xb2\xa1': ('<', 1e-6),
+    b'\xa1\xb2\xc3\xd4': ('>', 1e-6),
+    b'\x4d\x3c\xb2\xa1': ('<', 1e-9),
+    b'\xa1\xb2\x3c\x4d': ('>', 1e-9),
+}
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_LE = b'\x4d\x3c\x2b\x1a'
+PCAPNG_IDB = 1
+PCAPNG_SPB = 3
+PCAPNG_EPB = 6
+
+PCAP_FILE_HEADER_SIZE = 24
+PCAP_RECORD_HEADER_SIZE = 16
+DEFAULT_LINK_TYPE = 1  # Ethernet
+
+# (offset, link_type, timestamp, original_length, captured_data)
+Packet = Tuple[int, int, Optional[float], int, memoryview]
+
+
+class PcapReader:
+    """
+    Read-only view of a pcap or pcapng file.
+
+    The file is memory-mapped and packets are returned as ``memoryview`` slices
+    of the mapping, so walking record headers never copies payload bytes.
+    Iterating yields ``(offset, link_type, timestamp, orig_len, data)`` tuples;
+    ``build_index()`` records every packet's file offset so ``packet_at(n)``
+    can jump straight to the n-th packet.  Views must not outlive ``close()``.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            size = os.fstat(self._file.fileno()).st_size
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        except Exception:
+            self._file.close()
+            raise
+        self._view = memoryview(self._mmap) if self._mmap is not None else memoryview(b'')
+        self._offsets = None
+        self._sections = None
+        # pcapng: (endian, [(link_type, resolution), ...]) per section header block
+        self._section_info: List[Tuple[str, list]] = []
+
+        magic = bytes(self._view[:4])
+        if magic in PCAP_MAGICS:
+            self.format = 'pcap'
+            self._endian, self._resolution = PCAP_MAGICS[magic]
+            self._link_type = DEFAULT_LINK_TYPE
+            if len(self._view) >= PCAP_FILE_HEADER_SIZE:
+                self._link_type = struct.unpack_from(self._endian + 'I', self._view, 20)[0] & 0x0FFFFFFF
+            self._record = struct.Struct(self._endian + 'IIII')
+        elif len(magic) == 4 and struct.unpack('<I', magic)[0] == PCAPNG_SHB:
+            self.format = 'pcapng'
+        else:
+            self.close()
+            raise ValueError("不支持的PCAP格式（需要 pcap 或 pcapng）")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._file is None:
+            return
+        self._view.release()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A caller still holds a packet view; the mapping goes away with it
+                pass
+        self._file.close()
+        self._file = None
+
+    def __iter__(self) -> Iterator[Packet]:
+        if self.format == 'pcap':
+            return self._iter_pcap()
+        return self._iter_pcapng()
+
+    def __len__(self) -> int:
+        return len(self.build_index())
+
+    def build_index(self) -> array:
+        """File offset of every packet record (built once, one header walk)"""
+        if self._offsets is None:
+            offsets = array('Q')
+            sections = array('I')
+            for offset, *_ in self:
+                offsets.append(offset)
+                if self.format == 'pcapng':
+                    sections.append(len(self._section_info) - 1)
+            self._offsets, self._sections = offsets, sections
+        return self._offsets
+
+    def packet_at(self, index: int) -> Packet:
+        """The index-th packet of the capture"""
+        offsets = self.build_index()
+        offset = offsets[index]
+        if self.format == 'pcap':
+            return self._pcap_record(offset)
+        endian, interfaces = self._section_info[self._sections[index]]
+        return self._pcapng_block(offset, endian, interfaces)
+
+    def _pcap_record(self, offset: int) -> Optional[Packet]:
+        view = self._view
+        if offset + PCAP_RECORD_HEADER_SIZE > len(view):
+            return None
+        ts_sec, ts_frac, incl_len, orig_len = self._record.unpack_from(view, offset)
+        start = offset + PCAP_RECORD_HEADER_SIZE
+        if start + incl_len > len(view):
+            return None
+        return offset, self._link_type, ts_sec + ts_frac * self._resolution, orig_len, view[start:start + incl_len]
+
+    def _iter_pcap(self) -> Iterator[Packet]:
+        offset = PCAP_FILE_HEADER_SIZE
+        while True:
+            packet = self._pcap_record(offset)
+            if packet is None:
+                return
+            yield packet
+            offset += PCAP_RECORD_HEADER_SIZE + len(packet[4])
+
+    def _pcapng_block(self, offset: int, endian: str, interfaces: list) -> Optional[Packet]:
+        """Decode the packet block at offset; None for non-packet blocks"""
+        view = self._view
+        block_type, block_len = struct.unpack_from(endian + 'II', view, offset)
+        body_start, body_end = offset + 8, offset + block_len - 4
+        if block_type == PCAPNG_EPB and body_end - body_start >= 20:
+            if_id, ts_high, ts_low, cap_len, orig_len = struct.unpack_from(endian + 'IIIII', view, body_start)
+            link_type, resolution = interfaces[if_id] if if_id < len(interfaces) else (DEFAULT_LINK_TYPE, 1e-6)
+            data_start = body_start + 20
+            return (offset, link_type, ((ts_high << 32) | ts_low) * resolution, orig_len,
+                    view[data_start:min(data_start + cap_len, body_end)])
+        if block_type == PCAPNG_SPB and body_end - body_start >= 4:
+            orig_len = struct.unpack_from(endian + 'I', view, body_start)[0]
+            link_type = interfaces[0][0] if interfaces else DEFAULT_LINK_TYPE
+            return offset, link_type, None, orig_len, view[body_start + 4:min(body_start + 4 + orig_len, body_end)]
+        return None
+
+    def _iter_pcapng(self) -> Iterator[Packet]:
+        view = self._view
+        size = len(view)
+        offset = 0
+        endian = '<'
+        interfaces = []
+        self._section_info = []
+        while offset + 12 <= size:
+            if struct.unpack_from('<I', view, offset)[0] == PCAPNG_SHB:
+                # Byte-order magic decides the endianness of this section
+                endian = '<' if bytes(view[offset + 8:offset + 12]) == PCAPNG_BYTE_ORDER_LE else '>'
+                interfaces = []
+                self._section_info.append((endian, interfaces))
+            block_type, block_len = struct.unpack_from(endian + 'II', view, offset)
+            if block_len < 12 or offset + block_len > size:
+                return
+            if block_type == PCAPNG_IDB and block_len >= 20:
+                link_type = struct.unpack_from(endian + 'H', view, offset + 8)[0]
+                interfaces.append((link_type, _tsresol(view[offset + 16:offset + block_len - 4], endian)))
+            elif block_type in (PCAPNG_EPB, PCAPNG_SPB):
+                packet = self._pcapng_block(offset, endian, interfaces)
+                if packet is not None:
+                    yield packet
+            offset += block_len
+
+
+def _tsresol(options: memoryview, endian: str) -> float:
+    """if_tsresol option of an Interface Description Block (default microseconds)"""
+    offset = 0
+    while offset + 4 <= len(options):
+        code, length = struct.unpack_from(endian + 'HH', options, offset)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            value = options[offset + 4]
+            return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+        offset += 4 + ((length + 3) & ~3)
+    return 1e-6
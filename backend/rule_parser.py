@@ -0,0 +1,473 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Suricata Rule Parser - pure-Python rule parser, AST and project template lint
+
+import re
+from typing import Dict, List, Optional
+
+RULE_ACTIONS = ("alert", "drop", "reject", "rejectsrc", "rejectdst", "rejectboth", "pass")
+RULE_DIRECTIONS = ("->", "<>", "=>")
+FLOW_KEYWORDS = {
+    "established", "not_established", "stateless", "to_server", "to_client", "from_server",
+    "from_client", "only_stream", "no_stream", "only_frag", "no_frag",
+}
+
+# Legacy content modifiers and the sticky buffer each one stands for
+BUFFER_MODIFIERS = {
+    "http_uri": "http.uri", "http_raw_uri": "http.uri.raw", "http_method": "http.method",
+    "http_header": "http.header", "http_raw_header": "http.header.raw", "http_cookie": "http.cookie",
+    "http_raw_cookie": "http.cookie.raw", "http_user_agent": "http.user_agent", "http_host": "http.host",
+    "http_raw_host": "http.host.raw", "http_client_body": "http.request_body",
+    "http_server_body": "http.response_body", "http_stat_code": "http.stat_code",
+    "http_stat_msg": "http.stat_msg",
+}
+# Sticky buffer keywords without a dot in their name; "pkt_data" resets to the packet payload
+LEGACY_STICKY_BUFFERS = {
+    "file_data": "file.data", "pkt_data": None, "base64_data": "base64_data",
+    "dns_query": "dns.query", "tls_sni": "tls.sni", "tls_cert_subject": "tls.cert_subject",
+    "tls_cert_issuer": "tls.cert_issuer", "tls_cert_serial": "tls.cert_serial",
+    "tls_cert_fingerprint": "tls.cert_fingerprint", "ja3_hash": "ja3.hash", "ja3_string": "ja3.string",
+    "ja3s_hash": "ja3s.hash", "ja3s_string": "ja3s.string", "ssh_proto": "ssh.proto",
+    "ssh_software": "ssh.software", "http_request_line": "http.request_line",
+    "http_response_line": "http.response_line", "http_protocol": "http.protocol",
+    "http_accept": "http.accept", "http_accept_enc": "http.accept_enc",
+    "http_accept_lang": "http.accept_lang", "http_connection": "http.connection",
+    "http_content_len": "http.content_len", "http_content_type": "http.content_type",
+    "http_header_names": "http.header_names", "http_referer": "http.referer",
+    "http_start": "http.start", "http_location": "http.location", "http_server": "http.server",
+}
+# Value-less keywords that are not sticky buffers.  Any other value-less keyword
+# is taken as a sticky buffer under its own name, so the content after it is
+# never mistaken for raw payload
+NON_BUFFER_KEYWORDS = {"tls.store", "noalert", "sameip", "ftpbounce", "bypass", "prefilter"}
+CONTENT_MODIFIERS = {"nocase", "depth", "offset", "distance", "within", "fast_pattern",
+                     "startswith", "endswith", "rawbytes"}
+NUMERIC_CONTENT_MODIFIERS = {"depth", "offset", "distance", "within"}
+INTEGER_OPTIONS = {"sid", "rev", "gid", "priority"}
+
+# pcre modifier letters that select an inspection buffer
+PCRE_BUFFER_FLAGS = {
+    "U": "http.uri", "I": "http.uri.raw", "P": "http.request_body", "Q": "file.data",
+    "H": "http.header", "D": "http.header.raw", "M": "http.method", "C": "http.cookie",
+    "S": "http.stat_code", "Y": "http.stat_msg", "V": "http.user_agent", "W": "http.host",
+    "Z": "http.host.raw",
+}
+PCRE_FLAGS = set("ismxAEGRBO") | set(PCRE_BUFFER_FLAGS)
+
+# Project rule template (see build_rule_generation_prompt)
+TEMPLATE_REQUIRED_OPTIONS = ("msg", "flow", "sid", "rev")
+TEMPLATE_FORBIDDEN_OPTIONS = ("reference", "classtype", "affected_version", "detection_accuracy",
+                              "affected_product", "metadata")
+TEMPLATE_SID_RANGE = (9000000, 9999999)
+SINGLE_OPTIONS = ("msg", "sid", "rev", "flow")
+# Options that only label a rule; equivalent rules may differ in them
+NON_MATCHING_OPTIONS = ("msg", "sid", "rev")
+
+OPTION_NAME = re.compile(r'^[A-Za-z0-9_.\-]+$')
+PROTOCOL_NAME = re.compile(r'^[A-Za-z0-9_\-]+$')
+PORT_ATOM = re.compile(r'^!?(?:\$[A-Za-z0-9_]+|any|\d+|\d*:\d*)$')
+ADDRESS_CHARS = re.compile(r'^[A-Za-z0-9_$!:./\[\], \-]+$')
+NUMBER_OR_VAR = re.compile(r'^-?\d+$|^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class RuleParseError(ValueError):
+    """Raised when rule text is not a well-formed Suricata rule"""
+
+
+class RuleHeader:
+    """action protocol src_addr src_port direction dst_addr dst_port"""
+
+    def __init__(self, action: str, protocol: str, src_addr: str, src_port: str,
+                 direction: str, dst_addr: str, dst_port: str):
+        self.action = action
+        self.protocol = protocol
+        self.src_addr = src_addr
+        self.src_port = src_port
+        self.direction = direction
+        self.dst_addr = dst_addr
+        self.dst_port = dst_port
+
+    def to_text(self) -> str:
+        return ' '.join((self.action, self.protocol, self.src_addr, self.src_port,
+                         self.direction, self.dst_addr, self.dst_port))
+
+
+class RuleOption:
+    """One ``name[:value];`` option, value kept verbatim (None for flags such as nocase)"""
+
+    def __init__(self, name: str, value: Optional[str]):
+        self.name = name
+        self.value = value
+
+    def to_text(self) -> str:
+        return self.name if self.value is None else f"{self.name}:{self.value}"
+
+
+class ContentMatch:
+    """A content option with its decoded pattern, inspection buffer and modifiers"""
+
+    def __init__(self, pattern: bytes, negated: bool, buffer: Optional[str], value: str):
+        self.pattern = pattern
+        self.negated = negated
+        self.buffer = buffer
+        self.value = value
+        self.modifiers: Dict[str, Optional[str]] = {}
+
+    @property
+    def nocase(self) -> bool:
+        return "nocase" in self.modifiers
+
+
+class PcreMatch:
+    """A pcre option split into pattern and flags, with the buffer it inspects"""
+
+    def __init__(self, pattern: str, flags: str, negated: bool, buffer: Optional[str], value: str):
+        self.pattern = pattern
+        self.flags = flags
+        self.negated = negated
+        self.buffer = buffer
+        self.value = value
+
+    @property
+    def relative(self) -> bool:
+        return "R" in self.flags
+
+
+class Rule:
+    """Parsed rule: header, ordered options and the content/pcre matches derived from them"""
+
+    def __init__(self, header: RuleHeader, options: List[RuleOption], text: str):
+        self.header = header
+        self.options = options
+        self.text = text
+        self.contents: List[ContentMatch] = []
+        self.pcres: List[PcreMatch] = []
+
+    def values(self, name: str) -> List[Optional[str]]:
+        return [option.value for option in self.options if option.name == name]
+
+    def get(self, name: str) -> Optional[str]:
+        values = self.values(name)
+        return values[0] if values else None
+
+    def has_option(self, name: str) -> bool:
+        return any(option.name == name for option in self.options)
+
+    @property
+    def msg(self) -> Optional[str]:
+        value = self.get("msg")
+        return _unquote(value) if value is not None else None
+
+    @property
+    def sid(self) -> Optional[int]:
+        value = self.get("sid")
+        return int(value) if value is not None else None
+
+    @property
+    def rev(self) -> Optional[int]:
+        value = self.get("rev")
+        return int(value) if value is not None else None
+
+    def to_text(self) -> str:
+        """Canonical single-line form: single spaces, one space between options"""
+        options = ' '.join(option.to_text() + ';' for option in self.options)
+        return f"{self.header.to_text()} ({options})"
+
+
+def _unquote(value: str) -> str:
+    value = value.strip()
+    if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+def _split_header(header: str) -> List[str]:
+    """Whitespace split that keeps bracketed address/port lists together"""
+    tokens, current, depth = [], '', 0
+    for char in header:
+        if char == '[':
+            depth += 1
+        elif char == ']':
+            depth -= 1
+            if depth < 0:
+                raise RuleParseError("规则头中的方括号不匹配")
+        if char.isspace() and depth == 0:
+            if current:
+                tokens.append(current)
+                current = ''
+            continue
+        current += char
+    if depth != 0:
+        raise RuleParseError("规则头中的方括号不匹配")
+    if current:
+        tokens.append(current)
+    return tokens
+
+
+def _check_ports(token: str, side: str):
+    for atom in re.split(r'[\[\],]', token):
+        atom = atom.strip()
+        if not atom or atom == '!':
+            continue
+        if not PORT_ATOM.match(atom):
+            raise RuleParseError(f"{side}端口格式无效: {token}")
+        for number in re.findall(r'\d+', atom):
+            if int(number) > 65535:
+                raise RuleParseError(f"{side}端口超出范围: {token}")
+
+
+def _parse_header(header: str) -> RuleHeader:
+    tokens = _split_header(header)
+    if not tokens:
+        raise RuleParseError("规则为空")
+    if tokens[0] not in RULE_ACTIONS:
+        raise RuleParseError(f"未知的规则动作: {tokens[0]}")
+    if len(tokens) != 7:
+        raise RuleParseError("规则头应为: 动作 协议 源地址 源端口 方向 目的地址 目的端口")
+    action, protocol, src_addr, src_port, direction, dst_addr, dst_port = tokens
+    if not PROTOCOL_NAME.match(protocol):
+        raise RuleParseError(f"协议格式无效: {protocol}")
+    if direction not in RULE_DIRECTIONS:
+        raise RuleParseError(f"方向必须是 -> 或 <>: {direction}")
+    for address, side in ((src_addr, "源"), (dst_addr, "目的")):
+        if not ADDRESS_CHARS.match(address):
+            raise RuleParseError(f"{side}地址格式无效: {address}")
+    _check_ports(src_port, "源")
+    _check_ports(dst_port, "目的")
+    return RuleHeader(action, protocol, src_addr, src_port, direction, dst_addr, dst_port)
+
+
+def _split_options(body: str) -> List[RuleOption]:
+    """Split the option body at unescaped semicolons, like Suricata's own parser"""
+    options = []
+    i, length = 0, len(body)
+    while i < length:
+        while i < length and body[i].isspace():
+            i += 1
+        if i >= length:
+            break
+        start = i
+        while i < length and body[i] not in ':;':
+            i += 1
+        name = body[start:i].strip()
+        if i >= length:
+            raise RuleParseError(f"选项未以分号结束: {body[start:].strip()}")
+        if not OPTION_NAME.match(name):
+            raise RuleParseError(f"选项名无效: {name or body[start:i + 1]}")
+        value = None
+        if body[i] == ':':
+            i += 1
+            value_start = i
+            while i < length and body[i] != ';':
+                i += 2 if body[i] == '\\' else 1
+            if i >= length:
+                raise RuleParseError(f"选项 {name} 未以分号结束")
+            value = body[value_start:i].strip()
+            if not value:
+                raise RuleParseError(f"选项 {name} 缺少值")
+            quoted = value.lstrip('!').strip()
+            if quoted.startswith('"') and (len(quoted) < 2 or not quoted.endswith('"')):
+                raise RuleParseError(f"选项 {name} 的值不是完整的带引号字符串（缺少分号，或值中的 ; 未写成 \\; 或 |3b|）")
+        options.append(RuleOption(name.lower(), value))
+        i += 1
+    return options
+
+
+def decode_content(value: str) -> bytes:
+    """Decode a quoted content value: |hex| blocks and \\" \\; \\\\ \\: escapes"""
+    if len(value) < 2 or value[0] != '"' or value[-1] != '"':
+        raise RuleParseError(f"content 值必须用双引号包裹: {value}")
+    text = value[1:-1]
+    out = bytearray()
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char == '|':
+            end = text.find('|', i + 1)
+            if end == -1:
+                raise RuleParseError(f"content 中的十六进制块未闭合: {value}")
+            hex_part = text[i + 1:end].replace(' ', '')
+            if len(hex_part) % 2 or not re.fullmatch(r'[0-9A-Fa-f]*', hex_part):
+                raise RuleParseError(f"content 中的十六进制无效: |{text[i + 1:end]}|")
+            out.extend(bytes.fromhex(hex_part))
+            i = end + 1
+            continue
+        if char == '\\':
+            if i + 1 >= len(text) or text[i + 1] not in '";\\:':
+                raise RuleParseError(f"content 中的转义无效: {value}")
+            i += 1
+            char = text[i]
+        elif char == '"':
+            raise RuleParseError(f"content 中的双引号需要转义: {value}")
+        out.extend(char.encode('utf-8'))
+        i += 1
+    if not out:
+        raise RuleParseError("content 不能为空")
+    return bytes(out)
+
+
+def _parse_pcre(value: str, negated: bool, sticky: Optional[str]) -> PcreMatch:
+    if len(value) < 2 or value[0] != '"' or value[-1] != '"':
+        raise RuleParseError(f"pcre 值必须用双引号包裹: {value}")
+    text = value[1:-1]
+    end = text.rfind('/')
+    if not text.startswith('/') or end <= 0:
+        raise RuleParseError(f"pcre 必须写成 \"/表达式/修饰符\": {value}")
+    flags = text[end + 1:]
+    invalid = [flag for flag in flags if flag not in PCRE_FLAGS]
+    if invalid:
+        raise RuleParseError(f"pcre 修饰符无效: {''.join(invalid)}")
+    buffers = [PCRE_BUFFER_FLAGS[flag] for flag in flags if flag in PCRE_BUFFER_FLAGS]
+    return PcreMatch(text[1:end], flags, negated, buffers[0] if buffers else sticky, value)
+
+
+def _build_matches(rule: Rule):
+    """
+    Attach content/pcre matches.  A sticky buffer applies to the content/pcre
+    options after it; modifiers apply to the last content whatever its buffer,
+    as in Suricata's own DetectGetLastSMFromLists lookup.
+    """
+    sticky = None
+    current = None
+    for option in rule.options:
+        name, value = option.name, option.value
+        if name == 'content':
+            negated = value.startswith('!')
+            raw = value[1:].strip() if negated else value
+            current = ContentMatch(decode_content(raw), negated, sticky, value)
+            rule.contents.append(current)
+        elif name == 'pcre':
+            negated = value.startswith('!')
+            rule.pcres.append(_parse_pcre(value[1:].strip() if negated else value, negated, sticky))
+        elif name in BUFFER_MODIFIERS or name in CONTENT_MODIFIERS:
+            if current is None:
+                raise RuleParseError(f"修饰符 {name} 之前没有 content")
+            if name in BUFFER_MODIFIERS:
+                if value is not None:
+                    raise RuleParseError(f"修饰符 {name} 不接受参数")
+                current.buffer = BUFFER_MODIFIERS[name]
+            elif name in NUMERIC_CONTENT_MODIFIERS:
+                if value is None or not NUMBER_OR_VAR.match(value):
+                    raise RuleParseError(f"修饰符 {name} 需要数值: {value}")
+            current.modifiers[name] = value
+        elif value is None and name in LEGACY_STICKY_BUFFERS:
+            sticky = LEGACY_STICKY_BUFFERS[name]
+        elif value is None and name not in NON_BUFFER_KEYWORDS:
+            sticky = name
+
+
+def parse_rule(text: str) -> Rule:
+    """Parse one rule; raises RuleParseError describing the first problem"""
+    text = text.strip()
+    if not text:
+        raise RuleParseError("规则为空")
+    if text.startswith('#'):
+        raise RuleParseError("规则已被注释")
+    open_paren = text.find('(')
+    if open_paren == -1:
+        raise RuleParseError("规则缺少选项部分 (...)")
+    if not text.endswith(')'):
+        raise RuleParseError("规则必须以 ) 结尾")
+    header = _parse_header(text[:open_paren])
+    rule = Rule(header, _split_options(text[open_paren + 1:-1]), text)
+    for option in rule.options:
+        if option.name in INTEGER_OPTIONS and (option.value is None or not option.value.isdigit()):
+            raise RuleParseError(f"{option.name} 必须是整数: {option.value}")
+        if option.name == 'msg' and (option.value is None or len(option.value) < 2
+                                     or option.value[0] != '"' or option.value[-1] != '"'):
+            raise RuleParseError("msg 必须用双引号包裹")
+        if option.name == 'flow':
+            unknown = [item.strip() for item in (option.value or '').split(',')
+                       if item.strip() not in FLOW_KEYWORDS]
+            if unknown:
+                raise RuleParseError(f"flow 取值无效: {', '.join(unknown)}")
+    _build_matches(rule)
+    return rule
+
+
+def parse_rules(text: str) -> List[Rule]:
+    """Parse every rule line, skipping blank lines and comments"""
+    rules = []
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            rules.append(parse_rule(line))
+        except RuleParseError as e:
+            raise RuleParseError(f"第{number}行: {e}")
+    if not rules:
+        raise RuleParseError("没有找到规则")
+    return rules
+
+
+def rule_fingerprint(text: str) -> str:
+    """
+    Canonical form used to spot equivalent rules: whitespace normalized and the
+    options that do not affect matching (msg, sid, rev) dropped.  Text that does
+    not parse falls back to its whitespace-collapsed form.
+    """
+    try:
+        rules = parse_rules(text)
+    except RuleParseError:
+        return ' '.join(text.split())
+    lines = []
+    for rule in rules:
+        options = ' '.join(option.to_text() + ';' for option in rule.options
+                           if option.name not in NON_MATCHING_OPTIONS)
+        lines.append(f"{rule.header.to_text()} ({options})")
+    return '\n'.join(lines)
+
+
+def lint_rule(rule: Rule) -> Dict[str, List[str]]:
+    """Check a parsed rule against the project's rule template"""
+    errors, warnings = [], []
+    for name in TEMPLATE_REQUIRED_OPTIONS:
+        if not rule.has_option(name):
+            errors.append(f"缺少必需选项: {name}")
+    for name in TEMPLATE_FORBIDDEN_OPTIONS:
+        if rule.has_option(name):
+            errors.append(f"不允许使用选项: {name}")
+    for name in SINGLE_OPTIONS:
+        if len(rule.values(name)) > 1:
+            errors.append(f"选项重复: {name}")
+    if rule.msg is not None and not rule.msg.strip():
+        errors.append("msg 不能为空")
+    low, high = TEMPLATE_SID_RANGE
+    if rule.sid is not None and not low <= rule.sid <= high:
+        errors.append(f"sid {rule.sid} 不在 {low}-{high} 范围内")
+    if rule.rev is not None and rule.rev < 1:
+        errors.append("rev 必须大于等于 1")
+    if not rule.contents and not rule.pcres:
+        warnings.append("规则没有 content 或 pcre，可能匹配大量流量")
+    elif not any(not content.negated for content in rule.contents):
+        warnings.append("规则没有正向 content，引擎无法使用快速匹配")
+    return {"errors": errors, "warnings": warnings}
+
+
+def check_rules(text: str) -> Dict:
+    """
+    Parse and lint rule text in one call.  Returns a JSON-ready dict with
+    ``valid`` (no parse or template errors), ``errors``, ``warnings`` and
+    ``rule_count``.
+    """
+    result = {"valid": False, "errors": [], "warnings": [], "rule_count": 0}
+    try:
+        rules = parse_rules(text or '')
+    except RuleParseError as e:
+        result["errors"].append(str(e))
+        return result
+    multiple = len(rules) > 1
+    seen_sids = {}
+    for index, rule in enumerate(rules, 1):
+        prefix = f"规则{index}: " if multiple else ""
+        issues = lint_rule(rule)
+        result["errors"].extend(prefix + message for message in issues["errors"])
+        result["warnings"].extend(prefix + message for message in issues["warnings"])
+        if rule.sid is not None:
+            if rule.sid in seen_sids:
+                result["errors"].append(f"{prefix}sid {rule.sid} 与规则{seen_sids[rule.sid]}重复")
+            seen_sids.setdefault(rule.sid, index)
+    result["rule_count"] = len(rules)
+    result["valid"] = not result["errors"]
+    return result
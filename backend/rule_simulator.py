@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Rule Simulator - approximate in-process content/pcre matching of HTTP rules against captured requests
+
+import re
+import time
+from typing import Dict, List, Optional
+from urllib.parse import unquote_to_bytes
+
+from rule_parser import RuleParseError, parse_rules
+
+# Request header -> sticky buffer carrying its value
+HEADER_BUFFERS = {
+    "cookie": "http.cookie", "user-agent": "http.user_agent", "referer": "http.referer",
+    "content-type": "http.content_type", "content-length": "http.content_len",
+    "accept": "http.accept", "accept-encoding": "http.accept_enc",
+    "accept-language": "http.accept_lang", "connection": "http.connection",
+}
+# Options that only narrow what a rule matches; ignoring them can turn a
+# "no match" into a "match" but never the other way round
+NARROWING_OPTIONS = {
+    "msg", "sid", "rev", "gid", "priority", "flow", "content", "pcre", "nocase", "depth", "offset",
+    "distance", "within", "fast_pattern", "startswith", "endswith", "rawbytes", "urilen", "bsize",
+    "isdataat", "dsize", "threshold", "detection_filter", "flowbits", "noalert", "target",
+}
+PCRE_COMPILE_FLAGS = {"i": re.IGNORECASE, "s": re.DOTALL, "m": re.MULTILINE, "x": re.VERBOSE}
+
+
+def _normalize_uri(raw: bytes) -> bytes:
+    """Approximation of the engine's http.uri: percent-decoded path with dot segments resolved"""
+    decoded = unquote_to_bytes(raw)
+    path, sep, query = decoded.partition(b'?')
+    segments = []
+    for segment in path.split(b'/'):
+        if segment == b'..':
+            if len(segments) > 1:
+                segments.pop()
+        elif segment != b'.':
+            segments.append(segment)
+    return b'/'.join(segments) + sep + query
+
+
+def request_buffers(request: Dict) -> Dict[Optional[str], bytes]:
+    """Inspection buffers of one extracted request, keyed like rule_parser buffer names"""
+    method = request["method"].encode('latin-1')
+    uri = request["uri"].encode('latin-1')
+    protocol = request["protocol"].encode('latin-1')
+    body = request["body"].encode('latin-1')
+    request_line = b' '.join(part for part in (method, uri, protocol) if part)
+    header_lines = [f"{name}: {value}".encode('latin-1') for name, value in request["headers"]]
+    buffers = {
+        # Stream payload and raw headers are the captured bytes, not rebuilt from parsed fields
+        None: request["raw"].encode('latin-1'),
+        "http.method": method,
+        "http.uri.raw": uri,
+        "http.uri": _normalize_uri(uri),
+        "http.protocol": protocol,
+        "http.request_line": request_line,
+        "http.header.raw": request["raw_headers"].encode('latin-1'),
+        "http.header": b''.join(line + b'\r\n' for line in header_lines) + b'\r\n',
+        "http.header_names": b'\r\n' + b''.join(name.encode('latin-1') + b'\r\n'
+                                                 for name, _ in request["headers"]) + b'\r\n',
+        "http.request_body": body,
+        "file.data": body,
+    }
+    for name, value in request["headers"]:
+        lowered = name.lower()
+        if lowered == "host":
+            buffers["http.host.raw"] = value.encode('latin-1')
+            host = value.strip().lower()
+            buffers["http.host"] = (host.rsplit(':', 1)[0] if host.count(':') == 1 else host).encode('latin-1')
+        elif lowered in HEADER_BUFFERS:
+            buffers[HEADER_BUFFERS[lowered]] = value.encode('latin-1')
+    return buffers
+
+
+SUPPORTED_BUFFERS = {
+    None, "http.method", "http.uri.raw", "http.uri", "http.protocol", "http.request_line",
+    "http.header.raw", "http.header", "http.header_names", "http.request_body", "file.data",
+    "http.host", "http.host.raw",
+} | set(HEADER_BUFFERS.values())
+# Buffers that only exist on the request side.  The others (stream payload,
+# headers, protocol, cookies, file data) also hold response data, which the
+# samples do not have, unless flow limits the rule to the client side.
+REQUEST_ONLY_BUFFERS = {
+    "http.method", "http.uri", "http.uri.raw", "http.request_line", "http.request_body",
+    "http.host", "http.host.raw", "http.user_agent", "http.referer",
+    "http.accept", "http.accept_enc", "http.accept_lang",
+}
+
+
+class _Atom:
+    """One compiled check (a content chain or a pcre) against one buffer"""
+
+    def __init__(self, buffer: Optional[str], regex, negated: bool, anchored: bool, label: str):
+        self.buffer = buffer
+        self.regex = regex
+        self.negated = negated
+        self.anchored = anchored
+        self.label = label
+
+    def holds(self, buffers: Dict[Optional[str], bytes]) -> bool:
+        data = buffers.get(self.buffer)
+        if data is None:
+            # A missing buffer never matches, not even a negated pattern
+            return False
+        found = (self.regex.match(data) if self.anchored else self.regex.search(data)) is not None
+        return found != self.negated
+
+
+def _int_modifier(content, name: str) -> Optional[int]:
+    value = content.modifiers.get(name)
+    if value is None:
+        return None
+    return int(value) if value.lstrip('-').isdigit() else False
+
+
+def _content_regex(content, first: bool):
+    """Regex fragment for one content, or None when its modifiers cannot be expressed"""
+    pattern = re.escape(content.pattern)
+    if content.nocase:
+        pattern = b'(?i:' + pattern + b')'
+    length = len(content.pattern)
+    if first:
+        offset, depth = _int_modifier(content, 'offset'), _int_modifier(content, 'depth')
+        if offset is False or depth is False:
+            return None
+        offset = offset or 0
+        if 'startswith' in content.modifiers:
+            prefix = b'\\A'
+        elif depth is not None:
+            if depth < length:
+                return None
+            prefix = b'\\A[\\s\\S]{%d,%d}' % (offset, offset + depth - length)
+        else:
+            prefix = b'\\A[\\s\\S]{%d,}?' % offset if offset else b''
+    else:
+        distance, within = _int_modifier(content, 'distance'), _int_modifier(content, 'within')
+        if distance is False or within is False or (distance or 0) < 0:
+            return None
+        distance = distance or 0
+        if within is not None:
+            # As in Suricata, the within window starts where distance puts it
+            if within < length:
+                return None
+            prefix = b'[\\s\\S]{%d,%d}' % (distance, distance + within - length)
+        else:
+            prefix = b'[\\s\\S]{%d,}?' % distance
+    suffix = b'\\Z' if 'endswith' in content.modifiers else b''
+    return prefix + pattern + suffix
+
+
+POSITION_MODIFIERS = {"offset", "depth", "distance", "within", "startswith", "endswith"}
+
+
+def _is_relative(content) -> bool:
+    return 'distance' in content.modifiers or 'within' in content.modifiers
+
+
+def _compile_contents(contents) -> List[_Atom]:
+    """
+    Positive contents chained by distance/within become one regex per chain, so
+    the regex engine does the backtracking the detection engine does.  Chains
+    that cannot be expressed fall back to independent presence checks.
+    """
+    atoms = []
+    chain = []
+
+    def flush():
+        if not chain:
+            return
+        parts = [_content_regex(content, index == 0) for index, content in enumerate(chain)]
+        label = ' '.join(f"content:{content.value};" for content in chain)
+        if all(part is not None for part in parts):
+            atoms.append(_Atom(chain[0].buffer, re.compile(b''.join(parts)), False, False, label))
+        else:
+            for content in chain:
+                literal = re.escape(content.pattern)
+                flags = re.IGNORECASE if content.nocase else 0
+                atoms.append(_Atom(content.buffer, re.compile(literal, flags), False, False,
+                                   f"content:{content.value};"))
+        chain.clear()
+
+    for content in contents:
+        if content.negated:
+            flush()
+            if POSITION_MODIFIERS.intersection(content.modifiers):
+                # "Not within this window" is weaker than "not anywhere"; leave it to the engine
+                continue
+            literal = re.escape(content.pattern)
+            flags = re.IGNORECASE if content.nocase else 0
+            atoms.append(_Atom(content.buffer, re.compile(literal, flags), True, False,
+                               f"content:{content.value};"))
+            continue
+        if chain and _is_relative(content) and content.buffer == chain[-1].buffer:
+            chain.append(content)
+            continue
+        flush()
+        chain.append(content)
+    flush()
+    return atoms
+
+
+class SimulatedRule:
+    """A parsed rule compiled to regex checks over request buffers"""
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.unsupported: List[str] = []
+        self.atoms: List[_Atom] = []
+        # tcp rules also see non-HTTP streams and responses, which are not sampled
+        if rule.header.protocol.lower() not in ("http", "http1"):
+            self.unsupported.append(f"协议 {rule.header.protocol}")
+        flow = (rule.get("flow") or "").replace(' ', '').split(',')
+        if "to_client" in flow or "from_server" in flow:
+            self.unsupported.append("flow:to_client")
+        to_server = "to_server" in flow or "from_client" in flow
+        for option in rule.options:
+            if option.name not in NARROWING_OPTIONS and not (option.value is None and '.' in option.name) \
+                    and option.name not in ("file_data", "pkt_data") and not option.name.startswith("http_"):
+                self.unsupported.append(option.name)
+        for match in list(rule.contents) + list(rule.pcres):
+            if match.buffer not in SUPPORTED_BUFFERS:
+                self.unsupported.append(f"缓冲区 {match.buffer}")
+            elif not to_server and match.buffer not in REQUEST_ONLY_BUFFERS:
+                self.unsupported.append(f"缓冲区 {match.buffer or 'pkt_data'} 未限定 flow:to_server")
+        self.atoms.extend(_compile_contents(rule.contents))
+        for pcre in rule.pcres:
+            flags = 0
+            for flag in pcre.flags:
+                flags |= PCRE_COMPILE_FLAGS.get(flag, 0)
+            if pcre.negated and pcre.relative:
+                continue
+            try:
+                regex = re.compile(pcre.pattern.encode('utf-8'), flags)
+            except re.error:
+                # PCRE-only syntax: leave this check to the engine
+                continue
+            self.atoms.append(_Atom(pcre.buffer, regex, pcre.negated, 'A' in pcre.flags, f"pcre:{pcre.value};"))
+
+    @property
+    def supported(self) -> bool:
+        return not self.unsupported
+
+    def evaluate(self, buffers: Dict[Optional[str], bytes]) -> List[str]:
+        """Labels of the checks that fail for one request (empty list: the request matches)"""
+        return [atom.label for atom in self.atoms if not atom.holds(buffers)]
+
+
+def simulate_rule(rule_text: str, requests: List[Dict], truncated: bool = False) -> Dict:
+    """
+    Evaluate rule_text against extracted HTTP requests.
+
+    ``verdict`` is ``match`` when some request satisfies every content/pcre
+    check, ``no_match`` when none does, the rule is an http rule that only
+    inspects the request side and the samples are complete (so the engine
+    cannot alert on this capture either), and ``unknown`` otherwise.
+    ``score`` is the best fraction of checks any single request satisfies,
+    useful for ranking candidate rules.
+    """
+    start = time.perf_counter()
+    result = {
+        "verdict": "unknown",
+        "sample_count": len(requests),
+        "matched_samples": 0,
+        "score": 0.0,
+        "failed_checks": [],
+        "unsupported": [],
+        "elapsed_ms": 0.0
+    }
+    try:
+        rules = [SimulatedRule(rule) for rule in parse_rules(rule_text)]
+    except RuleParseError as e:
+        result["unsupported"].append(str(e))
+        return result
+
+    best_failed = None
+    for request in requests:
+        buffers = request_buffers(request)
+        request_matched = False
+        for rule in rules:
+            failed = rule.evaluate(buffers)
+            score = round(1 - len(failed) / (len(rule.atoms) or 1), 3)
+            if best_failed is None or score > result["score"]:
+                result["score"] = score
+                best_failed = failed
+            request_matched = request_matched or not failed
+        if request_matched:
+            result["matched_samples"] += 1
+
+    result["unsupported"] = sorted({item for rule in rules for item in rule.unsupported})
+    result["failed_checks"] = best_failed or []
+    if result["matched_samples"]:
+        result["verdict"] = "match"
+    elif requests and not truncated and not result["unsupported"]:
+        result["verdict"] = "no_match"
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return result
@@ -90,7 +90,9 @@ def main():
     
     # Import and run the Flask app
     try:
-        from app_v2 import app  # Updated to use app_v2.py
+        from app_v2 import create_app, init_worker  # Updated to use app_v2.py
+        app = create_app()
+        init_worker()
         
         print("\n启动 Flask 应用...")
         print("应用将在 http://0.0.0.0:5000 上运行")
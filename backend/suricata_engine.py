@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Warm Suricata Engine Pool - long-lived engines driven over the unix socket
+
+import os
+import json
+import time
+import uuid
+import socket
+import tempfile
+import threading
+import subprocess
+import queue
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Callable
+
+
+class SuricataSocketError(Exception):
+    """Raised when the Suricata unix socket returns an error or goes away"""
+    pass
+
+
+class SuricataSocketClient:
+    """Minimal client for Suricata's unix-socket JSON protocol (suricatasc)"""
+
+    PROTOCOL_VERSION = "0.2"
+
+    def __init__(self, socket_path: str, timeout: float = 30):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._sock = None
+
+    def connect(self):
+        """Connect and perform the version handshake"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError as e:
+            sock.close()
+            raise SuricataSocketError(f"无法连接Suricata socket {self.socket_path}: {e}")
+        self._sock = sock
+        reply = self._exchange({"version": self.PROTOCOL_VERSION})
+        if reply.get("return") != "OK":
+            self.close()
+            raise SuricataSocketError(f"Suricata socket握手失败: {reply}")
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def command(self, name: str, arguments: Optional[Dict] = None):
+        """Send a command and return its message, raising on NOK"""
+        message = {"command": name}
+        if arguments:
+            message["arguments"] = arguments
+        reply = self._exchange(message)
+        if reply.get("return") != "OK":
+            raise SuricataSocketError(f"命令 {name} 执行失败: {reply.get('message')}")
+        return reply.get("message")
+
+    def _exchange(self, message: Dict) -> Dict:
+        if self._sock is None:
+            raise SuricataSocketError("Suricata socket未连接")
+        try:
+            self._sock.sendall((json.dumps(message) + "\n").encode('utf-8'))
+            data = b""
+            while True:
+                chunk = self._sock.recv(4096)
+                if not chunk:
+                    raise SuricataSocketError("Suricata socket连接已关闭")
+                data += chunk
+                # Replies are not length-prefixed; a reply is complete once it parses
+                try:
+                    return json.loads(data.decode('utf-8'))
+                except ValueError:
+                    continue
+        except OSError as e:
+            raise SuricataSocketError(f"Suricata socket通信失败: {e}")
+
+
+class WarmSuricataEngine:
+    """
+    A single Suricata process running in unix-socket mode.
+
+    The engine loads one rule file (vul_*.rules) at start-up; validating a new
+    rule rewrites that file and issues ``reload-rules``, then PCAPs are queued
+    with ``pcap-file`` so config parsing and engine start-up are paid once.
+    When ``suricata_cmd`` is None the engine attaches to an already running
+    Suricata listening on ``socket_path`` instead of spawning one.
+    """
+
+    def __init__(self,
+                 suricata_cmd: Optional[List[str]],
+                 rule_file: str,
+                 socket_path: str,
+                 suricata_config: Optional[str] = None,
+                 startup_timeout: float = 60,
+                 pcap_timeout: float = 300,
+                 poll_interval: float = 0.05):
+        self.suricata_cmd = suricata_cmd
+        self.rule_file = rule_file.replace('\\', '/')
+        self.socket_path = socket_path
+        self.suricata_config = suricata_config
+        self.startup_timeout = startup_timeout
+        self.pcap_timeout = pcap_timeout
+        self.poll_interval = poll_interval
+        self.process = None
+        self.client = None
+        self.loaded_rule = None
+        self.pcaps_processed = 0
+
+    def start(self):
+        """Start (or attach to) the engine and connect to its socket"""
+        if self.suricata_cmd:
+            if not os.path.exists(self.rule_file):
+                with open(self.rule_file, 'w'):
+                    pass
+            cmd = self.suricata_cmd + [
+                f'--unix-socket={self.socket_path}',
+                '-S', self.rule_file,
+                '-k', 'none',
+                '-l', os.path.dirname(self.socket_path) or '.'
+            ]
+            if self.suricata_config and os.path.exists(self.suricata_config):
+                cmd.extend(['-c', self.suricata_config])
+            print(f"启动常驻Suricata引擎: {' '.join(cmd)}")
+            self.process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE
+            )
+
+        deadline = time.monotonic() + self.startup_timeout
+        last_error = None
+        while time.monotonic() < deadline:
+            if self.process is not None and self.process.poll() is not None:
+                stderr = self.process.stderr.read().decode('utf-8', errors='ignore') if self.process.stderr else ''
+                raise SuricataSocketError(f"Suricata引擎启动失败 (code {self.process.returncode}): {stderr}")
+            if os.path.exists(self.socket_path):
+                client = SuricataSocketClient(self.socket_path)
+                try:
+                    client.connect()
+                    self.client = client
+                    return
+                except SuricataSocketError as e:
+                    last_error = e
+            time.sleep(self.poll_interval)
+
+        self.stop()
+        raise SuricataSocketError(f"等待Suricata socket超时: {self.socket_path} ({last_error})")
+
+    def is_alive(self) -> bool:
+        if self.client is None:
+            return False
+        if self.process is not None and self.process.poll() is not None:
+            return False
+        return True
+
+    def load_rule(self, rule_content: str):
+        """Write the rule into the engine's rule file and reload rules"""
+        if rule_content == self.loaded_rule:
+            return
+        with open(self.rule_file, 'w') as f:
+            f.write(rule_content)
+        self.client.command("reload-rules")
+        self.loaded_rule = rule_content
+
+    def run_pcap(self, pcap_file: str, output_dir: str) -> Dict:
+        """Feed one PCAP to the engine and block until it has been processed"""
+        os.makedirs(output_dir, exist_ok=True)
+        started = time.monotonic()
+        last_before = self.client.command("pcap-last-processed")
+        self.client.command("pcap-file", {
+            "filename": os.path.abspath(pcap_file).replace('\\', '/'),
+            "output-dir": os.path.abspath(output_dir).replace('\\', '/')
+        })
+
+        deadline = started + self.pcap_timeout
+        while time.monotonic() < deadline:
+            queued = self.client.command("pcap-file-number")
+            current = self.client.command("pcap-current")
+            last = self.client.command("pcap-last-processed")
+            if not queued and current in (None, "None", "") and last != last_before:
+                self.pcaps_processed += 1
+                return {
+                    "pcap": pcap_file,
+                    "output_dir": output_dir,
+                    "elapsed": round(time.monotonic() - started, 3)
+                }
+            time.sleep(self.poll_interval)
+
+        raise SuricataSocketError(f"PCAP处理超时: {pcap_file}")
+
+    def stop(self):
+        """Shut the engine down and release its socket and rule file"""
+        if self.client is not None:
+            if self.process is not None:
+                try:
+                    self.client.command("shutdown")
+                except SuricataSocketError:
+                    pass
+            self.client.close()
+            self.client = None
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+            self.process = None
+            for path in (self.rule_file, self.socket_path):
+                try:
+                    if os.path.exists(path):
+                        os.remove(path)
+                except OSError:
+                    pass
+
+
+class SuricataEnginePool:
+    """Bounded pool of warm engines; engines are created lazily up to ``size``"""
+
+    def __init__(self, size: int, engine_factory: Callable[[], WarmSuricataEngine],
+                 acquire_timeout: float = 600):
+        if size < 1:
+            raise ValueError("引擎池大小必须大于0")
+        self.size = size
+        self.engine_factory = engine_factory
+        self.acquire_timeout = acquire_timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        # Updated under _lock: the pool is shared by concurrent validations
+        self.stats = {"engines_started": 0, "engines_discarded": 0, "pcaps_processed": 0}
+
+    def _new_engine(self) -> WarmSuricataEngine:
+        engine = self.engine_factory()
+        try:
+            engine.start()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        with self._lock:
+            self.stats["engines_started"] += 1
+        return engine
+
+    def _checkout(self) -> WarmSuricataEngine:
+        if self._closed:
+            raise SuricataSocketError("引擎池已关闭")
+        try:
+            engine = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            if can_create:
+                return self._new_engine()
+            try:
+                engine = self._idle.get(timeout=self.acquire_timeout)
+            except queue.Empty:
+                raise SuricataSocketError("等待空闲Suricata引擎超时")
+
+        if not engine.is_alive():
+            self._discard(engine)
+            with self._lock:
+                self._created += 1
+            return self._new_engine()
+        return engine
+
+    def _discard(self, engine: WarmSuricataEngine):
+        try:
+            engine.stop()
+        except Exception as e:
+            print(f"Warning: 停止Suricata引擎失败: {e}")
+        with self._lock:
+            self._created -= 1
+            self.stats["engines_discarded"] += 1
+
+    @contextmanager
+    def acquire(self):
+        """Borrow an engine exclusively; broken engines are discarded on error"""
+        engine = self._checkout()
+        try:
+            yield engine
+        except Exception:
+            self._discard(engine)
+            raise
+        else:
+            if self._closed:
+                self._discard(engine)
+            else:
+                self._idle.put(engine)
+
+    def validate(self, rule_content: str, pcap_files: List[str], output_root: str) -> List[Dict]:
+        """Run every PCAP through one warm engine, each into its own output dir"""
+        runs = []
+        with self.acquire() as engine:
+            engine.load_rule(rule_content)
+            for index, pcap in enumerate(pcap_files):
+                output_dir = os.path.join(output_root, f"pcap_{index}")
+                runs.append(engine.run_pcap(pcap, output_dir))
+                with self._lock:
+                    self.stats["pcaps_processed"] += 1
+        return runs
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                engine = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(engine)
+
+
+def create_engine_pool(suricata_cmd: List[str],
+                       rules_dir: str,
+                       suricata_config: Optional[str] = None,
+                       size: int = 2,
+                       socket_dir: Optional[str] = None) -> SuricataEnginePool:
+    """Create a pool whose engines each own a vul_*.rules file and a socket"""
+    socket_dir = socket_dir or tempfile.gettempdir()
+
+    def factory():
+        engine_id = uuid.uuid4().hex[:8]
+        return WarmSuricataEngine(
+            suricata_cmd=suricata_cmd,
+            rule_file=os.path.join(rules_dir, f"vul_{engine_id}.rules"),
+            socket_path=os.path.join(socket_dir, f"suricata-{engine_id}.socket"),
+            suricata_config=suricata_config
+        )
+
+    return SuricataEnginePool(size, factory)
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_engine_pool(suricata_cmd: List[str], rules_dir: str,
+                            suricata_config: Optional[str] = None) -> Optional[SuricataEnginePool]:
+    """
+    Return the process-wide pool configured by SURICATA_ENGINE_POOL_SIZE,
+    or None when warm engines are disabled (the default).
+    """
+    global _default_pool
+    size = int(os.getenv('SURICATA_ENGINE_POOL_SIZE', '0'))
+    if size <= 0:
+        return None
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = create_engine_pool(
+                suricata_cmd,
+                rules_dir,
+                suricata_config,
+                size=size,
+                socket_dir=os.getenv('SURICATA_SOCKET_DIR') or None
+            )
+        return _default_pool
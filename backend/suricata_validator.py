@@ -14,15 +14,79 @@ import pwd
 import grp
 import sys
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, List
 
+from alert_parser import AlertCollector
+from suricata_engine import SuricataSocketError, get_default_engine_pool
+from pcap_indexer import rule_may_match
+from pcap_prefilter import prefilter_pcap
+from rule_parser import RuleParseError, parse_rules
+
+
+SID_PATTERN = re.compile(r'\bsid\s*:\s*(\d+)\s*;')
+# Where Suricata is commonly installed when it is not on PATH
+SURICATA_LOCATIONS = ['/usr/bin/suricata', '/usr/local/bin/suricata', '/sbin/suricata']
+# Prefix of the per-run scratch log directories (see _create_run_log_dir)
+SCRATCH_PREFIX = 'suricata_run_'
+
+
+def find_suricata_command(is_windows: bool = None):
+    """Locate the suricata binary; None when it cannot be found on Windows"""
+    if is_windows is None:
+        is_windows = platform.system().lower() == 'windows'
+    if is_windows:
+        # Try different possible locations for suricata on Windows
+        suricata_cmd = shutil.which('suricata') or shutil.which('suricata.exe')
+        return [suricata_cmd] if suricata_cmd else None
+    # In Kali Linux, suricata might be in different locations
+    suricata_cmd = shutil.which('suricata')
+    if suricata_cmd:
+        return [suricata_cmd]
+    for cmd_path in SURICATA_LOCATIONS:
+        if os.path.exists(cmd_path):
+            return [cmd_path]
+    # If not found anywhere, return default
+    return ['suricata']
+
+
+def cleanup_stale_scratch(max_age: float) -> int:
+    """
+    Remove run scratch directories older than ``max_age`` seconds.  They are
+    normally removed when the run ends; leftovers come from workers that were
+    killed mid-validation.  Returns the number of directories removed.
+    """
+    scratch_root = os.getenv('SURICATA_SCRATCH_DIR') or tempfile.gettempdir()
+    try:
+        names = os.listdir(scratch_root)
+    except OSError:
+        return 0
+    removed = 0
+    cutoff = time.time() - max_age
+    for name in names:
+        path = os.path.join(scratch_root, name)
+        try:
+            if not name.startswith(SCRATCH_PREFIX) or not os.path.isdir(path) or os.path.getmtime(path) > cutoff:
+                continue
+        except OSError:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed += 1
+    return removed
+
 
 class SuricataValidator:
     def __init__(self, 
                  rules_dir=None,
                  suricata_config=None,
-                 log_dir=None):
+                 log_dir=None,
+                 engine_pool=None,
+                 result_cache=None,
+                 pcap_index=None,
+                 prefilter=None,
+                 suricata_command=None):
         # Read configuration from environment variables if available, fallback to defaults
         env_rules_dir = os.getenv('SURICATA_RULES_DIR', rules_dir or '/var/lib/suricata/rules')
         env_suricata_config = os.getenv('SURICATA_CONFIG_PATH', suricata_config or '/etc/suricata/suricata.yaml')
@@ -34,41 +98,77 @@ class SuricataValidator:
         self.log_dir = env_log_dir.replace('\\', '/')
         self.backup_suffix = f".bak.{datetime.now().strftime('%Y%m%d%H%M%S')}"
         self.is_windows = platform.system().lower() == 'windows'
+        # Optional SuricataEnginePool of warm unix-socket engines; when unset the
+        # process-wide pool from SURICATA_ENGINE_POOL_SIZE is used if enabled
+        self.engine_pool = engine_pool
+        # Optional ValidationCache; identical (rule, PCAP, engine) runs are served from it
+        self.result_cache = result_cache
+        # Optional PCAP catalog (PCAPManagerDB); captures whose protocol summary shows
+        # the rule cannot fire are skipped without launching the engine
+        self.pcap_index = pcap_index
+        # Carve the flows a rule could match into scratch PCAPs before running the
+        # engine (env SURICATA_PCAP_PREFILTER when not given explicitly)
+        if prefilter is None:
+            prefilter = os.getenv('SURICATA_PCAP_PREFILTER', 'false').lower() == 'true'
+        self.prefilter = prefilter
+        # Command found once by the validator registry; looked up per run when unset
+        self.suricata_command = suricata_command
     
     def _get_suricata_command(self):
         """Get appropriate suricata command based on platform"""
-        if self.is_windows:
-            # Try different possible locations for suricata on Windows
-            suricata_cmd = shutil.which('suricata') or shutil.which('suricata.exe')
-            if suricata_cmd:
-                return [suricata_cmd]
-            else:
-                # Suricata not found on Windows
-                return None
-        else:
-            # In Kali Linux, suricata might be in different locations
-            suricata_cmd = shutil.which('suricata')
-            if suricata_cmd:
-                return [suricata_cmd]
-            else:
-                # Try common locations in Kali Linux
-                for cmd_path in ['/usr/bin/suricata', '/usr/local/bin/suricata', '/sbin/suricata']:
-                    if os.path.exists(cmd_path):
-                        return [cmd_path]
-                # If not found anywhere, return default
-                return ['suricata']
+        if self.suricata_command is not None:
+            return list(self.suricata_command)
+        return find_suricata_command(self.is_windows)
     
-    def validate_rule(self, rule_content: str, pcap_path: str) -> Dict:
+    def validate_rule(self, rule_content: str, pcap_path: str, workers: int = None,
+                      max_alerts: int = None, use_cache: bool = True) -> Dict:
         """
         Validate Suricata rule against PCAP file(s)
         
         Args:
             rule_content: The Suricata rule to validate
             pcap_path: Path to PCAP file or directory
+            workers: Number of PCAPs to run concurrently (default SURICATA_VALIDATION_WORKERS or 1)
+            max_alerts: Stop reading alerts once this many have been counted (None = no cap)
+            use_cache: Look up / store the result in result_cache when one is configured
         
         Returns:
             Dict with validation results
         """
+        cache_key = None
+        if self.result_cache is not None and use_cache and rule_content and rule_content.strip():
+            try:
+                pcap_files = self._get_pcap_files(pcap_path)
+                suricata_cmd = self._get_suricata_command()
+                if pcap_files and suricata_cmd:
+                    fingerprint = self.result_cache.engine_fingerprint(suricata_cmd, self.suricata_config)
+                    cache_key = self.result_cache.make_key(
+                        rule_content, pcap_files, fingerprint,
+                        {"max_alerts": max_alerts, "prefilter": bool(self.prefilter)})
+                    cached = self.result_cache.get(cache_key)
+                    if cached is not None:
+                        cached["cached"] = True
+                        return cached
+            except Exception as e:
+                print(f"Warning: 验证缓存不可用: {e}")
+                cache_key = None
+        
+        result = self._validate_rule_uncached(rule_content, pcap_path, workers, max_alerts)
+        result["cached"] = False
+        
+        # Only complete, error-free runs are deterministic enough to cache
+        if cache_key and result["success"] and not result["error"] and \
+                result["engine_status"] in ("validation_success", "no_alerts_detected"):
+            try:
+                self.result_cache.put(cache_key, result)
+            except Exception as e:
+                print(f"Warning: 写入验证缓存失败: {e}")
+        
+        return result
+    
+    def _validate_rule_uncached(self, rule_content: str, pcap_path: str,
+                                workers: int = None, max_alerts: int = None) -> Dict:
+        """Run the engine for validate_rule, bypassing the result cache"""
         result = {
             "success": False,
             "matched": False,
@@ -102,44 +202,9 @@ class SuricataValidator:
                 result["engine_status"] = "invalid_pcap_path"
                 return result
             
-            # Write new rule
-            try:
-                with open(rule_file, 'w') as f:
-                    f.write(rule_content)
-                print(f"规则文件已创建: {rule_file}")
-                print(f"规则内容长度: {len(rule_content)}")
-            except Exception as e:
-                result["error"] = f"创建规则文件失败: {str(e)}"
-                result["engine_status"] = "rule_write_failed"
-                return result
-            
-            # Verify that the rule file exists and has content
-            if not os.path.exists(rule_file):
-                result["error"] = f"规则文件不存在: {rule_file}"
-                result["engine_status"] = "rule_file_missing"
-                return result
-            
-            if os.path.getsize(rule_file) == 0:
-                result["error"] = f"规则文件为空: {rule_file}"
-                result["engine_status"] = "rule_file_empty"
-                return result
-            
-            # Since we're not using -l flag, Suricata will likely create logs in the current directory
-            # Prepare paths for where logs might be created
-            current_dir_fast_log = os.path.join(os.getcwd(), "fast.log")
-            current_dir_eve_log = os.path.join(os.getcwd(), "eve.json")
-            
-            # Clear logs in current directory where suricata likely writes them
-            try:
-                with open(current_dir_fast_log, 'w') as f:
-                    pass  # Truncate fast.log
-            except IOError:
-                pass  # May not be able to write, that's ok
-            try:
-                with open(current_dir_eve_log, 'w') as f:
-                    pass  # Truncate eve.json
-            except IOError:
-                pass  # May not be able to write, that's ok
+            # Give this run its own scratch log directory so concurrent validations
+            # never truncate or read each other's fast.log / eve.json
+            run_log_dir = self._create_run_log_dir()
             
             # Check if suricata is available
             suricata_cmd = self._get_suricata_command()
@@ -163,22 +228,17 @@ class SuricataValidator:
             # Let suricata use its default configuration
             actual_config = self.suricata_config
             
-            # Since we're not using -l flag, skip log directory check
-            # Suricata will use its default log location
-            pass
-            
             # Run Suricata validation
             result["engine_status"] = "executing"
             result["execution_details"] = {
                 "suricata_available": True,
                 "config_file": actual_config,
                 "using_default_config": actual_config in ['/etc/suricata/suricata.yaml', '/usr/local/etc/suricata/suricata.yaml', '/usr/etc/suricata/suricata.yaml'],
-                "log_dir": self.log_dir,
+                "log_dir": run_log_dir,
                 "pcap_path": pcap_path,
-                "rule_file": rule_file,
                 "command_using_c_flag": False,
                 "command_using_s_flag": True,
-                "command_using_l_flag": False
+                "command_using_l_flag": True
             }
             
             # Get PCAP files to process
@@ -189,116 +249,55 @@ class SuricataValidator:
                 result["engine_status"] = "no_pcap_files"
                 return result
             
-            # Process each PCAP file
-            for pcap in pcap_files:
-                result["execution_details"]["current_pcap"] = pcap
-                # Convert to absolute path and normalize path separators for cross-platform compatibility
-                abs_pcap_path = os.path.abspath(pcap).replace('\\', '/')
-                
-                # Execute suricata with rule file and pcap
-                # For security, we'll call a separate script with elevated privileges if needed
-                cmd = []
-
-                # Check if we're running as root to determine execution method
-                is_root = (not self.is_windows) and (os.geteuid() == 0)
-                if is_root:
-                    # We're already running with elevated privileges
-                    cmd = suricata_cmd + [
-                        '-S', rule_file,
-                        '-k', 'none',
-                        '-r', abs_pcap_path
-                    ]
-                    
-                    print(f"正在测试: {abs_pcap_path}")
-                    print(f"执行命令: {' '.join(cmd)}")
-                    proc = subprocess.run(
-                        cmd,
-                        capture_output=True,
-                        text=True,
-                        timeout=300
-                    )
-                else:
-                    # We need to call our helper script with sudo
-                    # This is safer than running the entire web application with sudo
-                    helper_script = os.path.join(os.path.dirname(__file__), 'run_suricata_as_root.py')
-                    
-                    if os.path.exists(helper_script):
-                        cmd = ['sudo', sys.executable, helper_script, 
-                               '--rules-file', rule_file,
-                               '--pcap-file', abs_pcap_path]
-                        
-                        # Add config file if it exists
-                        if os.path.exists(self.suricata_config):
-                            cmd.extend(['--config-file', self.suricata_config])
-                        
-                        print(f"正在测试: {abs_pcap_path}")
-                        print(f"执行命令: {' '.join(cmd)}")
-                        proc = subprocess.run(
-                            cmd,
-                            capture_output=True,
-                            text=True,
-                            timeout=300
-                        )
-                        
-                        # Parse the JSON response from our helper script
-                        try:
-                            helper_result = json.loads(proc.stdout)
-                            # Simulate the original proc object behavior
-                            class MockProc:
-                                def __init__(self, result):
-                                    self.returncode = result['returncode']
-                                    self.stdout = result['stdout']
-                                    self.stderr = result['stderr']
-                            proc = MockProc(helper_result)
-                        except json.JSONDecodeError:
-                            # If JSON parsing fails, treat as error
-                            proc = subprocess.CompletedProcess([], 1, "", "Failed to parse helper script output")
-                    else:
-                        # Fallback: try to run directly (may fail due to permissions)
-                        cmd = suricata_cmd + [
-                            '-S', rule_file,
-                            '-k', 'none',
-                            '-r', abs_pcap_path
-                        ]
-                        
-                        print(f"正在测试: {abs_pcap_path}")
-                        print(f"执行命令: {' '.join(cmd)}")
-                        proc = subprocess.run(
-                            cmd,
-                            capture_output=True,
-                            text=True,
-                            timeout=300
-                        )
-                
-                # Store the command for debugging
-                result["execution_details"]["executed_command"] = ' '.join([f'"{arg}"' if ' ' in arg else arg for arg in cmd])
-                result["execution_details"]["running_with_sudo_helper"] = (not self.is_windows) and (os.geteuid() != 0)
-                
-                if proc.returncode != 0:
-                    result["error"] = f"Suricata执行失败: {proc.stderr}"
-                    result["engine_status"] = "execution_failed"
-                    result["execution_details"]["return_code"] = proc.returncode
-                    result["execution_details"]["stderr"] = proc.stderr
-                    result["execution_details"]["stdout"] = proc.stdout
-                    print(f"Suricata执行失败: {proc.stderr}")
-                    return result
+            pcap_files, skipped = self._filter_irrelevant_pcaps(rule_content, pcap_files)
+            if self.prefilter:
+                pcap_files, emptied = self._prefilter_pcaps(rule_content, pcap_files, run_log_dir, result)
+                skipped += emptied
+            if skipped:
+                result["skipped_pcaps"] = skipped
+            if not pcap_files:
+                # No capture contains the rule's protocol, so the rule cannot match
+                result["success"] = True
+                result["engine_status"] = "no_relevant_pcap"
+                return result
             
-            # Parse results from fast.log
-            # Since we're not using -l flag, check logs in current directory
-            current_dir_fast_log = os.path.join(os.getcwd(), "fast.log")
+            # Prefer warm engines when a pool is configured: no per-PCAP start-up cost
+            engine_pool = self.engine_pool or get_default_engine_pool(
+                suricata_cmd, self.rules_dir, self.suricata_config)
+            if engine_pool is not None:
+                return self._validate_with_engine_pool(engine_pool, rule_content, pcap_files,
+                                                       run_log_dir, result, max_alerts)
             
-            if os.path.exists(current_dir_fast_log) and os.path.getsize(current_dir_fast_log) > 0:
-                result["matched"] = True
-                result["details"], result["alert_count"] = self._parse_fast_log(current_dir_fast_log)
-                result["sid_stats"] = self._parse_sid_stats(current_dir_fast_log)
-                result["engine_status"] = "validation_success"
-            else:
-                result["matched"] = False
-                result["alert_count"] = 0
-                result["engine_status"] = "no_alerts_detected"
+            # Only the cold ``suricata -r`` runs read the rule from a file; warm
+            # engines load it over their socket
+            try:
+                with open(rule_file, 'w') as f:
+                    f.write(rule_content)
+                print(f"规则文件已创建: {rule_file}")
+                print(f"规则内容长度: {len(rule_content)}")
+            except Exception as e:
+                result["error"] = f"创建规则文件失败: {str(e)}"
+                result["engine_status"] = "rule_write_failed"
+                return result
             
-            result["success"] = True
-            result["execution_details"]["final_status"] = result["engine_status"]
+            # Verify that the rule file exists and has content
+            if not os.path.exists(rule_file):
+                result["error"] = f"规则文件不存在: {rule_file}"
+                result["engine_status"] = "rule_file_missing"
+                return result
+            
+            if os.path.getsize(rule_file) == 0:
+                result["error"] = f"规则文件为空: {rule_file}"
+                result["engine_status"] = "rule_file_empty"
+                return result
+            
+            result["execution_details"]["rule_file"] = rule_file
+            
+            # Run PCAPs concurrently when more than one worker is configured
+            if workers is None:
+                workers = int(os.getenv('SURICATA_VALIDATION_WORKERS', '1'))
+            return self._validate_pcaps(suricata_cmd, rule_file, pcap_files, workers,
+                                        run_log_dir, result, max_alerts)
             
         except subprocess.TimeoutExpired:
             result["error"] = "Suricata验证超时"
@@ -318,9 +317,341 @@ class SuricataValidator:
                     print(f"Warning: Could not clean up temporary rule file {rule_file}: {cleanup_error}")
                 else:
                     print(f"Warning: Could not clean up temporary rule file: {cleanup_error}")
+            # Remove this run's scratch log directory
+            if 'run_log_dir' in locals():
+                shutil.rmtree(run_log_dir, ignore_errors=True)
+        
+        return result
+    
+    def _create_run_log_dir(self) -> str:
+        """Create a private scratch log directory for one validation run"""
+        scratch_root = os.getenv('SURICATA_SCRATCH_DIR') or None
+        if scratch_root:
+            os.makedirs(scratch_root, exist_ok=True)
+        return tempfile.mkdtemp(prefix=SCRATCH_PREFIX, dir=scratch_root).replace('\\', '/')
+    
+    def _execute_suricata(self, suricata_cmd: List[str], rule_file: str,
+                          abs_pcap_path: str, log_dir: str = None):
+        """Run suricata once for a single PCAP, returns (proc, cmd)"""
+        # Execute suricata with rule file and pcap
+        # For security, we'll call a separate script with elevated privileges if needed
+        cmd = []
+        log_args = ['-l', log_dir] if log_dir else []
+        
+        # Check if we're running as root to determine execution method
+        is_root = (not self.is_windows) and (os.geteuid() == 0)
+        if is_root:
+            # We're already running with elevated privileges
+            cmd = suricata_cmd + [
+                '-S', rule_file,
+                '-k', 'none',
+                '-r', abs_pcap_path
+            ] + log_args
+            
+            print(f"正在测试: {abs_pcap_path}")
+            print(f"执行命令: {' '.join(cmd)}")
+            proc = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                timeout=300
+            )
+        else:
+            # We need to call our helper script with sudo
+            # This is safer than running the entire web application with sudo
+            helper_script = os.path.join(os.path.dirname(__file__), 'run_suricata_as_root.py')
+            
+            if os.path.exists(helper_script):
+                cmd = ['sudo', sys.executable, helper_script, 
+                       '--rules-file', rule_file,
+                       '--pcap-file', abs_pcap_path]
+                
+                # Add config file if it exists
+                if os.path.exists(self.suricata_config):
+                    cmd.extend(['--config-file', self.suricata_config])
+                if log_dir:
+                    cmd.extend(['--log-dir', log_dir])
+                
+                print(f"正在测试: {abs_pcap_path}")
+                print(f"执行命令: {' '.join(cmd)}")
+                proc = subprocess.run(
+                    cmd,
+                    capture_output=True,
+                    text=True,
+                    timeout=300
+                )
+                
+                # Parse the JSON response from our helper script
+                try:
+                    helper_result = json.loads(proc.stdout)
+                    # Simulate the original proc object behavior
+                    class MockProc:
+                        def __init__(self, result):
+                            self.returncode = result['returncode']
+                            self.stdout = result['stdout']
+                            self.stderr = result['stderr']
+                    proc = MockProc(helper_result)
+                except json.JSONDecodeError:
+                    # If JSON parsing fails, treat as error
+                    proc = subprocess.CompletedProcess([], 1, "", "Failed to parse helper script output")
+            else:
+                # Fallback: try to run directly (may fail due to permissions)
+                cmd = suricata_cmd + [
+                    '-S', rule_file,
+                    '-k', 'none',
+                    '-r', abs_pcap_path
+                ] + log_args
+                
+                print(f"正在测试: {abs_pcap_path}")
+                print(f"执行命令: {' '.join(cmd)}")
+                proc = subprocess.run(
+                    cmd,
+                    capture_output=True,
+                    text=True,
+                    timeout=300
+                )
+        
+        return proc, cmd
+    
+    def _run_single_pcap(self, suricata_cmd: List[str], rule_file: str,
+                         pcap: str, log_dir: str) -> Dict:
+        """Run one PCAP into its own log directory and report its status"""
+        abs_pcap_path = os.path.abspath(pcap).replace('\\', '/')
+        status = {
+            "pcap": abs_pcap_path,
+            "status": "ok",
+            "return_code": None,
+            "alert_count": 0,
+            "error": None,
+            "log_dir": log_dir,
+            "command": None
+        }
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+            proc, cmd = self._execute_suricata(suricata_cmd, rule_file, abs_pcap_path, log_dir)
+            status["command"] = ' '.join([f'"{arg}"' if ' ' in arg else arg for arg in cmd])
+            status["return_code"] = proc.returncode
+            if proc.returncode != 0:
+                status["status"] = "execution_failed"
+                status["error"] = proc.stderr
+                print(f"Suricata执行失败: {proc.stderr}")
+        except subprocess.TimeoutExpired:
+            status["status"] = "timeout"
+            status["error"] = "Suricata验证超时"
+        except Exception as e:
+            status["status"] = "internal_error"
+            status["error"] = str(e)
+        return status
+    
+    def _validate_pcaps(self, suricata_cmd: List[str], rule_file: str, pcap_files: List[str],
+                        workers: int, run_log_dir: str, result: Dict, max_alerts: int = None) -> Dict:
+        """
+        Validate PCAPs one after another, or concurrently with at most ``workers``
+        suricata processes.  Either way a failing PCAP is reported in
+        ``pcap_results`` instead of aborting the run, so the result has the same
+        shape whatever the worker count.
+        """
+        log_dirs = [os.path.join(run_log_dir, f"pcap_{index}") for index in range(len(pcap_files))]
+        workers = min(max(workers, 1), len(pcap_files))
+        if workers > 1:
+            result["execution_details"]["parallel_workers"] = workers
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(self._run_single_pcap, suricata_cmd, rule_file, pcap, log_dir)
+                           for pcap, log_dir in zip(pcap_files, log_dirs)]
+                pcap_results = [future.result() for future in futures]
+        else:
+            pcap_results = []
+            for pcap, log_dir in zip(pcap_files, log_dirs):
+                result["execution_details"]["current_pcap"] = pcap
+                pcap_results.append(self._run_single_pcap(suricata_cmd, rule_file, pcap, log_dir))
+        
+        collector = AlertCollector(max_alerts=max_alerts)
+        for pcap_result in pcap_results:
+            log_dir = pcap_result.pop("log_dir")
+            command = pcap_result.pop("command")
+            if command:
+                # Store the command for debugging
+                result["execution_details"]["executed_command"] = command
+            if pcap_result["status"] == "ok" and not collector.truncated:
+                pcap_result["alert_count"] = collector.add_log_dir(log_dir)
+        result["execution_details"]["running_with_sudo_helper"] = (not self.is_windows) and (os.geteuid() != 0)
+        
+        alert_count = self._apply_alert_summary(result, collector)
+        failed = [r for r in pcap_results if r["status"] != "ok"]
+        result["pcap_results"] = pcap_results
+        
+        if len(failed) == len(pcap_results):
+            result["error"] = f"所有PCAP执行失败: {failed[0]['error']}"
+            result["engine_status"] = "timeout" if all(r["status"] == "timeout" for r in failed) \
+                else "execution_failed"
+            result["execution_details"]["return_code"] = failed[0]["return_code"]
+            result["execution_details"]["stderr"] = failed[0]["error"]
+        else:
+            if failed:
+                result["error"] = f"{len(failed)}/{len(pcap_results)} 个PCAP执行失败"
+            result["engine_status"] = "validation_success" if alert_count > 0 else "no_alerts_detected"
+            result["success"] = True
+        result["execution_details"]["final_status"] = result["engine_status"]
+        
+        return result
+    
+    def _validate_with_engine_pool(self, engine_pool, rule_content: str,
+                                   pcap_files: List[str], run_log_dir: str, result: Dict,
+                                   max_alerts: int = None) -> Dict:
+        """Validate using a warm engine from the pool instead of spawning Suricata"""
+        result["execution_details"]["warm_engine"] = True
+        try:
+            runs = engine_pool.validate(rule_content, pcap_files, run_log_dir)
+            result["execution_details"]["pcap_runs"] = runs
+            
+            collector = AlertCollector(max_alerts=max_alerts)
+            for run in runs:
+                collector.add_log_dir(run["output_dir"])
+                if collector.truncated:
+                    break
+            alert_count = self._apply_alert_summary(result, collector)
+            result["engine_status"] = "validation_success" if alert_count > 0 else "no_alerts_detected"
+            result["success"] = True
+            result["execution_details"]["final_status"] = result["engine_status"]
+        except SuricataSocketError as e:
+            result["error"] = f"常驻Suricata引擎执行失败: {str(e)}"
+            result["engine_status"] = "warm_engine_failed"
         
         return result
     
+    def _apply_alert_summary(self, result: Dict, collector: AlertCollector) -> int:
+        """Copy an AlertCollector summary into a validation result, returns alert count"""
+        summary = collector.summary()
+        result["matched"] = summary["alert_count"] > 0
+        result["alert_count"] = summary["alert_count"]
+        result["details"] = summary["details"]
+        result["sid_stats"] = summary["sid_stats"]
+        result["sid_details"] = summary["sid_details"]
+        result["flows"] = summary["flows"]
+        result["alerts_truncated"] = summary["truncated"]
+        return summary["alert_count"]
+    
+    def validate_rules_batch(self, rules: List[Dict], pcap_path: str, workers: int = None) -> Dict:
+        """
+        Validate many rules in a single engine run per PCAP
+        
+        All rules are written into one rules file and attributed back to their
+        rule_id by SID, so the cost is O(PCAPs) instead of O(rules x PCAPs).
+        
+        Args:
+            rules: List of {"rule_id": ..., "rule_content": ...}
+            pcap_path: Path to PCAP file or directory
+            workers: Number of PCAPs to run concurrently
+        
+        Returns:
+            Dict with the combined engine result and one entry per rule
+        """
+        rule_results = []
+        sid_owner = {}
+        loaded_rules = []
+        
+        for item in rules:
+            rule_content = (item.get("rule_content") or "").strip()
+            entry = {
+                "rule_id": item.get("rule_id"),
+                "sid": None,
+                "matched": False,
+                "alert_count": 0,
+                "details": [],
+                "error": None
+            }
+            rule_results.append(entry)
+            
+            if not rule_content:
+                entry["error"] = "规则内容为空"
+                continue
+            # One rule per line in the shared rules file
+            rule_line = " ".join(line.strip() for line in rule_content.splitlines() if line.strip())
+            sid_match = SID_PATTERN.search(rule_line)
+            if not sid_match:
+                entry["error"] = "规则缺少sid，无法归属告警"
+                continue
+            sid = int(sid_match.group(1))
+            entry["sid"] = sid
+            if sid in sid_owner:
+                entry["error"] = f"sid {sid} 与规则 {sid_owner[sid]['rule_id']} 重复"
+                continue
+            sid_owner[sid] = entry
+            loaded_rules.append(rule_line)
+        
+        result = {
+            "success": False,
+            "rule_count": len(rules),
+            "loaded_rule_count": len(loaded_rules),
+            "matched_rule_count": 0,
+            "results": rule_results,
+            "engine_result": None,
+            "error": None
+        }
+        if not loaded_rules:
+            result["error"] = "没有可验证的规则"
+            return result
+        
+        engine_result = self.validate_rule("\n".join(loaded_rules) + "\n", pcap_path, workers=workers)
+        result["engine_result"] = {
+            key: engine_result.get(key)
+            for key in ("success", "engine_status", "error", "alert_count", "sid_stats", "pcap_results")
+            if key in engine_result
+        }
+        result["success"] = engine_result["success"]
+        result["error"] = engine_result["error"]
+        
+        sid_details = engine_result.get("sid_details", {})
+        for sid_key, count in engine_result.get("sid_stats", {}).items():
+            match = re.match(r'\[(\d+):(\d+):(\d+)\]', sid_key)
+            entry = sid_owner.get(int(match.group(2))) if match else None
+            if entry is None:
+                continue
+            entry["alert_count"] += count
+            entry["matched"] = True
+            entry["details"].extend(sid_details.get(sid_key, []))
+        
+        result["matched_rule_count"] = sum(1 for entry in rule_results if entry["matched"])
+        return result
+    
+    def _filter_irrelevant_pcaps(self, rule_content: str, pcap_files: List[str]):
+        """Split pcap_files into (to run, skipped) using the catalog's protocol summaries"""
+        if self.pcap_index is None or os.getenv('SURICATA_SKIP_IRRELEVANT_PCAPS', 'true').lower() != 'true':
+            return pcap_files, []
+        relevant, skipped = [], []
+        for pcap in pcap_files:
+            try:
+                protocols = self.pcap_index.protocols_for_path(pcap)
+            except Exception as e:
+                print(f"Warning: 读取PCAP索引失败: {e}")
+                protocols = None
+            (relevant if rule_may_match(rule_content, protocols) else skipped).append(pcap)
+        return relevant, skipped
+    
+    def _prefilter_pcaps(self, rule_content: str, pcap_files: List[str], run_log_dir: str, result: Dict):
+        """Replace each PCAP by its candidate flows; returns (to run, left without packets)"""
+        prefilter_dir = os.path.join(run_log_dir, 'prefilter')
+        os.makedirs(prefilter_dir, exist_ok=True)
+        filtered, emptied, stats = [], [], {}
+        for pcap in pcap_files:
+            target = os.path.join(prefilter_dir, os.path.basename(pcap))
+            try:
+                pcap_stats = prefilter_pcap(rule_content, pcap, target)
+            except Exception as e:
+                print(f"Warning: PCAP预过滤失败 {pcap}: {e}")
+                pcap_stats = None
+            if pcap_stats is None:
+                filtered.append(pcap)
+                continue
+            stats[pcap] = pcap_stats
+            if pcap_stats["packets_out"] == 0:
+                emptied.append(pcap)
+            else:
+                filtered.append(target.replace('\\', '/'))
+        if stats:
+            result["prefilter"] = stats
+        return filtered, emptied
+    
     def _get_pcap_files(self, pcap_path: str) -> List[str]:
         """Get list of PCAP files from path"""
         pcap_files = []
@@ -339,46 +670,15 @@ class SuricataValidator:
         
         return pcap_files
     
-    def _parse_fast_log(self, fast_log: str) -> tuple:
-        """Parse fast.log to extract alerts"""
-        details = []
-        count = 0
-        
-        try:
-            with open(fast_log, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    line = line.strip()
-                    if line:
-                        details.append(line)
-                        count += 1
-        except Exception as e:
-            print(f"Error parsing fast.log: {e}")
-        
-        return details[:10], count  # Return first 10 details and total count
-    
-    def _parse_sid_stats(self, fast_log: str) -> Dict:
-        """Parse SID statistics from fast.log"""
-        sid_stats = {}
-        
-        try:
-            with open(fast_log, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    # Extract SID pattern [gid:sid:rev]
-                    match = re.search(r'\[(\d+):(\d+):(\d+)\]', line)
-                    if match:
-                        sid = f"[{match.group(1)}:{match.group(2)}:{match.group(3)}]"
-                        sid_stats[sid] = sid_stats.get(sid, 0) + 1
-        except Exception as e:
-            print(f"Error parsing SID stats: {e}")
-        
-        # Sort by count descending
-        sorted_stats = dict(sorted(sid_stats.items(), key=lambda x: x[1], reverse=True))
-        
-        return sorted_stats
-    
     def validate_rule_syntax(self, rule_content: str) -> Dict:
         """
-        Validate Suricata rule syntax without running against PCAP
+        Validate Suricata rule syntax without running against PCAP.
+        
+        The rule is parsed locally first, so malformed rules are rejected
+        without starting Suricata; ``suricata -T`` only runs for rules that
+        parse, and is skipped when Suricata is not installed.  The project
+        template lint (SID range, required flow, ...) is not applied here: it
+        is for generated rules, and any valid Suricata rule passes this check.
         
         Args:
             rule_content: The Suricata rule to validate
@@ -388,9 +688,16 @@ class SuricataValidator:
         """
         result = {
             "valid": False,
-            "error": None
+            "error": None,
+            "checked_by": "parser"
         }
         
+        try:
+            parse_rules(rule_content or '')
+        except RuleParseError as e:
+            result["error"] = str(e)
+            return result
+        
         try:
             # Create temporary rule file
             with tempfile.NamedTemporaryFile(mode='w', suffix='.rules', delete=False) as f:
@@ -400,10 +707,12 @@ class SuricataValidator:
             # Check if suricata is available
             suricata_cmd = self._get_suricata_command()
             if not suricata_cmd:
-                # Suricata not available
-                result["error"] = "Suricata not found. Please install Suricata or configure remote validation."
+                # Suricata not available: the local parser result stands
+                os.unlink(temp_rule_file)
+                result["valid"] = True
                 return result
             
+            result["checked_by"] = "suricata"
             # Run suricata syntax check
             # Convert to absolute paths for cross-platform compatibility and normalize path separators
             abs_config_path = os.path.abspath(self.suricata_config).replace('\\', '/')
@@ -437,10 +746,13 @@ class SuricataValidator:
         return result
     
     @staticmethod
-    def create_validator(rules_dir=None, suricata_config=None, log_dir=None):
+    def create_validator(rules_dir=None, suricata_config=None, log_dir=None,
+                         engine_pool=None, result_cache=None, pcap_index=None, prefilter=None,
+                         suricata_command=None):
         """Create validator instance for Kali Linux (no Windows support)"""
         # Always return the standard validator (Kali Linux)
-        return SuricataValidator(rules_dir, suricata_config, log_dir)
+        return SuricataValidator(rules_dir, suricata_config, log_dir, engine_pool, result_cache,
+                                 pcap_index, prefilter, suricata_command)
 
 
 # Removed Windows validator class as per requirement to focus on Kali Linux only
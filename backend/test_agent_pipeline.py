@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Agent pipeline test - 验证修复循环的本地预检闸门：无效、重复或模拟确定无法命中的候选规则不运行引擎，但记录在 steps 中
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+WORKDIR = tempfile.mkdtemp(prefix='agent_test_')
+os.environ['DB_PATH'] = os.path.join(WORKDIR, 'agent.db')
+os.environ.setdefault('LLM_API_KEY', 'test')
+
+import app_v2
+from http_samples import parse_requests
+
+app_v2.create_app()
+
+RULE_A = 'alert http any any -> any any (msg:"a"; flow:established,to_server; content:"/a"; sid:9000001; rev:1;)'
+# Same detection as RULE_A: only whitespace, msg and rev differ
+RULE_A_AGAIN = 'alert http any any -> any any (msg:"a2";  flow:established,to_server;content:"/a"; sid:9000001; rev:2;)'
+RULE_NO_FLOW = 'alert http any any -> any any (msg:"b"; content:"/b"; sid:9000001; rev:3;)'
+RULE_B = 'alert http any any -> any any (msg:"b"; flow:established,to_server; content:"/b"; sid:9000001; rev:4;)'
+
+
+class FakeValidator:
+    runs = []
+
+    def validate_rule(self, rule_content, pcap_path):
+        FakeValidator.runs.append(rule_content)
+        matched = rule_content == RULE_B
+        return {"success": True, "matched": matched, "alert_count": int(matched),
+                "details": [], "sid_stats": {}, "engine_status": "validation_success"}
+
+
+def test_fix_loop_skips_invalid_and_duplicate_candidates():
+    FakeValidator.runs = []
+    replies = iter([RULE_A, "```\n" + RULE_A_AGAIN + "\n```", RULE_NO_FLOW, RULE_B])
+    prompts = []
+    pcap = os.path.join(WORKDIR, 'a.pcap')
+    open(pcap, 'wb').close()
+
+    original = (app_v2.llm_client.generate_text, app_v2.validator_registry.get_validator,
+                app_v2.pcap_manager_db.get_pcap_path)
+    app_v2.llm_client.generate_text = lambda prompt, **kw: (
+        prompts.append(prompt) or {"choices": [{"message": {"content": next(replies)}}]})
+    app_v2.validator_registry.get_validator = lambda prefilter=None: FakeValidator()
+    app_v2.pcap_manager_db.get_pcap_path = lambda filename: pcap
+    try:
+        result, status = app_v2._run_agent_pipeline({
+            "vuln_name": "t", "vuln_description": "t", "pcap_filename": "a.pcap",
+            "auto_optimize": True, "max_optimize_rounds": 3
+        })
+    finally:
+        (app_v2.llm_client.generate_text, app_v2.validator_registry.get_validator,
+         app_v2.pcap_manager_db.get_pcap_path) = original
+
+    assert status == 200
+    assert result["final_status"] == "validated" and result["final_rule"] == RULE_B
+    # Only the first rule and the one novel, well-formed candidate reached the engine
+    assert FakeValidator.runs == [RULE_A, RULE_B]
+    skipped = [step for step in result["steps"] if step["status"] == "skipped"]
+    assert [(step["step"], step["reason"]) for step in skipped] == [
+        ("validate_after_fix_1", "duplicate"), ("validate_after_fix_2", "invalid")]
+    assert "缺少必需选项: flow" in skipped[1]["lint"]["errors"]
+    assert [entry.get("skipped") for entry in result["optimize_history"]] == ["duplicate", "invalid", None]
+    # The next fix prompt explains why the previous round was skipped
+    assert "已验证过的规则等价" in prompts[2] and "未通过本地检查" in prompts[3]
+    assert app_v2.db.get_rule_by_id(result["rule_id"])["current_rule"] == RULE_B
+
+
+def test_simulated_no_match_skips_the_engine():
+    FakeValidator.runs = []
+    replies = iter([RULE_A, RULE_B])
+    prompts = []
+    pcap = os.path.join(WORKDIR, 'b.pcap')
+    open(pcap, 'wb').close()
+    requests, _ = parse_requests(b'GET /b HTTP/1.1\r\nHost: example.com\r\n\r\n', 10)
+    samples = {"requests": requests, "truncated": False}
+
+    original = (app_v2.llm_client.generate_text, app_v2.validator_registry.get_validator,
+                app_v2.pcap_manager_db.get_pcap_path, app_v2.pcap_manager_db.get_http_samples)
+    app_v2.llm_client.generate_text = lambda prompt, **kw: (
+        prompts.append(prompt) or {"choices": [{"message": {"content": next(replies)}}]})
+    app_v2.validator_registry.get_validator = lambda prefilter=None: FakeValidator()
+    app_v2.pcap_manager_db.get_pcap_path = lambda filename: pcap
+    app_v2.pcap_manager_db.get_http_samples = lambda filename: samples
+    try:
+        result, status = app_v2._run_agent_pipeline({
+            "vuln_name": "t", "vuln_description": "t", "pcap_filename": "b.pcap",
+            "auto_optimize": True, "max_optimize_rounds": 3
+        })
+    finally:
+        (app_v2.llm_client.generate_text, app_v2.validator_registry.get_validator,
+         app_v2.pcap_manager_db.get_pcap_path, app_v2.pcap_manager_db.get_http_samples) = original
+
+    assert status == 200 and result["final_status"] == "validated"
+    # RULE_A cannot match the only request, so just RULE_B reaches the engine
+    assert FakeValidator.runs == [RULE_B]
+    validate_steps = [step for step in result["steps"] if step["step"].startswith("validate")]
+    assert [step["status"] for step in validate_steps] == ["simulated", "done"]
+    assert [step["simulation"]["verdict"] for step in validate_steps] == ["no_match", "match"]
+    # The fix prompt carries the simulated result, including the failed check
+    assert "simulated_no_match" in prompts[1] and 'content:\\"/a\\";' in prompts[1]
+
+
+def teardown_module(module):
+    app_v2.job_queue.shutdown(wait=False)
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    try:
+        test_fix_loop_skips_invalid_and_duplicate_candidates()
+        print("✓ Agent修复循环预检测试通过")
+        test_simulated_no_match_skips_the_engine()
+        print("✓ Agent模拟匹配跳过引擎测试通过")
+    finally:
+        teardown_module(None)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Alert parser test - 验证 eve.json 流式解析、告警上限和 fast.log 回退
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from alert_parser import AlertCollector, collect_alerts
+
+
+def _eve_alert(sid, flow_id, url="/index.php?id=1"):
+    return json.dumps({
+        "timestamp": "2024-01-01T00:00:00.000000+0000",
+        "flow_id": flow_id,
+        "event_type": "alert",
+        "src_ip": "10.0.0.1", "src_port": 40000,
+        "dest_ip": "10.0.0.2", "dest_port": 80,
+        "proto": "TCP", "app_proto": "http",
+        "alert": {"gid": 1, "signature_id": sid, "rev": 1, "signature": f"rule {sid}",
+                  "category": "", "severity": 3},
+        "http": {"hostname": "example.com", "url": url, "http_method": "GET"}
+    })
+
+
+def _write_dir(root, name, eve_lines=None, fast_lines=None):
+    log_dir = os.path.join(root, name)
+    os.makedirs(log_dir)
+    if eve_lines is not None:
+        with open(os.path.join(log_dir, "eve.json"), 'w') as f:
+            f.write("\n".join(eve_lines) + "\n")
+    if fast_lines is not None:
+        with open(os.path.join(log_dir, "fast.log"), 'w') as f:
+            f.write("\n".join(fast_lines) + "\n")
+    return log_dir
+
+
+def test_eve_alerts_and_flows():
+    root = tempfile.mkdtemp()
+    try:
+        lines = [json.dumps({"event_type": "flow", "flow_id": 1})]
+        lines += [_eve_alert(9000001, 1) for _ in range(15)]
+        lines += [_eve_alert(9000002, 2)]
+        log_dir = _write_dir(root, "pcap_0", eve_lines=lines)
+
+        summary = collect_alerts([log_dir])
+        assert summary["alert_count"] == 16
+        assert len(summary["details"]) == 10
+        assert "[1:9000001:1]" in summary["details"][0]
+        assert summary["sid_stats"] == {"[1:9000001:1]": 15, "[1:9000002:1]": 1}
+        assert len(summary["flows"]) == 2
+        assert summary["flows"][0]["alert_count"] == 15
+        assert summary["flows"][0]["http"]["url"] == "/index.php?id=1"
+        assert not summary["truncated"]
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def test_alert_cap_stops_early_across_dirs():
+    root = tempfile.mkdtemp()
+    try:
+        first = _write_dir(root, "pcap_0", eve_lines=[_eve_alert(9000001, i) for i in range(3)])
+        second = _write_dir(root, "pcap_1", eve_lines=[_eve_alert(9000001, i) for i in range(3)])
+
+        collector = AlertCollector(max_alerts=4)
+        assert collector.add_log_dir(first) == 3
+        assert collector.add_log_dir(second) == 1
+        assert collector.truncated
+        assert collector.summary()["alert_count"] == 4
+
+        exact = collect_alerts([first], max_alerts=3)
+        assert exact["alert_count"] == 3
+        assert not exact["truncated"]
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def test_fast_log_fallback():
+    root = tempfile.mkdtemp()
+    try:
+        fast = ['01/01/2024-00:00:00.000000  [**] [1:9000003:1] t [**] {TCP} 10.0.0.1:1 -> 10.0.0.2:80'] * 2
+        log_dir = _write_dir(root, "pcap_0", fast_lines=fast)
+        summary = collect_alerts([log_dir])
+        assert summary["alert_count"] == 2
+        assert summary["sid_stats"] == {"[1:9000003:1]": 2}
+        assert summary["flows"] == []
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    test_eve_alerts_and_flows()
+    test_alert_cap_stops_early_across_dirs()
+    test_fast_log_fallback()
+    print("✓ 告警解析测试通过")
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+API key store test - 验证 Agent API Key 按哈希查找、验证缓存失效、last_used 批量写入及旧JSON列表迁移
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from api_key_store import APIKeyStore, hash_key
+from database import Database
+
+
+def _db(workdir):
+    db = Database(os.path.join(workdir, 'keys.db'))
+    db.init_db()
+    return db
+
+
+def _key_rows(db):
+    conn = db.get_connection()
+    rows = [dict(row) for row in conn.execute('SELECT * FROM agent_api_keys ORDER BY id')]
+    conn.close()
+    return rows
+
+
+def test_keys_are_stored_hashed_and_verified_from_cache():
+    workdir = tempfile.mkdtemp()
+    try:
+        db = _db(workdir)
+        store = APIKeyStore(db, flush_interval=3600)
+        created = store.create_key('ci')
+        rows = _key_rows(db)
+        assert rows[0]["key_hash"] == hash_key(created["key"])
+        assert created["key"] not in json.dumps(rows)
+
+        assert store.verify(created["key"]) == created["id"]
+        assert store.verify('wrong') is None and store.verify('') is None
+        # A cached key is accepted without reading the table
+        conn = db.get_connection()
+        conn.execute('UPDATE agent_api_keys SET key_hash = ?', ('x',))
+        conn.commit()
+        conn.close()
+        assert store.verify(created["key"]) == created["id"]
+        # ...until the entry expires
+        store.cache_ttl = 0
+        assert store.verify(created["key"]) is None
+        store.shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_delete_invalidates_and_last_used_is_batched():
+    workdir = tempfile.mkdtemp()
+    try:
+        db = _db(workdir)
+        store = APIKeyStore(db, flush_interval=3600)
+        first, second = store.create_key('a'), store.create_key('b')
+        for _ in range(5):
+            store.verify(first["key"])
+        store.verify(second["key"])
+        # Nothing is written on the request path
+        assert [row["last_used"] for row in _key_rows(db)] == [None, None]
+        assert store.flush() == 2
+        assert all(row["last_used"] for row in _key_rows(db))
+        assert store.flush() == 0
+
+        listed = store.list_keys()
+        assert [key["label"] for key in listed] == ['a', 'b']
+        assert "key" not in listed[0] and listed[0]["key_preview"] == first["key"][:8] + "****"
+
+        assert store.delete_key(first["id"]) is True
+        assert store.verify(first["key"]) is None
+        assert store.delete_key(first["id"]) is False
+        assert store.verify(second["key"]) == second["id"]
+        store.shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_revocation_reaches_other_workers_and_cache_is_lru():
+    workdir = tempfile.mkdtemp()
+    try:
+        db = _db(workdir)
+        admin = APIKeyStore(db, flush_interval=3600)
+        worker = APIKeyStore(db, flush_interval=3600, version_check_interval=0.1, max_cached=2)
+        first, second, third = admin.create_key('a'), admin.create_key('b'), admin.create_key('c')
+        assert worker.verify(first["key"]) == first["id"]
+        assert worker.verify(second["key"]) == second["id"]
+
+        # Revoked in another worker: rejected after the next version check, not after cache_ttl
+        admin.delete_key(first["id"])
+        time.sleep(0.15)
+        assert worker.verify(first["key"]) is None
+
+        # A hit moves the entry to the end, so the least recently used one is evicted
+        assert worker.verify(second["key"]) == second["id"]
+        assert worker.verify(third["key"]) == third["id"]
+        assert worker.verify(second["key"]) == second["id"]
+        fourth = admin.create_key('d')
+        assert worker.verify(fourth["key"]) == fourth["id"]
+        assert list(worker._verified._entries) == [hash_key(second["key"]), hash_key(fourth["key"])]
+        admin.shutdown()
+        worker.shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_legacy_json_list_is_migrated():
+    workdir = tempfile.mkdtemp()
+    try:
+        db = _db(workdir)
+        db.set_config('agent_api_keys', json.dumps([
+            {"id": "k1", "label": "old", "key": "legacy-secret-key", "created_at": "2024-01-01 00:00:00",
+             "last_used": "2024-02-01 00:00:00"}
+        ]))
+        store = APIKeyStore(db)
+        assert db.get_config('agent_api_keys') is None
+        assert store.list_keys() == [{"id": "k1", "label": "old", "key_preview": "legacy-s****",
+                                      "created_at": "2024-01-01 00:00:00", "last_used": "2024-02-01 00:00:00"}]
+        assert store.verify("legacy-secret-key") == "k1"
+        assert APIKeyStore(db).migrate_legacy_list() == 0
+        store.shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    test_keys_are_stored_hashed_and_verified_from_cache()
+    print("✓ API Key 哈希存储与验证缓存测试通过")
+    test_delete_invalidates_and_last_used_is_batched()
+    print("✓ API Key 删除失效与批量写入测试通过")
+    test_revocation_reaches_other_workers_and_cache_is_lru()
+    print("✓ API Key 跨进程吊销与LRU缓存测试通过")
+    test_legacy_json_list_is_migrated()
+    print("✓ API Key 旧列表迁移测试通过")
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+App factory test - 验证导入 app_v2 不做初始化，create_app() 只初始化一次，未调用 create_app 时首个请求触发初始化
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(BACKEND_DIR)
+
+# 每个场景在独立进程中导入 app_v2，避免与其他测试共用模块级状态
+FACTORY_SCRIPT = '''
+import os, app_v2
+assert app_v2.db is None and not os.path.exists(os.environ['DB_PATH'])
+calls = []
+original = app_v2._init_components
+app_v2._init_components = lambda: calls.append(1) or original()
+assert app_v2.create_app() is app_v2.create_app() is app_v2.app
+assert calls == [1]
+assert app_v2.db.get_connection().execute("SELECT COUNT(*) FROM configurations").fetchone()[0] > 0
+assert app_v2.user_model.get_by_username('admin') is not None
+# No SQLite handles are left open for forked workers to inherit
+assert app_v2.get_pool(os.environ['DB_PATH'])._created == 1
+app_v2.job_queue.shutdown(wait=False)
+'''
+
+LAZY_SCRIPT = '''
+import app_v2
+client = app_v2.app.test_client()
+assert client.get('/api/health').status_code == 200
+assert app_v2.db is not None and app_v2._worker_pid is not None
+response = client.post('/api/auth/login', json={"username": "admin", "password": "admin123"})
+assert response.status_code == 200, response.data
+token = response.get_json()['access_token']
+status = client.get('/api/agent/status', headers={"Authorization": f"Bearer {token}"})
+assert status.status_code == 200, status.data
+assert "llm_cache" in status.get_json()
+app_v2.job_queue.shutdown(wait=False)
+'''
+
+
+def _run(script, workdir):
+    env = dict(os.environ, DB_PATH=os.path.join(workdir, 'data', 'app.db'), LLM_API_KEY='test',
+               SURICATA_SCRATCH_DIR=os.path.join(workdir, 'scratch'))
+    proc = subprocess.run([sys.executable, '-c', script], cwd=BACKEND_DIR, env=env,
+                          capture_output=True, text=True, timeout=60)
+    assert proc.returncode == 0, proc.stderr
+
+
+def test_create_app_initializes_once():
+    workdir = tempfile.mkdtemp()
+    try:
+        _run(FACTORY_SCRIPT, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_first_request_initializes_lazily():
+    workdir = tempfile.mkdtemp()
+    try:
+        _run(LAZY_SCRIPT, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    test_create_app_initializes_once()
+    print("✓ 应用工厂单次初始化测试通过")
+    test_first_request_initializes_lazily()
+    print("✓ 首个请求延迟初始化测试通过")
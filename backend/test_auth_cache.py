@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Auth cache test - 验证进程内 TTL/LRU 缓存及用户快照在修改、停用、删除用户时失效（包括其他工作进程中的修改）
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from memory_cache import TTLCache
+from user_model import UserModel
+
+
+def test_ttl_cache_expires_and_evicts_least_recently_used():
+    cache = TTLCache(max_entries=2, ttl_seconds=60)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    # 'b' was the least recently used entry
+    assert cache.get('b') is None and cache.get('a') == 1 and cache.get('c') == 3
+    cache.pop('a')
+    assert cache.get('a') is None
+    assert cache.stats() == {"entries": 1, "hits": 3, "misses": 2}
+
+    short = TTLCache(ttl_seconds=0.01)
+    short.put('a', 1)
+    time.sleep(0.02)
+    assert short.get('a') is None
+
+
+def test_user_snapshots_are_cached_and_invalidated():
+    workdir = tempfile.mkdtemp()
+    try:
+        users = UserModel(os.path.join(workdir, 'users.db'))
+        user_id = users.create_user('alice', 'secret', role='admin')
+        lookups = []
+        original = users.get_by_id
+        users.get_by_id = lambda uid: lookups.append(uid) or original(uid)
+
+        snapshot = users.get_snapshot(user_id)
+        assert snapshot["role"] == 'admin' and 'password_hash' not in snapshot
+        snapshot["role"] = 'changed'
+        assert users.get_snapshot(user_id)["role"] == 'admin'
+        assert lookups == [user_id]
+
+        users.update_user(user_id, role='user')
+        assert users.get_snapshot(user_id)["role"] == 'user'
+        users.deactivate_user(user_id)
+        assert users.get_snapshot(user_id)["is_active"] == 0
+        users.update_password(user_id, 'other')
+        users.get_snapshot(user_id)
+        assert len(lookups) == 4
+
+        users.delete_user(user_id)
+        assert users.get_snapshot(user_id) is None
+        # Unknown users are not cached
+        assert users.get_snapshot(user_id) is None and len(lookups) == 6
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_changes_in_another_worker_invalidate_snapshots():
+    workdir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(workdir, 'users.db')
+        worker_a, worker_b = UserModel(db_path), UserModel(db_path, version_check_interval=0)
+        user_id = worker_a.create_user('alice', 'secret', role='admin')
+        assert worker_b.get_snapshot(user_id)["role"] == 'admin'
+
+        # A demotion in one worker is seen by the other despite its cached snapshot
+        assert worker_a.update_user(user_id, role='user')
+        assert worker_b.get_snapshot(user_id)["role"] == 'user'
+        assert worker_a.deactivate_user(user_id)
+        assert worker_b.get_snapshot(user_id)["is_active"] == 0
+        assert worker_a.delete_user(user_id)
+        assert worker_b.get_snapshot(user_id) is None
+        assert not worker_a.update_user(user_id, role='admin') and not worker_a.delete_user(user_id)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_cached_snapshots_skip_the_database_between_version_checks():
+    workdir = tempfile.mkdtemp()
+    try:
+        db_path = os.path.join(workdir, 'users.db')
+        worker_a, worker_b = UserModel(db_path), UserModel(db_path, version_check_interval=0.2)
+        user_id = worker_a.create_user('alice', 'secret', role='admin')
+        connections = []
+        original = worker_b.get_connection
+        worker_b.get_connection = lambda: connections.append(1) or original()
+
+        worker_b.get_snapshot(user_id)
+        assert len(connections) == 2  # users_version, then the user row
+        for _ in range(50):
+            assert worker_b.get_snapshot(user_id)["role"] == 'admin'
+        assert len(connections) == 2
+
+        # A change in another worker is picked up at the next version check
+        worker_a.update_user(user_id, role='user')
+        assert worker_b.get_snapshot(user_id)["role"] == 'admin'
+        time.sleep(0.25)
+        assert worker_b.get_snapshot(user_id)["role"] == 'user'
+        assert len(connections) == 4
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    test_ttl_cache_expires_and_evicts_least_recently_used()
+    print("✓ TTL/LRU 缓存测试通过")
+    test_user_snapshots_are_cached_and_invalidated()
+    print("✓ 用户快照缓存失效测试通过")
+    test_changes_in_another_worker_invalidate_snapshots()
+    print("✓ 跨进程用户快照失效测试通过")
+    test_cached_snapshots_skip_the_database_between_version_checks()
+    print("✓ 快照命中不访问数据库测试通过")
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Config manager test - 验证配置读缓存、写入时版本号递增以及多进程（多个实例）之间的失效
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from api_key_store import APIKeyStore
+from config_manager import ConfigManager
+from database import Database
+
+
+def _db(workdir):
+    db = Database(os.path.join(workdir, 'config.db'))
+    db.init_db()
+    return db
+
+
+def test_reads_are_served_from_memory():
+    workdir = tempfile.mkdtemp()
+    try:
+        db = _db(workdir)
+        manager = ConfigManager(db, refresh_interval=3600)
+        connections = []
+        original = db.get_connection
+        db.get_connection = lambda: connections.append(1) or original()
+
+        assert manager.get_config('ssh_user') == 'kali'
+        assert manager.get_config('missing', 'fallback') == 'fallback'
+        assert 'suricata_config' in manager.get_all_configs()
+        assert connections == []
+
+        version = manager.version
+        assert manager.update_configs({"ssh_user": "root", "ssh_host": "10.0.0.1"}) is True
+        # One transaction and one version bump for the whole batch, applied to the cache
+        assert len(connections) == 1 and manager.version == version + 1
+        assert manager.get_config('ssh_user') == 'root' and manager.get_config('ssh_host') == '10.0.0.1'
+        assert db.get_config('ssh_user') == '"root"'
+
+        manager.set_config('paths', ['/a'])
+        manager.get_config('paths').append('/b')
+        assert manager.get_config('paths') == ['/a']
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_other_writers_are_picked_up_by_version():
+    workdir = tempfile.mkdtemp()
+    try:
+        db = _db(workdir)
+        first = ConfigManager(db, refresh_interval=0)
+        second = ConfigManager(db, refresh_interval=3600)
+        changes = []
+        first.add_listener(changes.append)
+        assert first.get_config('ssh_user') == second.get_config('ssh_user') == 'kali'
+
+        second.set_config('ssh_user', 'admin')
+        assert first.get_config('ssh_user') == 'admin'
+        assert changes == [{'ssh_user'}]
+        assert first.version == second.version
+
+        first.set_config('ssh_user', 'again')
+        # second checks the version only after its refresh interval
+        assert second.get_config('ssh_user') == 'admin'
+        second.refresh_interval = 0
+        assert second.get_config('ssh_user') == 'again'
+        assert changes == [{'ssh_user'}, {'ssh_user'}]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_legacy_migrations_invalidate_cached_values():
+    workdir = tempfile.mkdtemp()
+    try:
+        db = _db(workdir)
+        db.set_config('agent_api_keys', '[{"id": "k1", "key": "plaintext-key"}]')
+        manager = ConfigManager(db, refresh_interval=0)
+        assert manager.get_config('agent_api_keys')[0]['key'] == 'plaintext-key'
+
+        store = APIKeyStore(db)
+        store.shutdown()
+        # The migration removed the row and moved the version, so the cache drops it too
+        assert db.get_config('agent_api_keys') is None
+        assert 'agent_api_keys' not in manager.get_all_configs()
+
+        db.set_config('ssh_user', '"direct"')
+        assert manager.get_config('ssh_user') == 'direct'
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    test_reads_are_served_from_memory()
+    print("✓ 配置读缓存测试通过")
+    test_other_writers_are_picked_up_by_version()
+    print("✓ 配置版本号失效测试通过")
+    test_legacy_migrations_invalidate_cached_values()
+    print("✓ 旧配置迁移后缓存失效测试通过")
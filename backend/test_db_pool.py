@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+DB pool test - 验证连接复用、WAL 模式、未提交事务回滚及并发读写
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from db_pool import ConnectionPool
+from database import Database
+
+
+def test_connections_are_reused_in_wal_mode():
+    workdir = tempfile.mkdtemp()
+    try:
+        pool = ConnectionPool(os.path.join(workdir, 'pool.db'), max_size=2)
+        conn = pool.acquire()
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        conn.execute('CREATE TABLE t (v INTEGER)')
+        conn.commit()
+        conn.execute('INSERT INTO t VALUES (1)')
+        # Closing without commit must not leak the open transaction to the next user
+        conn.close()
+        conn.close()
+
+        conn = pool.acquire()
+        assert conn.execute('SELECT COUNT(*) FROM t').fetchone()[0] == 0
+        conn.close()
+        assert pool.stats["connections_opened"] == 1
+        pool.close_all()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_pool_is_bounded_and_returns_leaked_connections():
+    workdir = tempfile.mkdtemp()
+    try:
+        pool = ConnectionPool(os.path.join(workdir, 'pool.db'), max_size=1, acquire_timeout=0.2)
+        held = pool.acquire()
+        try:
+            pool.acquire()
+            assert False, "expected TimeoutError"
+        except TimeoutError:
+            pass
+        del held
+        pool.acquire().close()
+        assert pool.stats["connections_opened"] == 1
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_database_concurrent_writes():
+    workdir = tempfile.mkdtemp()
+    try:
+        db = Database(os.path.join(workdir, 'rules.db'))
+        db.init_db()
+
+        def insert(n):
+            for i in range(20):
+                db.insert_rule(vuln_name=f"{n}-{i}", original_rule="r", current_rule="r")
+                db.get_all_rules(page=1, per_page=5)
+
+        threads = [threading.Thread(target=insert, args=(n,)) for n in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert db.get_rules_count() == 80
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    test_connections_are_reused_in_wal_mode()
+    test_pool_is_bounded_and_returns_leaked_connections()
+    test_database_concurrent_writes()
+    print("✓ 数据库连接池测试通过")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Job queue test - 验证后台任务的提交、进度、结果及重启恢复
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import Database
+from job_queue import JobQueue
+
+
+def _wait(queue, task_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(task_id)
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError("任务未在超时内完成")
+
+
+def _db(workdir):
+    db = Database(os.path.join(workdir, 'jobs.db'))
+    db.init_db()
+    return db
+
+
+def test_submit_returns_immediately_and_records_progress():
+    workdir = tempfile.mkdtemp()
+    try:
+        queue = JobQueue(_db(workdir), workers=2)
+        release = threading.Event()
+
+        def handler(params, progress):
+            progress({"status": "started", "steps": ["generate"]})
+            release.wait(5)
+            return {"status": "completed", "echo": params["vuln_name"]}
+
+        queue.register_handler('agent_run', handler)
+        task_id = queue.submit('agent_run', {"vuln_name": "测试漏洞"})
+
+        time.sleep(0.05)
+        running = queue.get(task_id)
+        assert running["status"] == "running"
+        assert running["result"]["steps"] == ["generate"]
+
+        release.set()
+        job = _wait(queue, task_id)
+        assert job["status"] == "completed"
+        assert job["result"]["echo"] == "测试漏洞"
+        assert queue.stats()["jobs"] == {"completed": 1}
+        queue.shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_failures_are_recorded():
+    workdir = tempfile.mkdtemp()
+    try:
+        queue = JobQueue(_db(workdir), workers=1)
+
+        def handler(params, progress):
+            if params.get("crash"):
+                raise RuntimeError("boom")
+            return {"status": "failed", "error": "AI调用失败"}
+
+        queue.register_handler('agent_run', handler)
+        crashed = _wait(queue, queue.submit('agent_run', {"crash": True}))
+        failed = _wait(queue, queue.submit('agent_run', {}))
+        assert crashed["status"] == "failed" and crashed["error"] == "boom"
+        assert failed["status"] == "failed" and failed["error"] == "AI调用失败"
+        queue.shutdown()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_recover_dispatches_queued_jobs_once():
+    workdir = tempfile.mkdtemp()
+    try:
+        db = _db(workdir)
+        first = JobQueue(db, workers=1)
+        first.register_handler('agent_run', lambda params, progress: {"status": "completed"})
+        # Simulate a job persisted by a process that exited before running it
+        first._executor.shutdown()
+        first._executor.submit = lambda *args: None
+        task_id = first.submit('agent_run', {})
+        assert first.get(task_id)["status"] == "queued"
+
+        runs = []
+        second = JobQueue(db, workers=2)
+        second.register_handler('agent_run', lambda params, progress: runs.append(1) or {"status": "completed"})
+        assert second.recover() == 1
+        # A duplicate dispatch cannot claim the job again
+        second._executor.submit(second._run, task_id)
+        assert _wait(second, task_id)["status"] == "completed"
+        second.shutdown()
+        assert runs == [1]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    test_submit_returns_immediately_and_records_progress()
+    test_failures_are_recorded()
+    test_recover_dispatches_queued_jobs_once()
+    print("✓ 后台任务队列测试通过")
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+LLM client test - 验证连接复用、瞬时错误重试及连接统计
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import Database
+from llm_cache import LLMResponseCache
+from llm_client import LLMClient, LLMStreamError, extract_complete_rule
+
+RULE = 'alert http any any -> any any (msg:"test"; flow:established,to_server; sid:9000001; rev:1;)'
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible endpoint that fails the first N requests with 503"""
+    protocol_version = "HTTP/1.1"
+    failures_left = 0
+    stream_chunks_sent = 0
+    requests_seen = 0
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        FakeProviderHandler.requests_seen += 1
+        if payload.get("stream"):
+            return self._stream()
+        if FakeProviderHandler.failures_left > 0:
+            FakeProviderHandler.failures_left -= 1
+            status, body = 503, b'{"error": "busy"}'
+        else:
+            status = 200
+            body = json.dumps({"choices": [{"message": {"content": "alert tcp any any -> any any (sid:1;)"}}]}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self):
+        """Chunked SSE: the rule in pieces, then trailing text the client should never need"""
+        pieces = ["```\n", RULE[:40], RULE[40:], "\n```\n"] + ["说明文字"] * 50
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for piece in pieces:
+                event = f"data: {json.dumps({'choices': [{'delta': {'content': piece}}]})}\n\n".encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+                self.wfile.flush()
+                FakeProviderHandler.stream_chunks_sent += 1
+                time.sleep(0.01)
+            done = b"data: [DONE]\n\n"
+            self.wfile.write(b"%x\r\n%s\r\n0\r\n\r\n" % (len(done), done))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+    def log_message(self, *args):
+        pass
+
+
+def _serve():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeProviderHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_connection_reuse_and_retry():
+    server = _serve()
+    try:
+        client = LLMClient(provider="openai", api_key="k", base_url=f"http://127.0.0.1:{server.server_port}/v1",
+                           pool_size=2, max_retries=2, retry_backoff=0)
+        FakeProviderHandler.failures_left = 1
+        for _ in range(3):
+            result = client.generate_text("hi")
+            assert result["choices"][0]["message"]["content"].startswith("alert")
+
+        stats = client.connection_stats()
+        assert stats["requests"] == 3
+        assert stats["retries"] == 1
+        assert stats["connections_opened"] == 1
+        assert stats["connections_reused"] == 3
+
+        FakeProviderHandler.failures_left = 5
+        failed = client.generate_text("hi")
+        assert failed["status"] == "failed"
+        assert client.connection_stats()["errors"] == 1
+        client.close()
+    finally:
+        FakeProviderHandler.failures_left = 0
+        server.shutdown()
+        server.server_close()
+
+
+def test_stream_stops_after_complete_rule():
+    server = _serve()
+    try:
+        client = LLMClient(provider="openai", api_key="k", base_url=f"http://127.0.0.1:{server.server_port}/v1")
+        FakeProviderHandler.stream_chunks_sent = 0
+        stop = lambda text: extract_complete_rule(text) is not None
+        text = "".join(client.stream_text("hi", stop=stop))
+        assert extract_complete_rule(text) == RULE
+        assert "说明文字" not in text
+        time.sleep(0.3)
+        assert FakeProviderHandler.stream_chunks_sent < 54
+
+        full = "".join(client.stream_text("hi"))
+        assert full.endswith("说明文字")
+        client.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_stream_error_raises():
+    client = LLMClient(provider="openai", api_key="k", base_url="http://127.0.0.1:9/v1", max_retries=0)
+    try:
+        list(client.stream_text("hi"))
+        assert False, "expected LLMStreamError"
+    except LLMStreamError:
+        assert client.connection_stats()["errors"] == 1
+
+
+def test_response_cache():
+    server = _serve()
+    workdir = tempfile.mkdtemp()
+    try:
+        db = Database(os.path.join(workdir, 'llm.db'))
+        db.init_db()
+        cache = LLMResponseCache(db, max_entries=2)
+        client = LLMClient(provider="openai", api_key="k", base_url=f"http://127.0.0.1:{server.server_port}/v1",
+                           response_cache=cache)
+        FakeProviderHandler.requests_seen = 0
+
+        first = client.generate_text("same prompt", temperature=0.1)
+        second = client.generate_text("same prompt", temperature=0.1)
+        assert "cached" not in first and second["cached"] is True
+        assert second["choices"] == first["choices"]
+        assert FakeProviderHandler.requests_seen == 1
+
+        # Different sampling parameters or an explicit bypass go to the provider
+        client.generate_text("same prompt", temperature=0.3)
+        client.generate_text("same prompt", temperature=0.1, use_cache=False)
+        assert FakeProviderHandler.requests_seen == 3
+
+        # Only completed streams are stored; a cached completion streams as one chunk
+        assert "".join(client.stream_text("stream prompt")).endswith("说明文字")
+        assert "".join(client.stream_text("stream prompt")).endswith("说明文字")
+        assert FakeProviderHandler.requests_seen == 4
+
+        stats = cache.stats()
+        assert stats["hits"] == 2 and stats["entries"] == 2 and stats["evictions"] == 1
+        client.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    test_connection_reuse_and_retry()
+    test_stream_stops_after_complete_rule()
+    test_stream_error_raises()
+    test_response_cache()
+    print("✓ LLM客户端连接池测试通过")
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Pagination test - 验证 (created_at, id) 游标分页的完整性、顺序及索引使用
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import Database, decode_cursor
+from user_model import UserModel
+
+
+def test_rule_cursor_walks_every_row_once():
+    workdir = tempfile.mkdtemp()
+    try:
+        db = Database(os.path.join(workdir, 'rules.db'))
+        db.init_db()
+        # Rows inserted within the same second share created_at; id breaks the tie
+        for i in range(53):
+            db.insert_rule(vuln_name=f"v{i}", original_rule="r", current_rule="r")
+
+        seen = []
+        cursor_token = None
+        while True:
+            page = db.get_rules_after(cursor_token, limit=10)
+            seen += [rule['id'] for rule in page["rules"]]
+            cursor_token = page["next_cursor"]
+            if cursor_token is None:
+                break
+        assert seen == sorted(seen, reverse=True) and len(set(seen)) == 53
+        assert [r['id'] for r in db.get_all_rules(page=2, per_page=10)] == seen[10:20]
+        assert db.get_rules_count() == db.get_rules_count(approximate=True) == 53
+        # Deleted rules are not counted, even the one with the highest id
+        conn = db.get_connection()
+        conn.execute('DELETE FROM rules WHERE id IN (?, ?)', (seen[0], seen[-1]))
+        conn.commit()
+        conn.close()
+        assert db.get_rules_count() == db.get_rules_count(approximate=True) == 51
+
+        conn = db.get_connection()
+        plan = " ".join(str(tuple(row)) for row in conn.execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM rules WHERE (created_at, id) < (?, ?) '
+            'ORDER BY created_at DESC, id DESC LIMIT 10', ('2024-01-01 00:00:00', 1)))
+        conn.close()
+        assert 'idx_rules_created_id' in plan and 'TEMP B-TREE' not in plan
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_user_cursor_and_invalid_cursor():
+    workdir = tempfile.mkdtemp()
+    try:
+        users = UserModel(os.path.join(workdir, 'users.db'))
+        for i in range(4):
+            users.create_user(username=f"user{i}", password="pw")
+
+        first = users.get_users_after(limit=3, with_total=True)
+        assert first['total'] == 5 and len(first['users']) == 3
+        second = users.get_users_after(first['next_cursor'], limit=3)
+        assert len(second['users']) == 2 and second['next_cursor'] is None
+        assert second['total'] is None
+
+        try:
+            decode_cursor("not-a-cursor")
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    test_rule_cursor_walks_every_row_once()
+    test_user_cursor_and_invalid_cursor()
+    print("✓ 游标分页测试通过")
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+PCAP indexer test - 验证 pcap/pcapng 摘要（包数、时间范围、协议分布、HTTP 样本）及规则相关性判断
+"""
+
+import os
+import sys
+import struct
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import Database
+from pcap_indexer import INDEX_VERSION, index_pcap, rule_may_match
+from pcap_manager_db import PCAPManagerDB
+from suricata_validator import SuricataValidator
+
+
+def _ipv4_tcp(src, dst, sport, dport, payload=b''):
+    tcp = struct.pack('!HHIIBBHHH', sport, dport, 1, 0, 5 << 4, 0x18, 65535, 0, 0) + payload
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(tcp), 0, 0, 64, 6, 0,
+                     bytes(map(int, src.split('.'))), bytes(map(int, dst.split('.'))))
+    return ip + tcp
+
+
+def _ipv4_udp(src, dst, sport, dport, payload=b''):
+    udp = struct.pack('!HHHH', sport, dport, 8 + len(payload), 0) + payload
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(udp), 0, 0, 64, 17, 0,
+                     bytes(map(int, src.split('.'))), bytes(map(int, dst.split('.'))))
+    return ip + udp
+
+
+def _ethernet(ip_packet, ethertype=b'\x08\x00'):
+    return b'\x00' * 12 + ethertype + ip_packet
+
+
+def _gre(inner_ip):
+    gre = b'\x00\x00\x08\x00' + inner_ip
+    return struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(gre), 0, 0, 64, 47, 0,
+                       bytes([192, 168, 0, 1]), bytes([192, 168, 0, 2])) + gre
+
+
+def _pppoe(inner_ip):
+    # PPPoE session header, then PPP protocol 0x0021 (IPv4)
+    return _ethernet(struct.pack('!BBHH', 0x11, 0, 1, len(inner_ip) + 2) + b'\x00\x21' + inner_ip,
+                     ethertype=b'\x88\x64')
+
+
+HTTP_REQUEST = b'GET /index.php?id=1 HTTP/1.1\r\nHost: example.com\r\nUser-Agent: t\r\n\r\n'
+
+
+def write_pcap(path, frames, start=1700000000):
+    """Classic little-endian pcap with Ethernet frames, one second apart"""
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1))
+        for i, frame in enumerate(frames):
+            f.write(struct.pack('<IIII', start + i, 500000, len(frame), len(frame)))
+            f.write(frame)
+
+
+def write_pcapng(path, frames, start=1700000000):
+    """pcapng with one Ethernet interface and Enhanced Packet Blocks (microseconds)"""
+    def block(block_type, body):
+        body += b'\x00' * (-len(body) % 4)
+        length = 12 + len(body)
+        return struct.pack('<II', block_type, length) + body + struct.pack('<I', length)
+
+    with open(path, 'wb') as f:
+        f.write(block(0x0A0D0D0A, struct.pack('<IHHq', 0x1A2B3C4D, 1, 0, -1)))
+        f.write(block(1, struct.pack('<HHI', 1, 0, 65535)))
+        for i, frame in enumerate(frames):
+            ts = (start + i) * 1000000
+            f.write(block(6, struct.pack('<IIIII', 0, ts >> 32, ts & 0xFFFFFFFF, len(frame), len(frame)) + frame))
+
+
+def _frames():
+    return [
+        _ethernet(_ipv4_tcp('10.0.0.1', '10.0.0.2', 40000, 80, HTTP_REQUEST)),
+        _ethernet(_ipv4_tcp('10.0.0.2', '10.0.0.1', 80, 40000, b'HTTP/1.1 200 OK\r\n\r\n')),
+        _ethernet(_ipv4_udp('10.0.0.1', '8.8.8.8', 5353, 53, b'\x00' * 12)),
+    ]
+
+
+def test_pcap_and_pcapng_summaries_match():
+    workdir = tempfile.mkdtemp()
+    try:
+        pcap = os.path.join(workdir, 'a.pcap')
+        pcapng = os.path.join(workdir, 'a.pcapng')
+        write_pcap(pcap, _frames())
+        write_pcapng(pcapng, _frames())
+
+        for path in (pcap, pcapng):
+            summary = index_pcap(path)
+            assert summary["packet_count"] == 3
+            assert summary["byte_count"] == sum(len(frame) for frame in _frames())
+            assert int(summary["first_timestamp"]) == 1700000000
+            assert int(summary["last_timestamp"]) == 1700000002
+            assert summary["protocols"] == {"l4": {"tcp": 2, "udp": 1}, "app": {"http": 2, "dns": 1},
+                                            "unclassified_tcp_flows": 0, "index_version": INDEX_VERSION}
+            assert summary["summary"]["http_samples"] == [
+                {"method": "GET", "host": "example.com", "uri": "/index.php?id=1"}]
+            assert summary["summary"]["top_talkers"][0]["ip"] in ("10.0.0.1", "10.0.0.2")
+            assert {"transport": "tcp", "port": 80, "packets": 2} in summary["summary"]["top_ports"]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_rule_relevance():
+    no_http = {"l4": {"udp": 4}, "app": {"dns": 4}, "index_version": INDEX_VERSION}
+    assert not rule_may_match('alert http any any -> any any (sid:9000001;)', no_http)
+    assert not rule_may_match('alert tcp any any -> any any (sid:9000001;)', no_http)
+    assert rule_may_match('alert dns any any -> any any (sid:9000001;)', no_http)
+    assert rule_may_match('alert ip any any -> any any (sid:9000001;)', no_http)
+    assert rule_may_match('alert http any any -> any any (sid:9000001;)\n'
+                          'alert udp any any -> any any (sid:9000002;)', no_http)
+    # No summary means nothing is known, so nothing is skipped
+    assert rule_may_match('alert http any any -> any any (sid:9000001;)', None)
+    assert rule_may_match('alert http any any -> any any (sid:9000001;)', dict(no_http, index_version=1))
+    # TCP connections that did not start like HTTP or TLS may still be either
+    unclassified = {"l4": {"tcp": 4}, "app": {}, "unclassified_tcp_flows": 1, "index_version": INDEX_VERSION}
+    assert rule_may_match('alert http any any -> any any (sid:9000001;)', unclassified)
+    assert not rule_may_match('alert dns any any -> any any (sid:9000001;)', unclassified)
+
+
+def test_tunnelled_and_unclassified_traffic_is_never_skipped():
+    http = _ipv4_tcp('10.0.0.1', '10.0.0.2', 40000, 80, HTTP_REQUEST)
+    vxlan = _ipv4_udp('192.168.0.1', '192.168.0.2', 50000, 4789, b'\x08' + b'\x00' * 7 + _ethernet(http))
+    webdav = _ipv4_tcp('10.0.0.1', '10.0.0.2', 40001, 80, b'PROPFIND /dav HTTP/1.1\r\nHost: x\r\n\r\n')
+    mid_stream = _ipv4_tcp('10.0.0.1', '10.0.0.2', 40002, 80, b'tail of a request body')
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, 't.pcap')
+        for frames, l4 in (([_ethernet(_gre(http))], {"tunnel": 1}),
+                           ([_pppoe(http)], {"other": 1}),
+                           ([_ethernet(vxlan)], {"udp": 1, "tunnel": 1})):
+            write_pcap(path, frames)
+            protocols = index_pcap(path)["protocols"]
+            assert protocols["l4"] == l4
+            assert rule_may_match('alert http any any -> any any (sid:9000001;)', protocols)
+            assert rule_may_match('alert tcp any any -> any any (sid:9000001;)', protocols)
+
+        write_pcap(path, [_ethernet(webdav)])
+        assert index_pcap(path)["protocols"]["app"] == {"http": 1}
+        write_pcap(path, [_ethernet(mid_stream)])
+        protocols = index_pcap(path)["protocols"]
+        assert protocols["app"] == {} and protocols["unclassified_tcp_flows"] == 1
+        assert rule_may_match('alert http any any -> any any (sid:9000001;)', protocols)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_catalog_indexes_uploads_and_validator_skips_irrelevant():
+    workdir = tempfile.mkdtemp()
+    try:
+        db = Database(os.path.join(workdir, 'pcaps.db'))
+        db.init_db()
+        uploads = os.path.join(workdir, 'uploads')
+        manager = PCAPManagerDB(db, upload_folder=uploads)
+
+        source = os.path.join(workdir, 'dns.pcap')
+        write_pcap(source, [_ethernet(_ipv4_udp('10.0.0.1', '8.8.8.8', 5353, 53, b'\x00' * 12))])
+        with open(source, 'rb') as f:
+            assert manager.upload_pcap(f, 'dns.pcap')["success"]
+
+        info = manager.get_pcap_info('dns.pcap')
+        assert info["packet_count"] == 1
+        assert info["protocols"] == {"l4": {"udp": 1}, "app": {"dns": 1},
+                                     "unclassified_tcp_flows": 0, "index_version": INDEX_VERSION}
+        assert manager.protocols_for_path(info["filepath"]) == info["protocols"]
+        # Same name elsewhere on disk is not the cataloged capture
+        assert manager.protocols_for_path(source) is None
+        # Summaries from an older indexer are recomputed on first use
+        conn = db.get_connection()
+        conn.execute("UPDATE pcaps SET protocols = ? WHERE filename = 'dns.pcap'", ('{"l4": {}, "app": {}}',))
+        conn.commit()
+        conn.close()
+        assert manager.protocols_for_path(info["filepath"]) == info["protocols"]
+
+        validator = SuricataValidator.create_validator(rules_dir=workdir, pcap_index=manager)
+        result = validator.validate_rule(
+            'alert http any any -> any any (msg:"t"; sid:9000001; rev:1;)', info["filepath"], use_cache=False)
+        assert result["success"]
+        assert result["engine_status"] == "no_relevant_pcap"
+        assert result["skipped_pcaps"] == [info["filepath"]]
+        assert not result["matched"] and result["alert_count"] == 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    test_pcap_and_pcapng_summaries_match()
+    test_rule_relevance()
+    test_tunnelled_and_unclassified_traffic_is_never_skipped()
+    test_catalog_indexes_uploads_and_validator_skips_irrelevant()
+    print("✓ PCAP索引测试通过")
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+PCAP catalog test - 验证 pcaps 表的上传、查询、删除及旧 JSON 列表迁移
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import multiprocessing
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import Database
+from pcap_manager_db import PCAPManagerDB
+
+
+def _db(workdir):
+    db = Database(os.path.join(workdir, 'pcaps.db'))
+    db.init_db()
+    return db
+
+
+def test_legacy_blob_is_migrated_once():
+    workdir = tempfile.mkdtemp()
+    try:
+        db = _db(workdir)
+        uploads = os.path.join(workdir, 'uploads')
+        os.makedirs(uploads)
+        with open(os.path.join(uploads, 'old.pcap'), 'wb') as f:
+            f.write(b'old capture')
+        db.set_config('uploaded_pcaps', json.dumps([
+            {"filename": "old.pcap", "filepath": os.path.join(uploads, 'old.pcap'), "size": 11, "upload_time": 1.0},
+            {"filename": "gone.pcap", "filepath": os.path.join(uploads, 'gone.pcap'), "size": 5, "upload_time": 2.0}
+        ]))
+
+        manager = PCAPManagerDB(db, upload_folder=uploads)
+        assert db.get_config('uploaded_pcaps') is None
+        assert [p["filename"] for p in manager.list_uploaded_pcaps()] == ["old.pcap", "gone.pcap"]
+        assert manager.get_pcap_info("old.pcap")["sha256"] is not None
+        assert manager.get_pcap_info("gone.pcap")["sha256"] is None
+        assert manager.migrate_legacy_list() == 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_upload_replace_and_delete_are_single_rows():
+    workdir = tempfile.mkdtemp()
+    try:
+        uploads = os.path.join(workdir, 'uploads')
+        manager = PCAPManagerDB(_db(workdir), upload_folder=uploads)
+
+        assert manager.upload_pcap(io.BytesIO(b'first'), '../a.pcap')["success"]
+        assert manager.upload_pcap(io.BytesIO(b'second version'), 'a.pcap')["success"]
+        assert manager.upload_pcap(io.BytesIO(b'other'), 'b.pcap')["success"]
+        # Same content under a new name is stored only once; the new name is an alias
+        duplicate = manager.upload_pcap(io.BytesIO(b'other'), 'c.pcap')
+        assert duplicate["duplicate"] and duplicate["pcap_info"]["filename"] == "c.pcap"
+        assert manager.get_pcap_path("c.pcap") == os.path.join(uploads, 'b.pcap')
+
+        pcaps = manager.list_uploaded_pcaps()
+        assert [p["filename"] for p in pcaps] == ["a.pcap", "b.pcap", "c.pcap"]
+        assert pcaps[0]["size"] == len(b'second version')
+        assert manager.get_pcap_path("a.pcap") == os.path.join(uploads, 'a.pcap')
+
+        # New content under the original name leaves the alias on the old file
+        assert manager.upload_pcap(io.BytesIO(b'changed'), 'b.pcap')["success"]
+        with open(manager.get_pcap_path("b.pcap"), 'rb') as f:
+            assert f.read() == b'changed'
+        with open(manager.get_pcap_path("c.pcap"), 'rb') as f:
+            assert f.read() == b'other'
+        assert manager.delete_pcap("b.pcap")["success"]
+        assert os.path.exists(manager.get_pcap_path("c.pcap"))
+        assert manager.delete_pcap("c.pcap")["success"]
+        assert sorted(os.listdir(uploads)) == [".partial", "a.pcap"]
+
+        assert manager.delete_pcap("a.pcap")["success"]
+        assert not os.path.exists(os.path.join(uploads, 'a.pcap'))
+        assert manager.get_pcap_path("a.pcap") is None
+        assert not manager.delete_pcap("a.pcap")["success"]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_streaming_size_limit():
+    workdir = tempfile.mkdtemp()
+    try:
+        uploads = os.path.join(workdir, 'uploads')
+        manager = PCAPManagerDB(_db(workdir), upload_folder=uploads, max_upload_size=1024)
+        result = manager.upload_pcap(io.BytesIO(b'x' * 2048), 'big.pcap')
+        assert not result["success"] and result["code"] == "too_large"
+        assert manager.list_uploaded_pcaps() == []
+        assert os.listdir(os.path.join(uploads, '.partial')) == []
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_resumable_chunked_upload():
+    workdir = tempfile.mkdtemp()
+    try:
+        uploads = os.path.join(workdir, 'uploads')
+        db = _db(workdir)
+        manager = PCAPManagerDB(db, upload_folder=uploads)
+        content = os.urandom(3000)
+        sha256 = hashlib.sha256(content).hexdigest()
+
+        upload_id = manager.create_upload_session('chunked.pcap', total_size=3000, sha256=sha256)["upload"]["upload_id"]
+        assert manager.append_upload_chunk(upload_id, 0, io.BytesIO(content[:1000]))["received"] == 1000
+        # A retried chunk at a stale offset is rejected with the resume point
+        stale = manager.append_upload_chunk(upload_id, 0, io.BytesIO(content[:1000]))
+        assert stale["code"] == "offset_mismatch" and stale["received"] == 1000
+        assert manager.complete_upload(upload_id)["code"] == "incomplete"
+
+        # A new process resumes from the part file on disk
+        resumed = PCAPManagerDB(db, upload_folder=uploads)
+        assert resumed.get_upload_session(upload_id)["received"] == 1000
+        assert resumed.append_upload_chunk(upload_id, 1000, io.BytesIO(content[1000:]))["success"]
+        result = resumed.complete_upload(upload_id)
+        assert result["success"] and result["pcap_info"]["sha256"] == sha256
+        with open(resumed.get_pcap_path('chunked.pcap'), 'rb') as f:
+            assert f.read() == content
+        assert resumed.get_upload_session(upload_id) is None
+
+        bad_id = resumed.create_upload_session('bad.pcap', sha256='0' * 64)["upload"]["upload_id"]
+        resumed.append_upload_chunk(bad_id, 0, io.BytesIO(b'data'))
+        assert resumed.complete_upload(bad_id)["code"] == "hash_mismatch"
+        assert resumed.get_pcap_info('bad.pcap') is None
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+class _SlowStream:
+    """Chunk body that arrives slowly, so appends from two workers overlap"""
+
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    def read(self, size):
+        time.sleep(0.05)
+        return self.stream.read(100)
+
+
+def _append_in_worker(uploads, db_path, upload_id, results):
+    manager = PCAPManagerDB(Database(db_path), upload_folder=uploads)
+    results.put(manager.append_upload_chunk(upload_id, 0, _SlowStream(b'x' * 500)))
+
+
+def test_concurrent_chunks_from_two_workers():
+    workdir = tempfile.mkdtemp()
+    try:
+        uploads = os.path.join(workdir, 'uploads')
+        db = _db(workdir)
+        manager = PCAPManagerDB(db, upload_folder=uploads)
+        upload_id = manager.create_upload_session('race.pcap')["upload"]["upload_id"]
+
+        context = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+        results = context.Queue()
+        workers = [context.Process(target=_append_in_worker, args=(uploads, db.db_path, upload_id, results))
+                   for _ in range(2)]
+        for worker in workers:
+            worker.start()
+        outcomes = sorted([results.get(timeout=30) for _ in workers], key=lambda r: r["success"])
+        for worker in workers:
+            worker.join()
+        # Only one of two chunks sent at the same offset is appended
+        assert outcomes[0]["code"] == "offset_mismatch" and outcomes[1] == {"success": True, "received": 500}
+        assert manager.get_upload_session(upload_id)["received"] == 500
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    test_legacy_blob_is_migrated_once()
+    test_upload_replace_and_delete_are_single_rows()
+    test_streaming_size_limit()
+    test_resumable_chunked_upload()
+    test_concurrent_chunks_from_two_workers()
+    print("✓ PCAP目录表测试通过")
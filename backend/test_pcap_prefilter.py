@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+PCAP pre-filter test - 验证按规则协议、端口和 content 截取候选流，以及无法安全过滤时保持原文件
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pcap_indexer import index_pcap
+from pcap_prefilter import parse_rule_selectors, prefilter_pcap
+from test_pcap_indexer import write_pcap, _ethernet, _gre, _ipv4_tcp, _ipv4_udp
+from test_suricata_validator import _setup
+
+
+def _tcp_flow(client, port, payloads):
+    """Client -> server segments with consecutive sequence numbers"""
+    frames, seq = [], 1000
+    for payload in payloads:
+        frame = bytearray(_ethernet(_ipv4_tcp(client, '10.0.0.9', 40000, port, payload)))
+        frame[14 + 20 + 4:14 + 20 + 8] = seq.to_bytes(4, 'big')
+        frames.append(bytes(frame))
+        seq += len(payload)
+    return frames
+
+
+def _capture(workdir):
+    path = os.path.join(workdir, 'mixed.pcap')
+    frames = (_tcp_flow('10.0.0.1', 80, [b'GET /admin/lo', b'gin.php HTTP/1.1\r\nHost: a\r\n\r\n']) +
+              _tcp_flow('10.0.0.2', 80, [b'GET /index.html HTTP/1.1\r\nHost: b\r\n\r\n']) +
+              _tcp_flow('10.0.0.3', 443, [b'\x16\x03\x01\x00\x05hello']) +
+              [_ethernet(_ipv4_udp('10.0.0.4', '8.8.8.8', 5353, 53, b'\x00' * 12))])
+    write_pcap(path, frames)
+    return path
+
+
+def test_selects_flows_by_transport_port_and_content():
+    workdir = tempfile.mkdtemp()
+    try:
+        source = _capture(workdir)
+        target = os.path.join(workdir, 'out.pcap')
+
+        # Literal split across two segments of the same flow is still found
+        stats = prefilter_pcap('alert http any any -> any 80 (msg:"t"; content:"LOGIN.php"; nocase; sid:9000001; rev:1;)',
+                               source, target)
+        assert stats == {"packets_in": 5, "packets_out": 2, "flows_in": 4, "flows_kept": 1}
+        assert index_pcap(target)["summary"]["http_samples"][0]["uri"] == "/admin/lo"
+
+        stats = prefilter_pcap('alert tcp any any -> any [80,443] (msg:"t"; sid:9000001; rev:1;)', source, target)
+        assert stats["flows_kept"] == 3 and stats["packets_out"] == 4
+
+        stats = prefilter_pcap('alert http any any -> any 80 (msg:"t"; content:"nothere"; sid:9000001; rev:1;)',
+                               source, target)
+        assert stats["packets_out"] == 0
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_tunnelled_flows_are_always_kept():
+    workdir = tempfile.mkdtemp()
+    try:
+        source = os.path.join(workdir, 'gre.pcap')
+        target = os.path.join(workdir, 'out.pcap')
+        login = _ipv4_tcp('10.0.0.1', '10.0.0.9', 40000, 80, b'GET /admin/login.php HTTP/1.1\r\nHost: a\r\n\r\n')
+        vxlan = _ipv4_udp('192.168.0.1', '192.168.0.2', 50000, 4789, b'\x08' + b'\x00' * 7 + _ethernet(login))
+        write_pcap(source, _tcp_flow('10.0.0.2', 80, [b'GET /index.html HTTP/1.1\r\nHost: b\r\n\r\n']) +
+                   [_ethernet(_gre(login)), _ethernet(vxlan)])
+        # The GRE and VXLAN packets carry the matching request; only the plain flow is dropped
+        stats = prefilter_pcap('alert http any any -> any 80 (msg:"t"; content:"login.php"; sid:9000001; rev:1;)',
+                               source, target)
+        assert stats == {"packets_in": 3, "packets_out": 2, "flows_in": 1, "flows_kept": 0}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_decoded_sticky_buffers_keep_their_flows():
+    workdir = tempfile.mkdtemp()
+    try:
+        source = os.path.join(workdir, 'decoded.pcap')
+        target = os.path.join(workdir, 'out.pcap')
+        # DNS names are length-prefixed labels on the wire, base64 payloads are encoded
+        query = b'\x12\x34\x01\x00\x00\x01\x00\x00\x00\x00\x00\x00\x03www\x07example\x03com\x00\x00\x01\x00\x01'
+        write_pcap(source, [_ethernet(_ipv4_udp('10.0.0.4', '8.8.8.8', 5353, 53, query))] +
+                   _tcp_flow('10.0.0.1', 80, [b'GET /?token=YWRtaW4= HTTP/1.1\r\nHost: a\r\n\r\n']) +
+                   _tcp_flow('10.0.0.2', 80, [b'GET /index.html HTTP/1.1\r\nHost: b\r\n\r\n']))
+
+        stats = prefilter_pcap('alert dns any any -> any 53 (msg:"t"; dns_query; content:"www.example.com"; '
+                               'sid:9000001; rev:1;)', source, target)
+        assert stats == {"packets_in": 3, "packets_out": 1, "flows_in": 3, "flows_kept": 1}
+
+        rule = ('alert http any any -> any 80 (msg:"t"; content:"token="; base64_decode:relative; '
+                'base64_data; content:"admin"; sid:9000001; rev:1;)')
+        assert parse_rule_selectors(rule)[0].contents == [b'token=']
+        stats = prefilter_pcap(rule, source, target)
+        assert stats == {"packets_in": 3, "packets_out": 1, "flows_in": 3, "flows_kept": 1}
+
+        # Unknown value-less keywords are taken as non-raw buffers
+        selectors = parse_rule_selectors(
+            'alert tcp any any -> any 445 (msg:"t"; dce_stub_data; content:"x"; sid:9000001; rev:1;)')
+        assert selectors[0].contents == []
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_unsafe_rules_are_not_filtered():
+    workdir = tempfile.mkdtemp()
+    try:
+        source = _capture(workdir)
+        target = os.path.join(workdir, 'out.pcap')
+        # Normalized buffers may differ from raw bytes, so they do not narrow the selection
+        selectors = parse_rule_selectors(
+            'alert http any any -> any any (http.uri; content:"/admin/login.php"; sid:9000001; rev:1;)')
+        assert selectors[0].contents == []
+        # Every flow would be kept, or the header cannot be parsed: nothing is written
+        assert prefilter_pcap('alert ip any any -> any any (msg:"t"; sid:9000001; rev:1;)', source, target) is None
+        assert prefilter_pcap('alert tcp any any -> any 80 (content:"GET"; sid:9000001;', source, target) is None
+        assert not os.path.exists(target)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_validator_runs_engine_on_candidate_flows_only():
+    workdir, pcap_dir, validator = _setup([])
+    try:
+        source = _capture(workdir)
+        attack = os.path.join(pcap_dir, 'attack.pcap')
+        shutil.move(source, attack)
+        validator.prefilter = True
+
+        result = validator.validate_rule(
+            'alert http any any -> any 80 (msg:"t"; content:"login.php"; sid:9000001; rev:1;)', attack)
+        assert result["success"] and result["matched"]
+        assert result["prefilter"][attack]["packets_out"] == 2
+
+        result = validator.validate_rule(
+            'alert http any any -> any 80 (msg:"t"; content:"nothere"; sid:9000001; rev:1;)', attack)
+        assert result["engine_status"] == "no_relevant_pcap"
+        assert result["skipped_pcaps"] == [attack]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    test_selects_flows_by_transport_port_and_content()
+    test_tunnelled_flows_are_always_kept()
+    test_decoded_sticky_buffers_keep_their_flows()
+    test_unsafe_rules_are_not_filtered()
+    test_validator_runs_engine_on_candidate_flows_only()
+    print("✓ PCAP预过滤测试通过")
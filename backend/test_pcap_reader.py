@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+PCAP reader test - 验证基于 mmap 的 pcap/pcapng 迭代、按包序号随机访问及截断/非法文件处理
+"""
+
+import os
+import sys
+import struct
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from pcap_reader import PcapReader
+from test_pcap_indexer import write_pcap, write_pcapng
+
+
+FRAMES = [bytes([i]) * (10 + i) for i in range(5)]
+
+
+def test_iterates_and_indexes_pcap_and_pcapng():
+    workdir = tempfile.mkdtemp()
+    try:
+        for name, writer in (('a.pcap', write_pcap), ('a.pcapng', write_pcapng)):
+            path = os.path.join(workdir, name)
+            writer(path, FRAMES)
+            with PcapReader(path) as reader:
+                packets = list(reader)
+                assert [bytes(p[4]) for p in packets] == FRAMES
+                assert all(isinstance(p[4], memoryview) for p in packets)
+                assert [int(p[2]) for p in packets] == [1700000000 + i for i in range(5)]
+                assert packets[0][1] == 1
+
+                assert len(reader) == 5
+                assert list(reader.build_index()) == [p[0] for p in packets]
+                offset, link_type, timestamp, orig_len, data = reader.packet_at(3)
+                assert offset == packets[3][0] and orig_len == 13 and bytes(data) == FRAMES[3]
+                assert bytes(reader.packet_at(-1)[4]) == FRAMES[-1]
+                del packets, data
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_truncated_and_invalid_files():
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, 'cut.pcap')
+        write_pcap(path, FRAMES)
+        with open(path, 'r+b') as f:
+            f.truncate(os.path.getsize(path) - 3)
+        with PcapReader(path) as reader:
+            # The incomplete last record is dropped, not returned short
+            assert len(reader) == 4
+
+        # Big-endian nanosecond capture
+        path = os.path.join(workdir, 'be.pcap')
+        with open(path, 'wb') as f:
+            f.write(struct.pack('>IHHiIII', 0xa1b23c4d, 2, 4, 0, 0, 65535, 101))
+            f.write(struct.pack('>IIII', 10, 500000000, 3, 3) + b'abc')
+        with PcapReader(path) as reader:
+            _, link_type, timestamp, _, data = next(iter(reader))
+            assert (link_type, timestamp, bytes(data)) == (101, 10.5, b'abc')
+            del data
+
+        for content in (b'', b'not a capture'):
+            path = os.path.join(workdir, 'bad.pcap')
+            with open(path, 'wb') as f:
+                f.write(content)
+            try:
+                PcapReader(path)
+                assert False, "应拒绝非PCAP文件"
+            except ValueError:
+                pass
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    test_iterates_and_indexes_pcap_and_pcapng()
+    test_truncated_and_invalid_files()
+    print("✓ PCAP读取测试通过")
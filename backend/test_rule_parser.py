@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Rule parser test - 验证规则解析(AST)、content/pcre 缓冲区归属及项目模板检查
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from rule_parser import RuleParseError, parse_rule, check_rules, rule_fingerprint
+from suricata_validator import SuricataValidator
+
+
+RULE = ('alert http any any -> any any (msg:"SQL注入"; flow:established,to_server; '
+        'http.uri; content:"/login.php"; nocase; content:"id="; http.request_body; '
+        'content:"a|3b 3d|b\\"c"; distance:0; pcre:"/id=\\d+/Ui"; sid:9000001; rev:1;)')
+
+
+def test_parse_builds_ast():
+    rule = parse_rule(RULE)
+    assert rule.header.protocol == "http" and rule.header.direction == "->"
+    assert rule.msg == "SQL注入" and rule.sid == 9000001 and rule.rev == 1
+    assert [(c.pattern, c.buffer) for c in rule.contents] == [
+        (b"/login.php", "http.uri"), (b"id=", "http.uri"), (b'a;=b"c', "http.request_body")]
+    assert rule.contents[0].nocase and rule.contents[2].modifiers == {"distance": "0"}
+    # pcre buffer flag wins over the sticky buffer
+    assert (rule.pcres[0].pattern, rule.pcres[0].flags, rule.pcres[0].buffer) == ("id=\\d+", "Ui", "http.uri")
+    # Legacy modifiers map onto sticky buffer names; whitespace is canonicalized
+    legacy = parse_rule('alert  tcp [10.0.0.1, 10.0.0.2] any ->  any [80,8080] '
+                        '(msg:"x";content:"GET"; http_method;  sid:9000002; rev:1;)')
+    assert legacy.contents[0].buffer == "http.method"
+    cookies = parse_rule('alert http any any -> any any (content:"a=1"; http_cookie; '
+                         'content:"b=%32"; http_raw_cookie; sid:9000003;)')
+    assert [c.buffer for c in cookies.contents] == ["http.cookie", "http.cookie.raw"]
+    assert legacy.to_text() == ('alert tcp [10.0.0.1, 10.0.0.2] any -> any [80,8080] '
+                                '(msg:"x"; content:"GET"; http_method; sid:9000002; rev:1;)')
+
+
+def test_parse_errors():
+    broken = {
+        'alert http any any -> any any (msg:"x"; sid:9000001; rev:1;': "结尾",
+        'alrt http any any -> any any (msg:"x"; sid:9000001;)': "未知的规则动作",
+        'alert http any any any any (msg:"x"; sid:9000001;)': "规则头",
+        'alert http any 70000 -> any any (msg:"x"; sid:9000001;)': "端口超出范围",
+        'alert http any any -> any any (msg:"x"; sid:XXXXXXX; rev:1;)': "sid 必须是整数",
+        'alert http any any -> any any (msg:"x"; content:"a|4g|"; sid:9000001;)': "十六进制",
+        'alert http any any -> any any (msg:"x"; content:"a;b"; sid:9000001;)': "带引号",
+        'alert http any any -> any any (nocase; content:"a"; sid:9000001;)': "之前没有 content",
+        'alert http any any -> any any (msg:"x"; pcre:"/a/Ux"; flow:established,to_sever; sid:9000001;)': "flow",
+        'alert http any any -> any any (msg:"x"; pcre:"/a/K"; sid:9000001;)': "pcre 修饰符",
+        'alert http any any -> any any (msg:"x" sid:9000001;)': "缺少分号",
+    }
+    for text, expected in broken.items():
+        try:
+            parse_rule(text)
+            assert False, f"应拒绝: {text}"
+        except RuleParseError as e:
+            assert expected in str(e), (text, str(e))
+
+
+def test_template_lint():
+    assert check_rules(RULE) == {"valid": True, "errors": [], "warnings": [], "rule_count": 1}
+
+    result = check_rules('alert http any any -> any any (msg:"x"; content:"a"; reference:url,x; '
+                         'classtype:web-application-attack; sid:100; rev:1;)')
+    assert not result["valid"]
+    assert result["errors"] == ["缺少必需选项: flow", "不允许使用选项: reference",
+                                "不允许使用选项: classtype", "sid 100 不在 9000000-9999999 范围内"]
+
+    result = check_rules('alert http any any -> any any (msg:"x"; flow:established; sid:9000001; rev:1;)\n'
+                         '# comment\n'
+                         'alert http any any -> any any (msg:"y"; flow:established; content:"b"; sid:9000001; rev:1;)')
+    assert result["rule_count"] == 2
+    assert result["errors"] == ["规则2: sid 9000001 与规则1重复"]
+    assert result["warnings"] == ["规则1: 规则没有 content 或 pcre，可能匹配大量流量"]
+
+    # Equivalent rules share a fingerprint: whitespace, msg, sid and rev are ignored
+    assert rule_fingerprint(RULE) == rule_fingerprint(RULE.replace('; ', ';  ').replace('rev:1', 'rev:2'))
+    assert rule_fingerprint(RULE) != rule_fingerprint(RULE.replace('nocase; ', ''))
+
+    result = check_rules("```\nnot a rule\n```")
+    assert not result["valid"] and result["errors"][0].startswith("第1行")
+
+
+def test_syntax_check_rejects_locally():
+    validator = SuricataValidator.create_validator()
+    validator._get_suricata_command = lambda: (_ for _ in ()).throw(AssertionError("不应启动suricata"))
+    result = validator.validate_rule_syntax('alert http any any -> any any (msg:"x"; sid:1;')
+    assert not result["valid"] and result["checked_by"] == "parser"
+    assert "结尾" in result["error"]
+
+    # Valid Suricata rules outside the project template are not syntax errors
+    validator._get_suricata_command = lambda: None
+    result = validator.validate_rule_syntax('alert tcp any any -> any 80 (msg:"x"; content:"a"; '
+                                            'reference:url,example.com; classtype:trojan-activity; sid:100; rev:1;)')
+    assert result["valid"] and result["error"] is None
+
+
+if __name__ == '__main__':
+    test_parse_builds_ast()
+    test_parse_errors()
+    test_template_lint()
+    test_syntax_check_rejects_locally()
+    print("✓ 规则解析测试通过")
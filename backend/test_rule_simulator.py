@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Rule simulator test - 验证 HTTP 请求样本提取（重组、流水线、分块）与 content/pcre 近似匹配及样本缓存
+"""
+
+import os
+import sys
+import struct
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pcap_manager_db as pcap_manager_module
+from database import Database
+from http_samples import extract_http_requests, parse_requests
+from pcap_manager_db import PCAPManagerDB
+from rule_simulator import simulate_rule
+from test_pcap_indexer import _ethernet, _gre, _pppoe, write_pcap
+
+
+def _segment(seq, payload, sport=40000, dport=80):
+    tcp = struct.pack('!HHIIBBHHH', sport, dport, seq, 0, 5 << 4, 0x18, 65535, 0, 0) + payload
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(tcp), 0, 0, 64, 6, 0,
+                     bytes([10, 0, 0, 1]), bytes([10, 0, 0, 2]))
+    return _ethernet(ip + tcp)
+
+
+LOGIN = (b'POST /app/../login.php?user=%61dmin HTTP/1.1\r\nHost: Example.com:8080\r\n'
+         b'User-Agent: sqlmap/1.7\r\nContent-Length: 20\r\n\r\nuser=admin&pass=x%27')
+CHUNKED = (b'POST /upload HTTP/1.1\r\nHost: example.com\r\nTransfer-Encoding: chunked\r\n\r\n'
+           b'4\r\n<?ph\r\n5\r\np x()\r\n0\r\n\r\n')
+
+
+def _requests():
+    get, _ = parse_requests(b'GET /index.php?id=1%20union%20select HTTP/1.1\r\nHost: example.com\r\n'
+                            b'User-Agent: curl/8.0\r\n\r\n', 10)
+    login, _ = parse_requests(LOGIN, 10)
+    return get + login
+
+
+def test_streams_are_reassembled_and_split_into_requests():
+    workdir = tempfile.mkdtemp()
+    try:
+        stream = LOGIN + CHUNKED
+        split = 30
+        path = os.path.join(workdir, 'http.pcap')
+        # The server side is ignored; a client direction captured from the middle
+        # cannot be parsed, so requests may be missing
+        write_pcap(path, [_segment(1, b'HTTP/1.1 200 OK\r\n\r\n', sport=80, dport=40000)])
+        assert extract_http_requests(path) == {"requests": [], "truncated": False}
+        write_pcap(path, [_segment(1000 + split, stream[split:]), _segment(1000, stream[:split])])
+        assert extract_http_requests(path) == {"requests": [], "truncated": True}
+
+        # Out-of-order, overlapping and retransmitted segments
+        write_pcap(path, [_segment(1000, stream[:split]), _segment(1000 + split + 10, stream[split + 10:]),
+                          _segment(1000 + split, stream[split:]), _segment(1000, stream[:split])])
+        requests = extract_http_requests(path)["requests"]
+        assert [(r["method"], r["uri"]) for r in requests] == [
+            ("POST", "/app/../login.php?user=%61dmin"), ("POST", "/upload")]
+        assert requests[0]["body"] == "user=admin&pass=x%27"
+        assert requests[1]["body"] == "<?php x()"
+        assert extract_http_requests(path, limit=1) == {"requests": requests[:1], "truncated": True}
+        assert not any(request["truncated"] for request in requests)
+
+        # A gap in the stream, a body over the size limit and a custom method
+        write_pcap(path, [_segment(1000, stream[:split]), _segment(1000 + split + 10, stream[split + 10:])])
+        assert extract_http_requests(path)["truncated"]
+        big = b'POST /u HTTP/1.1\r\nContent-Length: 20000\r\n\r\n' + b'a' * 20000
+        write_pcap(path, [_segment(1000, big[:1400])] + [
+            _segment(1000 + offset, big[offset:offset + 1400]) for offset in range(1400, len(big), 1400)])
+        samples = extract_http_requests(path)
+        assert samples["truncated"] and samples["requests"][0]["truncated"]
+        write_pcap(path, [_segment(1000, b'PROPFIND /dav HTTP/1.1\r\nHost: x\r\n\r\n')])
+        assert extract_http_requests(path) == {"requests": [parse_requests(
+            b'PROPFIND /dav HTTP/1.1\r\nHost: x\r\n\r\n', 10)[0][0]], "truncated": False}
+
+        # Requests inside GRE or PPPoE are not decoded, so they may be missing; ARP is harmless
+        get = _segment(1000, b'GET / HTTP/1.1\r\n\r\n')
+        for wrapped in (_ethernet(_gre(get[14:])), _pppoe(get[14:])):
+            write_pcap(path, [get, wrapped])
+            assert extract_http_requests(path)["truncated"]
+        write_pcap(path, [get, _ethernet(b'\x00' * 28, ethertype=b'\x08\x06')])
+        assert not extract_http_requests(path)["truncated"]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_content_chains_and_buffers():
+    requests = _requests()
+    match = simulate_rule(
+        'alert http any any -> any any (msg:"t"; flow:established,to_server; http.uri; content:"/login.php"; '
+        'content:"user=admin"; distance:1; within:12; sid:9000001; rev:1;)', requests)
+    assert match["verdict"] == "match" and match["matched_samples"] == 1
+    # http.uri is normalized (dot segments, percent decoding); the raw URI is not
+    raw = simulate_rule(
+        'alert http any any -> any any (msg:"t"; flow:to_server; http.uri.raw; content:"/login.php"; '
+        'startswith; sid:9000001; rev:1;)', requests)
+    assert raw["verdict"] == "no_match" and raw["failed_checks"] == ['content:"/login.php";']
+    # "select" follows "union" one byte later, not two
+    tight = simulate_rule(
+        'alert http any any -> any any (msg:"t"; flow:to_server; content:"union"; http_uri; '
+        'content:"select"; http_uri; distance:2; within:6; sid:9000001; rev:1;)', requests)
+    assert tight["verdict"] == "no_match" and tight["score"] == 0.0
+    host = simulate_rule(
+        'alert http any any -> any any (msg:"t"; flow:to_server; http.host; content:"example.com"; endswith; '
+        'http.user_agent; content:"SQLMAP"; nocase; sid:9000001; rev:1;)', requests)
+    assert host["verdict"] == "match"
+    negated = simulate_rule(
+        'alert http any any -> any any (msg:"t"; flow:to_server; http.request_body; content:!"pass="; '
+        'sid:9000001; rev:1;)', requests)
+    # The GET has an empty body, which satisfies the negation
+    assert negated["matched_samples"] == 1
+
+
+def test_pcre_and_unknown_verdicts():
+    requests = _requests()
+    assert simulate_rule(
+        'alert http any any -> any any (msg:"t"; flow:to_server; pcre:"/pass=[^&]*%27/P"; '
+        'sid:9000001; rev:1;)', requests)["verdict"] == "match"
+    assert simulate_rule(
+        'alert http any any -> any any (msg:"t"; flow:to_server; http.method; pcre:"/^put$/i"; '
+        'sid:9000001; rev:1;)', requests)["verdict"] == "no_match"
+    # Response-side rules and buffers the samples do not have cannot be ruled out
+    response = simulate_rule(
+        'alert http any any -> any any (msg:"t"; flow:established,to_client; http.stat_code; content:"500"; '
+        'sid:9000001; rev:1;)', requests)
+    assert response["verdict"] == "unknown"
+    assert response["unsupported"] == ["flow:to_client", "缓冲区 http.stat_code"]
+    # Truncated samples may miss the matching request
+    assert simulate_rule(
+        'alert http any any -> any any (msg:"t"; flow:to_server; content:"nothing"; sid:9000001; rev:1;)',
+        requests, truncated=True)["verdict"] == "unknown"
+    assert simulate_rule('alert http any any', requests)["verdict"] == "unknown"
+    # tcp rules and buffers that also cover responses cannot be ruled out from request samples
+    assert simulate_rule(
+        'alert tcp any any -> any any (msg:"t"; flow:established; content:"HTTP/1.1 200 OK"; '
+        'sid:9000001; rev:1;)', requests)["verdict"] == "unknown"
+    assert simulate_rule(
+        'alert http any any -> any any (msg:"t"; content:"nothing"; sid:9000001; rev:1;)',
+        requests)["verdict"] == "unknown"
+
+
+def test_raw_buffers_keep_the_captured_bytes():
+    requests, complete = parse_requests(b'GET / HTTP/1.1\r\nHost:x\r\nX-A:  b\r\n\r\n', 10)
+    assert complete
+    for buffer in ('', 'http.header.raw; '):
+        assert simulate_rule(
+            f'alert http any any -> any any (msg:"t"; flow:to_server; {buffer}content:"Host:x|0d 0a|X-A:  b"; '
+            'sid:9000001; rev:1;)', requests)["verdict"] == "match"
+    # The normalized header buffer is rebuilt as "name: value"
+    assert simulate_rule(
+        'alert http any any -> any any (msg:"t"; flow:to_server; http.header; content:"Host: x"; '
+        'sid:9000001; rev:1;)', requests)["verdict"] == "match"
+
+
+def test_samples_are_extracted_once_and_dropped_with_the_capture():
+    workdir = tempfile.mkdtemp()
+    original = pcap_manager_module.extract_http_requests
+    calls = []
+    try:
+        db = Database(os.path.join(workdir, 't.db'))
+        db.init_db()
+        manager = PCAPManagerDB(db, upload_folder=os.path.join(workdir, 'uploads'))
+        source = os.path.join(workdir, 'src.pcap')
+        write_pcap(source, [_segment(1, LOGIN)])
+        with open(source, 'rb') as f:
+            manager.upload_pcap(f, 'login.pcap')
+
+        pcap_manager_module.extract_http_requests = lambda path, limit: calls.append(path) or original(path, limit)
+        samples = manager.get_http_samples('login.pcap')
+        assert [r["uri"] for r in samples["requests"]] == ["/app/../login.php?user=%61dmin"]
+        # A fresh manager (another process) reads the stored samples instead of the capture
+        other = PCAPManagerDB(db, upload_folder=os.path.join(workdir, 'uploads'))
+        assert manager.get_http_samples('login.pcap') == other.get_http_samples('login.pcap') == samples
+        assert len(calls) == 1
+
+        assert manager.get_http_samples('missing.pcap') is None
+        manager.delete_pcap('login.pcap')
+        conn = db.get_connection()
+        assert conn.execute('SELECT COUNT(*) FROM pcap_http_samples').fetchone()[0] == 0
+        conn.close()
+    finally:
+        pcap_manager_module.extract_http_requests = original
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    test_streams_are_reassembled_and_split_into_requests()
+    print("✓ HTTP请求样本提取测试通过")
+    test_content_chains_and_buffers()
+    print("✓ content 链与缓冲区模拟测试通过")
+    test_pcre_and_unknown_verdicts()
+    print("✓ pcre 与 unknown 判定测试通过")
+    test_raw_buffers_keep_the_captured_bytes()
+    print("✓ 原始缓冲区测试通过")
+    test_samples_are_extracted_once_and_dropped_with_the_capture()
+    print("✓ HTTP样本缓存测试通过")
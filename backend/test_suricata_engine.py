@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Warm engine pool test - 使用本地模拟的Suricata unix socket服务测试常驻引擎
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import socket
+import shutil
+import tempfile
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from suricata_engine import WarmSuricataEngine, SuricataEnginePool
+from suricata_validator import SuricataValidator
+
+
+class FakeSuricataSocket:
+    """模拟 Suricata unix-socket 模式: 支持 reload-rules / pcap-file 等命令"""
+
+    def __init__(self, socket_path, rule_file):
+        self.socket_path = socket_path
+        self.rule_file = rule_file
+        self.rules = ""
+        self.reloads = 0
+        self.last_processed = 0
+        self.commands = []
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(socket_path)
+        self.server.listen(5)
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        reader = conn.makefile('r')
+        for line in reader:
+            message = json.loads(line)
+            if "version" in message:
+                reply = {"return": "OK"}
+            else:
+                reply = self._dispatch(message["command"], message.get("arguments", {}))
+            conn.sendall(json.dumps(reply).encode('utf-8'))
+        conn.close()
+
+    def _dispatch(self, command, arguments):
+        self.commands.append(command)
+        if command == "reload-rules":
+            with open(self.rule_file) as f:
+                self.rules = f.read()
+            self.reloads += 1
+            return {"return": "OK", "message": "done"}
+        if command == "pcap-file":
+            os.makedirs(arguments["output-dir"], exist_ok=True)
+            match = re.search(r'sid:(\d+)', self.rules)
+            with open(os.path.join(arguments["output-dir"], "fast.log"), 'w') as f:
+                if match and "attack" in os.path.basename(arguments["filename"]):
+                    f.write(f'01/01/2024-00:00:00.000000  [**] [1:{match.group(1)}:1] test [**] '
+                            f'{{TCP}} 10.0.0.1:1234 -> 10.0.0.2:80\n')
+            self.last_processed += 1
+            return {"return": "OK", "message": "Successfully added file to list"}
+        if command == "pcap-file-number":
+            return {"return": "OK", "message": 0}
+        if command == "pcap-current":
+            return {"return": "OK", "message": "None"}
+        if command == "pcap-last-processed":
+            return {"return": "OK", "message": self.last_processed}
+        return {"return": "NOK", "message": f"unknown command {command}"}
+
+    def close(self):
+        self.server.close()
+
+
+def _make_pool(workdir, size=1):
+    rule_file = os.path.join(workdir, "vul_fake.rules")
+    socket_path = os.path.join(workdir, "suricata.socket")
+    open(rule_file, 'w').close()
+    fake = FakeSuricataSocket(socket_path, rule_file)
+    pool = SuricataEnginePool(size, lambda: WarmSuricataEngine(None, rule_file, socket_path, poll_interval=0.001))
+    return fake, pool
+
+
+def test_pool_reuses_warm_engine():
+    workdir = tempfile.mkdtemp()
+    try:
+        for name in ("attack.pcap", "benign.pcap"):
+            open(os.path.join(workdir, name), 'wb').close()
+        fake, pool = _make_pool(workdir)
+        rules_dir = os.path.join(workdir, "rules")
+        os.makedirs(rules_dir)
+        validator = SuricataValidator.create_validator(rules_dir=rules_dir, engine_pool=pool)
+        # Warm engines load the rule themselves; no per-run rule file is written
+        rule_files = []
+        original_validate = pool.validate
+        pool.validate = lambda *args: rule_files.extend(os.listdir(rules_dir)) or original_validate(*args)
+
+        rule = 'alert http any any -> any any (msg:"t"; sid:9000001; rev:1;)'
+        first = validator.validate_rule(rule, workdir)
+        second = validator.validate_rule(rule, workdir)
+        assert rule_files == [] and "rule_file" not in first["execution_details"]
+
+        assert first["success"] and first["matched"]
+        assert first["alert_count"] == 1
+        assert first["sid_stats"] == {"[1:9000001:1]": 1}
+        assert second["alert_count"] == 1
+        assert pool.stats["engines_started"] == 1
+        assert pool.stats["pcaps_processed"] == 4
+        # Same rule text is not reloaded a second time
+        assert fake.reloads == 1
+
+        other = validator.validate_rule(rule.replace("9000001", "9000002"), workdir)
+        assert other["sid_stats"] == {"[1:9000002:1]": 1}
+        assert fake.reloads == 2
+
+        pool.close()
+        fake.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_pool_reports_socket_failure():
+    workdir = tempfile.mkdtemp()
+    try:
+        open(os.path.join(workdir, "attack.pcap"), 'wb').close()
+        engine = lambda: WarmSuricataEngine(None, os.path.join(workdir, "vul_x.rules"),
+                                            os.path.join(workdir, "missing.socket"),
+                                            startup_timeout=0.1, poll_interval=0.01)
+        pool = SuricataEnginePool(1, engine)
+        validator = SuricataValidator.create_validator(rules_dir=workdir, engine_pool=pool)
+        result = validator.validate_rule('alert ip any any -> any any (sid:9000003;)', workdir)
+        assert not result["success"]
+        assert result["engine_status"] == "warm_engine_failed"
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    start = time.time()
+    test_pool_reuses_warm_engine()
+    test_pool_reports_socket_failure()
+    print(f"✓ 常驻引擎测试通过 ({time.time() - start:.2f}s)")
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Suricata validator test - 使用模拟的suricata可执行文件测试多PCAP验证流程
+"""
+
+import os
+import sys
+import stat
+import shutil
+import tempfile
+import threading
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import Database
+from suricata_validator import SuricataValidator, cleanup_stale_scratch
+from validation_cache import ValidationCache
+
+
+# 模拟 suricata: 对文件名含 attack 的PCAP按规则中的sid输出告警, 含 broken 的返回错误
+FAKE_SURICATA = '''#!/usr/bin/env python
+import os, re, sys
+args = sys.argv[1:]
+if '-V' in args:
+    print('This is Suricata version 7.0.0 RELEASE')
+    sys.exit(0)
+rules = open(args[args.index('-S') + 1]).read()
+pcap = args[args.index('-r') + 1]
+log_dir = args[args.index('-l') + 1] if '-l' in args else os.getcwd()
+name = os.path.basename(pcap)
+if 'broken' in name:
+    sys.stderr.write('pcap corrupted')
+    sys.exit(1)
+with open(os.path.join(log_dir, 'fast.log'), 'a') as f:
+    if 'attack' in name:
+        for sid in re.findall(r'sid:(\\d+)', rules):
+            f.write('01/01/2024-00:00:00.000000  [**] [1:%s:1] %s [**] {TCP} 10.0.0.1:1 -> 10.0.0.2:80\\n' % (sid, name))
+'''
+
+
+def _setup(pcaps):
+    workdir = tempfile.mkdtemp()
+    fake = os.path.join(workdir, 'suricata')
+    with open(fake, 'w') as f:
+        f.write(FAKE_SURICATA.replace('/usr/bin/env python', sys.executable, 1))
+    os.chmod(fake, os.stat(fake).st_mode | stat.S_IEXEC)
+    pcap_dir = os.path.join(workdir, 'pcaps')
+    os.makedirs(pcap_dir)
+    for name in pcaps:
+        open(os.path.join(pcap_dir, name), 'wb').close()
+    validator = SuricataValidator.create_validator(rules_dir=workdir)
+    validator._get_suricata_command = lambda: [fake]
+    return workdir, pcap_dir, validator
+
+
+RULE = 'alert http any any -> any any (msg:"t"; sid:9000001; rev:1;)'
+
+
+def test_parallel_merges_results_and_reports_failures():
+    workdir, pcap_dir, validator = _setup(['attack1.pcap', 'attack2.pcap', 'benign.pcap', 'broken.pcap'])
+    try:
+        # The serial default reports per-PCAP status exactly like the parallel path
+        for workers in (4, 1):
+            result = validator.validate_rule(RULE, pcap_dir, workers=workers)
+            assert result["success"]
+            assert result["matched"]
+            assert result["alert_count"] == 2
+            assert result["sid_stats"] == {"[1:9000001:1]": 2}
+            statuses = {os.path.basename(r["pcap"]): r["status"] for r in result["pcap_results"]}
+            assert statuses["broken.pcap"] == "execution_failed"
+            assert statuses["benign.pcap"] == "ok"
+            assert "1/4" in result["error"]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_parallel_all_failed():
+    workdir, pcap_dir, validator = _setup(['broken1.pcap', 'broken2.pcap'])
+    try:
+        for workers in (2, 1):
+            result = validator.validate_rule(RULE, pcap_dir, workers=workers)
+            assert not result["success"]
+            assert result["engine_status"] == "execution_failed"
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_concurrent_runs_use_isolated_log_dirs():
+    workdir, pcap_dir, validator = _setup(['attack.pcap', 'benign.pcap'])
+    scratch = os.path.join(workdir, 'scratch')
+    os.environ['SURICATA_SCRATCH_DIR'] = scratch
+    try:
+        results = {}
+
+        def run(sid):
+            rule = RULE.replace('9000001', str(sid))
+            results[sid] = validator.validate_rule(rule, pcap_dir, workers=1)
+
+        threads = [threading.Thread(target=run, args=(9000000 + i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for sid, result in results.items():
+            assert result["success"]
+            assert result["sid_stats"] == {f"[1:{sid}:1]": 1}
+        # Scratch log directories are removed after each run
+        assert os.listdir(scratch) == []
+    finally:
+        os.environ.pop('SURICATA_SCRATCH_DIR', None)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_cleanup_removes_only_stale_run_dirs():
+    scratch = tempfile.mkdtemp()
+    os.environ['SURICATA_SCRATCH_DIR'] = scratch
+    try:
+        for name in ('suricata_run_old', 'suricata_run_new', 'other_old'):
+            os.makedirs(os.path.join(scratch, name, 'pcap_0'))
+        for name in ('suricata_run_old', 'other_old'):
+            os.utime(os.path.join(scratch, name), (0, 0))
+        assert cleanup_stale_scratch(3600) == 1
+        assert sorted(os.listdir(scratch)) == ['other_old', 'suricata_run_new']
+    finally:
+        os.environ.pop('SURICATA_SCRATCH_DIR', None)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def test_batch_attributes_alerts_by_sid():
+    workdir, pcap_dir, validator = _setup(['attack1.pcap', 'attack2.pcap', 'benign.pcap'])
+    try:
+        rules = [
+            {"rule_id": 1, "rule_content": RULE},
+            {"rule_id": 2, "rule_content": RULE.replace('9000001', '9000002')},
+            {"rule_id": 3, "rule_content": RULE.replace('9000001', '9000002')},
+            {"rule_id": 4, "rule_content": 'alert http any any -> any any (msg:"no sid";)'},
+        ]
+        result = validator.validate_rules_batch(rules, pcap_dir)
+        assert result["success"]
+        assert result["loaded_rule_count"] == 2
+        assert result["matched_rule_count"] == 2
+        by_id = {r["rule_id"]: r for r in result["results"]}
+        assert by_id[1]["alert_count"] == 2 and by_id[1]["matched"]
+        assert by_id[2]["alert_count"] == 2
+        assert "9000001" not in " ".join(by_id[2]["details"])
+        assert "重复" in by_id[3]["error"]
+        assert by_id[4]["error"]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def test_result_cache_hits_and_invalidation():
+    workdir, pcap_dir, validator = _setup(['attack.pcap'])
+    try:
+        db = Database(os.path.join(workdir, 'cache.db'))
+        db.init_db()
+        cache = ValidationCache(db, max_entries=2)
+        validator.result_cache = cache
+
+        first = validator.validate_rule(RULE, pcap_dir)
+        second = validator.validate_rule("\n  " + RULE + "  \n", pcap_dir)
+        assert not first["cached"] and second["cached"]
+        assert second["sid_stats"] == first["sid_stats"]
+        assert cache.stats()["hits"] == 1
+        # Prefiltered and full-capture runs are cached separately
+        validator.prefilter = True
+        assert not validator.validate_rule(RULE, pcap_dir)["cached"]
+        validator.prefilter = False
+        assert validator.validate_rule(RULE, pcap_dir)["cached"]
+
+        # A changed capture must not be served from the cache
+        with open(os.path.join(pcap_dir, 'attack.pcap'), 'wb') as f:
+            f.write(b'changed')
+        assert not validator.validate_rule(RULE, pcap_dir)["cached"]
+        assert not validator.validate_rule(RULE, pcap_dir, use_cache=False)["cached"]
+
+        # LRU eviction keeps at most max_entries rows
+        validator.validate_rule(RULE.replace('9000001', '9000005'), pcap_dir)
+        stats = cache.stats()
+        assert stats["entries"] == 2
+        assert stats["evictions"] == 2
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    test_parallel_merges_results_and_reports_failures()
+    test_parallel_all_failed()
+    test_concurrent_runs_use_isolated_log_dirs()
+    test_cleanup_removes_only_stale_run_dirs()
+    test_batch_attributes_alerts_by_sid()
+    test_result_cache_hits_and_invalidation()
+    print("✓ 验证器测试通过")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Validator registry test - 验证 Suricata 安装信息只探测一次、验证器复用，以及配置文件变化后重新探测
+"""
+
+import os
+import sys
+import stat
+import shutil
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import suricata_validator
+from validator_registry import ValidatorRegistry, parse_build_info
+
+# 模拟 suricata: 记录每次调用的参数
+FAKE_SURICATA = '''#!/usr/bin/env python
+import os, sys
+with open(os.path.join(os.path.dirname(__file__), 'calls.log'), 'a') as f:
+    f.write(' '.join(sys.argv[1:]) + '\\n')
+if '--version' in sys.argv:
+    print('This is Suricata version 7.0.3 RELEASE')
+elif '--build-info' in sys.argv:
+    print('This is Suricata version 7.0.3 RELEASE')
+    print('Features: PCAP_SET_BUFF AF_PACKET HAVE_PACKET_FANOUT')
+    print('SIMD support: SSE_4_2 SSE_4_1 SSE_3')
+    print('  compiled with LibHTP v0.5.46, linked against LibHTP v0.5.46')
+'''
+
+
+def _setup():
+    workdir = tempfile.mkdtemp()
+    fake = os.path.join(workdir, 'suricata')
+    with open(fake, 'w') as f:
+        f.write(FAKE_SURICATA.replace('/usr/bin/env python', sys.executable, 1))
+    os.chmod(fake, os.stat(fake).st_mode | stat.S_IEXEC)
+    config = os.path.join(workdir, 'suricata.yaml')
+    with open(config, 'w') as f:
+        f.write('%YAML 1.1\n')
+    return workdir, fake, config
+
+
+def _calls(workdir):
+    path = os.path.join(workdir, 'calls.log')
+    return open(path).read().splitlines() if os.path.exists(path) else []
+
+
+def test_parse_build_info():
+    info = parse_build_info('Features: A B\nSIMD support: none\n  indented: skipped\nno separator\n')
+    assert info == {"Features": "A B", "SIMD support": "none"}
+
+
+def test_installation_is_discovered_once_and_validators_are_shared():
+    workdir, fake, config = _setup()
+    saved_env = {name: os.environ.get(name) for name in ('PATH', 'SURICATA_CONFIG', 'SURICATA_RULES_DIR')}
+    original_which = suricata_validator.shutil.which
+    lookups = []
+    try:
+        os.environ['PATH'] = workdir + os.pathsep + os.environ.get('PATH', '')
+        os.environ['SURICATA_CONFIG'] = config
+        os.environ['SURICATA_RULES_DIR'] = workdir
+        suricata_validator.shutil.which = lambda name: lookups.append(name) or original_which(name)
+        registry = ValidatorRegistry()
+
+        installation = registry.installation()
+        assert installation["available"] and installation["binary"] == fake
+        assert installation["version"] == 'This is Suricata version 7.0.3 RELEASE'
+        assert installation["build_info"]["SIMD support"] == 'SSE_4_2 SSE_4_1 SSE_3'
+        assert installation["config_exists"] and installation["rules_dir_exists"]
+
+        validator = registry.get_validator()
+        assert registry.get_validator() is validator
+        assert registry.get_validator(prefilter=True) is not validator
+        assert validator._get_suricata_command() == [fake]
+        registry.installation()
+        # One binary lookup and one run of each probe for all of the above
+        assert lookups == ['suricata']
+        assert _calls(workdir) == ['--version', '--build-info']
+
+        # Editing suricata.yaml triggers a new discovery and new validators
+        stat_result = os.stat(config)
+        os.utime(config, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns + 10 ** 9))
+        assert registry.get_validator() is not validator
+        assert len(_calls(workdir)) == 4
+
+        registry.invalidate()
+        registry.installation(refresh=True)
+        assert len(_calls(workdir)) == 6
+    finally:
+        suricata_validator.shutil.which = original_which
+        for name, value in saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    test_parse_build_info()
+    print("✓ build-info 解析测试通过")
+    test_installation_is_discovered_once_and_validators_are_shared()
+    print("✓ 验证器注册表测试通过")
@@ -8,18 +8,36 @@ from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 import sqlite3
 import json
+import threading
+import time
+
+from db_pool import get_pool
+from database import decode_cursor, keyset_page
+from memory_cache import TTLCache
 
 
 class UserModel:
     """用户模型"""
     
-    def __init__(self, db_path):
+    def __init__(self, db_path, cache_ttl=60, cache_size=1024, version_check_interval=1.0):
         self.db_path = db_path
+        # 认证/权限检查用的用户快照（不含密码哈希），修改、删除用户时失效；
+        # 快照带有读取时的 users_version，其他工作进程修改用户后版本变化，快照随即作废
+        self._snapshots = TTLCache(max_entries=cache_size, ttl_seconds=cache_ttl)
+        # users_version 最多每隔这么多秒读取一次，其间命中的快照不访问数据库
+        self.version_check_interval = version_check_interval
+        self._known_version = None
+        self._version_checked_at = 0.0
+        self._version_lock = threading.Lock()
         self.init_table()
     
+    def get_connection(self):
+        """从共享连接池获取连接，close() 时归还"""
+        return get_pool(self.db_path).acquire()
+    
     def init_table(self):
         """初始化用户表"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.get_connection()
         cursor = conn.cursor()
         
         # 创建用户表
@@ -37,6 +55,17 @@ class UserModel:
             )
         ''')
         
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_created_id ON users(created_at, id)')
+        
+        # 用户表变更计数，修改、停用、删除用户时与变更在同一事务中递增
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO users_version (id, version) VALUES (1, 0)')
+        
         conn.commit()
         conn.close()
         
@@ -60,7 +89,7 @@ class UserModel:
     
     def create_user(self, username, password, email=None, role='user'):
         """创建用户"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.get_connection()
         cursor = conn.cursor()
         
         try:
@@ -81,8 +110,7 @@ class UserModel:
     
     def get_by_id(self, user_id):
         """根据ID获取用户"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = self.get_connection()
         cursor = conn.cursor()
         
         cursor.execute('SELECT * FROM users WHERE id = ?', (user_id,))
@@ -93,10 +121,51 @@ class UserModel:
             return dict(row)
         return None
     
+    def _version(self):
+        """共享的用户表变更计数，最多每 version_check_interval 秒读取一次数据库"""
+        now = time.time()
+        with self._version_lock:
+            if self._known_version is not None and now - self._version_checked_at < self.version_check_interval:
+                return self._known_version
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('SELECT version FROM users_version WHERE id = 1')
+            row = cursor.fetchone()
+            conn.close()
+            self._known_version = row['version'] if row else 0
+            self._version_checked_at = now
+            return self._known_version
+    
+    @staticmethod
+    def _bump_version(conn):
+        # Separate cursor, so callers still read the rowcount of their own statement
+        conn.execute('UPDATE users_version SET version = version + 1 WHERE id = 1')
+    
+    def get_snapshot(self, user_id):
+        """
+        获取用户快照（不含密码哈希），进程内缓存，命中时不访问数据库。
+        users_version 每隔 version_check_interval 秒检查一次：任一工作进程修改过用户后版本变化，
+        快照重新加载，被降级或停用的管理员在其他进程中最多保留权限这么久；本进程内的修改立即失效
+        """
+        version = self._version()
+        cached = self._snapshots.get(user_id)
+        if cached is not None and cached[0] == version:
+            return dict(cached[1])
+        snapshot = self.to_safe_dict(self.get_by_id(user_id))
+        if snapshot is None:
+            self._snapshots.pop(user_id)
+            return None
+        # 记录读取用户前的版本：并发修改只会让快照提前失效，不会让旧数据冒充新版本
+        self._snapshots.put(user_id, (version, snapshot))
+        return dict(snapshot)
+    
+    def invalidate(self, user_id):
+        """丢弃用户快照缓存"""
+        self._snapshots.pop(user_id)
+    
     def get_by_username(self, username):
         """根据用户名获取用户"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = self.get_connection()
         cursor = conn.cursor()
         
         cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
@@ -116,15 +185,14 @@ class UserModel:
     
     def get_all_users(self, page=1, per_page=20):
         """获取所有用户（分页）"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        conn = self.get_connection()
         cursor = conn.cursor()
         
         offset = (page - 1) * per_page
         cursor.execute('''
             SELECT id, username, email, role, is_active, created_at, updated_at
             FROM users
-            ORDER BY created_at DESC
+            ORDER BY created_at DESC, id DESC
             LIMIT ? OFFSET ?
         ''', (per_page, offset))
         
@@ -143,9 +211,46 @@ class UserModel:
             'per_page': per_page
         }
     
+    def get_users_after(self, cursor_token=None, limit=20, with_total=False):
+        """游标分页获取用户（按 created_at, id 倒序），深页耗时不随页码增长"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        if cursor_token:
+            created_at, user_id = decode_cursor(cursor_token)
+            cursor.execute('''
+                SELECT id, username, email, role, is_active, created_at, updated_at
+                FROM users
+                WHERE (created_at, id) < (?, ?)
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            ''', (created_at, user_id, limit + 1))
+        else:
+            cursor.execute('''
+                SELECT id, username, email, role, is_active, created_at, updated_at
+                FROM users
+                ORDER BY created_at DESC, id DESC
+                LIMIT ?
+            ''', (limit + 1,))
+        
+        rows, next_cursor = keyset_page(cursor.fetchall(), limit)
+        
+        total = None
+        if with_total:
+            cursor.execute('SELECT COUNT(*) as total FROM users')
+            total = cursor.fetchone()['total']
+        
+        conn.close()
+        
+        return {
+            'users': [dict(row) for row in rows],
+            'next_cursor': next_cursor,
+            'total': total
+        }
+    
     def update_user(self, user_id, **kwargs):
         """更新用户信息"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.get_connection()
         cursor = conn.cursor()
         
         allowed_fields = ['username', 'email', 'role', 'is_active']
@@ -168,18 +273,24 @@ class UserModel:
         
         try:
             cursor.execute(sql, values)
+            self._bump_version(conn)
             conn.commit()
             success = cursor.rowcount > 0
             conn.close()
+            self.invalidate(user_id)
             return success
         except sqlite3.IntegrityError:
             conn.rollback()
             conn.close()
             raise ValueError("用户名或邮箱已存在")
     
+    def deactivate_user(self, user_id):
+        """停用用户（其令牌随即不再通过管理员检查）"""
+        return self.update_user(user_id, is_active=0)
+    
     def update_password(self, user_id, new_password):
         """更新密码"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.get_connection()
         cursor = conn.cursor()
         
         password_hash = generate_password_hash(new_password)
@@ -188,21 +299,25 @@ class UserModel:
             SET password_hash = ?, updated_at = CURRENT_TIMESTAMP
             WHERE id = ?
         ''', (password_hash, user_id))
+        self._bump_version(conn)
         
         conn.commit()
         success = cursor.rowcount > 0
         conn.close()
+        self.invalidate(user_id)
         return success
     
     def delete_user(self, user_id):
         """删除用户"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.get_connection()
         cursor = conn.cursor()
         
         cursor.execute('DELETE FROM users WHERE id = ?', (user_id,))
+        self._bump_version(conn)
         conn.commit()
         success = cursor.rowcount > 0
         conn.close()
+        self.invalidate(user_id)
         return success
     
     def to_safe_dict(self, user):
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Validation Result Cache - content-addressed by (rule text, PCAP digest, engine fingerprint)
+
+import os
+import json
+import time
+import hashlib
+import threading
+import subprocess
+from typing import Dict, List, Optional
+
+from memory_cache import TTLCache
+
+# Memoized capture digests; bounded so uploads and aliases do not grow it forever
+FILE_DIGEST_MEMO_ENTRIES = 4096
+
+
+class ResultCache:
+    """
+    Size-bounded, TTL-limited store of JSON results in a SQLite table with
+    columns (cache_key, result, created_at, last_access, hits).  Subclasses
+    set ``table`` and build their own content-addressed keys.
+    """
+
+    table = None
+
+    def __init__(self, db, max_entries: int = 5000, ttl_seconds: int = 7 * 24 * 3600):
+        self.db = db
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, cache_key: str) -> Optional[Dict]:
+        now = time.time()
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT result, created_at FROM {self.table} WHERE cache_key = ?', (cache_key,))
+            row = cursor.fetchone()
+            if row is None:
+                self._count('misses')
+                return None
+            if self.ttl_seconds and now - row['created_at'] > self.ttl_seconds:
+                cursor.execute(f'DELETE FROM {self.table} WHERE cache_key = ?', (cache_key,))
+                conn.commit()
+                self._count('misses')
+                return None
+            cursor.execute(f'''
+                UPDATE {self.table} SET last_access = ?, hits = hits + 1 WHERE cache_key = ?
+            ''', (now, cache_key))
+            conn.commit()
+        finally:
+            conn.close()
+        self._count('hits')
+        return json.loads(row['result'])
+
+    def put(self, cache_key: str, result: Dict):
+        now = time.time()
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                INSERT OR REPLACE INTO {self.table} (cache_key, result, created_at, last_access, hits)
+                VALUES (?, ?, ?, ?, 0)
+            ''', (cache_key, json.dumps(result), now, now))
+            cursor.execute(f'SELECT COUNT(*) as count FROM {self.table}')
+            overflow = cursor.fetchone()['count'] - self.max_entries
+            if overflow > 0:
+                # LRU eviction
+                cursor.execute(f'''
+                    DELETE FROM {self.table} WHERE cache_key IN (
+                        SELECT cache_key FROM {self.table} ORDER BY last_access ASC LIMIT ?
+                    )
+                ''', (overflow,))
+                self._count('evictions', overflow)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def clear(self):
+        conn = self.db.get_connection()
+        try:
+            conn.execute(f'DELETE FROM {self.table}')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def stats(self) -> Dict:
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f'SELECT COUNT(*) as count FROM {self.table}')
+            entries = cursor.fetchone()['count']
+        finally:
+            conn.close()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class ValidationCache(ResultCache):
+    """
+    Caches SuricataValidator results in the ``validation_cache`` table.
+
+    Keys are SHA-256 digests of the normalized rule body, the content digests
+    of the PCAP files, the Suricata version/config fingerprint and the run
+    options (alert cap, prefiltering), so a cached result can never be served
+    for a different capture, engine or mode.  Entries
+    expire after ``ttl_seconds`` and the least recently used ones are evicted
+    once more than ``max_entries`` are stored.
+    """
+
+    table = 'validation_cache'
+
+    def __init__(self, db, max_entries: int = 5000, ttl_seconds: int = 7 * 24 * 3600):
+        super().__init__(db, max_entries, ttl_seconds)
+        self._file_digests = TTLCache(max_entries=FILE_DIGEST_MEMO_ENTRIES, ttl_seconds=24 * 3600)
+        self._engine_fingerprints = {}
+
+    @staticmethod
+    def normalize_rule(rule_content: str) -> str:
+        """Drop blank/comment lines and surrounding whitespace; quoted text is untouched"""
+        lines = []
+        for line in rule_content.splitlines():
+            line = line.strip()
+            if line and not line.startswith('#'):
+                lines.append(line)
+        return "\n".join(lines)
+
+    def file_digest(self, path: str) -> str:
+        """SHA-256 of a file, memoized on (path, size, mtime) so captures are hashed once"""
+        stat = os.stat(path)
+        memo_key = (path, stat.st_size, stat.st_mtime_ns)
+        digest = self._file_digests.get(memo_key)
+        if digest is None:
+            sha256 = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    sha256.update(chunk)
+            digest = sha256.hexdigest()
+            self._file_digests.put(memo_key, digest)
+        return digest
+
+    def engine_fingerprint(self, suricata_cmd: List[str], suricata_config: str) -> str:
+        """Suricata version plus a digest of the config file, computed once per config change"""
+        config_mtime = os.path.getmtime(suricata_config) if os.path.exists(suricata_config) else None
+        memo_key = (tuple(suricata_cmd), suricata_config, config_mtime)
+        fingerprint = self._engine_fingerprints.get(memo_key)
+        if fingerprint is None:
+            try:
+                proc = subprocess.run(suricata_cmd + ['-V'], capture_output=True, text=True, timeout=30)
+                version = (proc.stdout or proc.stderr).strip()
+            except (OSError, subprocess.TimeoutExpired):
+                version = "unknown"
+            config_digest = self.file_digest(suricata_config) if config_mtime is not None else "default"
+            fingerprint = f"{version}|{config_digest}"
+            self._engine_fingerprints[memo_key] = fingerprint
+        return fingerprint
+
+    def make_key(self, rule_content: str, pcap_files: List[str], engine_fingerprint: str,
+                 options: Optional[Dict] = None) -> str:
+        key_source = {
+            "rule": self.normalize_rule(rule_content),
+            "pcaps": sorted(self.file_digest(pcap) for pcap in pcap_files),
+            "engine": engine_fingerprint,
+            "options": options or {}
+        }
+        return hashlib.sha256(json.dumps(key_source, sort_keys=True).encode('utf-8')).hexdigest()
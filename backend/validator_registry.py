@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# encoding: utf-8
+# Validator Registry - discover the Suricata installation once and share configured validators
+
+import os
+import platform
+import subprocess
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from suricata_validator import SuricataValidator, find_suricata_command
+
+# Config files reported by /api/suricata/check besides the configured one
+KNOWN_CONFIGS = ["/etc/suricata/suricata.yaml", "/usr/local/etc/suricata/suricata.yaml", "/etc/default/suricata"]
+PROBE_TIMEOUT = 10
+
+
+def _probe(command: List[str], option: str) -> Optional[str]:
+    """stdout of ``suricata <option>``, None when it cannot be run"""
+    try:
+        proc = subprocess.run(command + [option], capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if proc.returncode != 0:
+        return None
+    return proc.stdout
+
+
+def parse_build_info(output: str) -> Dict[str, str]:
+    """``Key: value`` lines of ``suricata --build-info``"""
+    info = {}
+    for line in output.splitlines():
+        key, sep, value = line.partition(':')
+        if sep and key.strip() and not key.startswith(' '):
+            info[key.strip()] = value.strip()
+    return info
+
+
+def _config_mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def discover_suricata(suricata_config: str, rules_dir: str, log_dir: str) -> Dict:
+    """Locate the binary and probe its version, build options and config files"""
+    command = find_suricata_command()
+    binary = command[0] if command and (os.path.isabs(command[0]) and os.path.exists(command[0])) else None
+    version = build_info = None
+    if binary:
+        version_output = _probe(command, '--version')
+        if version_output and version_output.strip():
+            version = version_output.strip().split('\n')[0]
+        build_output = _probe(command, '--build-info')
+        build_info = parse_build_info(build_output) if build_output else None
+
+    configs = list(dict.fromkeys(KNOWN_CONFIGS + [suricata_config]))
+    found_configs = [path for path in configs if os.path.exists(path)]
+    return {
+        "command": command,
+        "binary": binary,
+        "available": binary is not None,
+        "version": version,
+        "build_info": build_info,
+        "config_path": suricata_config,
+        "config_exists": os.path.exists(suricata_config),
+        "found_configs": found_configs,
+        "missing_configs": [path for path in configs if path not in found_configs],
+        "rules_dir": rules_dir,
+        "rules_dir_exists": os.path.exists(rules_dir),
+        "log_dir": log_dir,
+        "log_dir_exists": os.path.exists(log_dir),
+        "discovered_at": datetime.now().isoformat()
+    }
+
+
+class ValidatorRegistry:
+    """
+    Process-wide source of SuricataValidator instances.
+
+    Settings are read from the environment and the installation is probed
+    (binary lookup, ``--version``, ``--build-info``, config files) once; the
+    validators built from them are shared between requests, which is safe
+    because a validator keeps no per-run state.  Everything is rediscovered
+    when the Suricata config file changes on disk or ``invalidate()`` is called
+    (e.g. after the Suricata paths are changed in the configuration).
+    """
+
+    def __init__(self, result_cache=None, pcap_index=None):
+        self.result_cache = result_cache
+        self.pcap_index = pcap_index
+        self._lock = threading.Lock()
+        self._installation = None
+        self._config_mtime = None
+        self._validators = {}
+
+    def _settings(self) -> Dict[str, str]:
+        return {
+            "rules_dir": os.getenv('SURICATA_RULES_DIR', '/var/lib/suricata/rules'),
+            "suricata_config": os.getenv('SURICATA_CONFIG', '/etc/suricata/suricata.yaml'),
+            "log_dir": os.getenv('SURICATA_LOG_DIR', '/var/log/suricata'),
+        }
+
+    def _build(self, prefilter: Optional[bool], command) -> SuricataValidator:
+        settings = self._settings()
+        return SuricataValidator.create_validator(
+            rules_dir=settings["rules_dir"],
+            suricata_config=settings["suricata_config"],
+            log_dir=settings["log_dir"],
+            result_cache=self.result_cache,
+            pcap_index=self.pcap_index,
+            prefilter=prefilter,
+            suricata_command=command
+        )
+
+    def _current(self) -> Dict:
+        """Installation facts, rediscovered when missing or the config file changed (lock held)"""
+        if self._installation is not None and _config_mtime(self._installation["config_path"]) == self._config_mtime:
+            return self._installation
+        # The validator resolves the effective paths (it honours its own env overrides)
+        probe = self._build(None, None)
+        self._installation = discover_suricata(probe.suricata_config, probe.rules_dir, probe.log_dir)
+        self._installation["platform"] = platform.system()
+        self._config_mtime = _config_mtime(probe.suricata_config)
+        self._validators = {}
+        return self._installation
+
+    def installation(self, refresh: bool = False) -> Dict:
+        """What was discovered about the Suricata installation"""
+        with self._lock:
+            if refresh:
+                self._installation = None
+            return dict(self._current())
+
+    def get_validator(self, prefilter: Optional[bool] = None) -> SuricataValidator:
+        """Shared validator for the current settings; prefilter=None uses SURICATA_PCAP_PREFILTER"""
+        with self._lock:
+            installation = self._current()
+            validator = self._validators.get(prefilter)
+            if validator is None:
+                validator = self._build(prefilter, installation["command"])
+                self._validators[prefilter] = validator
+            return validator
+
+    def invalidate(self):
+        """Forget the discovered installation and validators"""
+        with self._lock:
+            self._installation = None
+            self._validators = {}